@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 5))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", 30))
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ChroniclePool:
+    """
+    Shared psycopg2 connection pool. Sync code borrows connections with
+    `connection()`, async code awaits `run()` which executes on a thread
+    pool sized to the connection pool, so the event loop never blocks on the DB.
+    """
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int, timeout: float, healthcheck_interval: float):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool fails immediately when exhausted, the semaphore makes callers wait instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: dict[int, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=maxconn, thread_name_prefix="db")
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                logger.info(f"[DB POOL] Connecting, min={self.minconn}, max={self.maxconn}")
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+            return self._pool
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"No database connection available within {self.timeout}s")
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if not self._healthy(conn):
+                logger.warning("[DB POOL] Dropping a dead connection")
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.InterfaceError, psycopg2.OperationalError):
+                broken = True
+                raise
+            finally:
+                if not broken and not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn, close=broken or bool(conn.closed))
+                if conn.closed:
+                    # Broken, or closed by the pool above minconn: its id may be reused by a new connection
+                    self._last_used.pop(id(conn), None)
+        finally:
+            self._slots.release()
+
+    async def run(self, func, *args, **kwargs):
+        """Runs a blocking DB function on the pool's threads."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+
+chronicle_pool = ChroniclePool(
+    POSTGRES_URL,
+    minconn=DB_POOL_MIN,
+    maxconn=DB_POOL_MAX,
+    timeout=DB_POOL_TIMEOUT,
+    healthcheck_interval=DB_HEALTHCHECK_INTERVAL,
+)
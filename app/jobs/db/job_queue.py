@@ -0,0 +1,137 @@
+import json
+
+from psycopg2.extras import RealDictCursor
+
+from jobs.db.connection_pool import chronicle_pool
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Job lifecycle: queued -> running -> done | failed -> delivered.
+# A running job whose visible_at has passed belongs to a dead worker and can be claimed again.
+# A finished job is leased to the bot instance delivering it the same way, until it is marked delivered.
+
+ENQUEUE_QUERY = """
+    INSERT INTO transcription_jobs (id, chat_id, payload, priority, max_attempts)
+    VALUES (%s, %s, %s, extract(epoch FROM now()) + %s, %s)
+    """
+
+CLAIM_QUERY = """
+    UPDATE transcription_jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        worker_id = %(worker_id)s,
+        visible_at = now() + %(visibility)s * interval '1 second',
+        updated_at = now()
+    WHERE id = (
+        SELECT id FROM transcription_jobs
+        WHERE status IN ('queued', 'running')
+          AND visible_at <= now()
+          AND attempts < max_attempts
+        ORDER BY priority, created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, chat_id, payload, attempts
+    """
+
+EXPIRE_QUERY = """
+    UPDATE transcription_jobs
+    SET status = 'failed', error = coalesce(error, 'worker lost'), updated_at = now()
+    WHERE status = 'running' AND visible_at <= now() AND attempts >= max_attempts
+    """
+
+HEARTBEAT_QUERY = """
+    UPDATE transcription_jobs
+    SET visible_at = now() + %s * interval '1 second', updated_at = now()
+    WHERE id = %s AND worker_id = %s AND status = 'running'
+    """
+
+COMPLETE_QUERY = """
+    UPDATE transcription_jobs
+    SET status = 'done', result = %s, error = NULL, visible_at = now(), updated_at = now()
+    WHERE id = %s AND worker_id = %s AND status = 'running'
+    """
+
+FAIL_QUERY = """
+    UPDATE transcription_jobs
+    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+        visible_at = now() + CASE WHEN attempts < max_attempts THEN %s ELSE 0 END * interval '1 second',
+        error = %s,
+        updated_at = now()
+    WHERE id = %s AND worker_id = %s AND status = 'running'
+    """
+
+TAKE_FINISHED_QUERY = """
+    WITH picked AS (
+        SELECT id FROM transcription_jobs
+        WHERE status IN ('done', 'failed')
+          AND visible_at <= now()
+        ORDER BY updated_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT %s
+    )
+    UPDATE transcription_jobs t
+    SET visible_at = now() + %s * interval '1 second'
+    FROM picked
+    WHERE t.id = picked.id
+    RETURNING t.id, t.chat_id, t.payload, t.status AS outcome, t.result, t.error
+    """
+
+DELIVERED_QUERY = """
+    UPDATE transcription_jobs
+    SET status = 'delivered', updated_at = now()
+    WHERE id = %s AND status IN ('done', 'failed')
+    """
+
+
+def enqueue_job(session_id: str, chat_id: int, payload: dict, priority_offset: float = 0.0, max_attempts: int = 3):
+    """Priority is enqueue time plus the expected length, same aging rule as the in-process scheduler."""
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute(ENQUEUE_QUERY, (session_id, chat_id, json.dumps(payload), priority_offset, max_attempts))
+    logger.info(f"[JOB ENQUEUED] {session_id}")
+
+
+def claim_job(worker_id: str, visibility_sec: float):
+    """Claims the next job or returns None. Jobs of dead workers are picked up again here."""
+    with chronicle_pool.connection() as conn, conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(EXPIRE_QUERY)
+        if cursor.rowcount:
+            logger.warning(f"[JOB QUEUE] {cursor.rowcount} jobs failed after exhausting their attempts")
+        cursor.execute(CLAIM_QUERY, {"worker_id": worker_id, "visibility": visibility_sec})
+        return cursor.fetchone()
+
+
+def heartbeat_job(job_id: str, worker_id: str, visibility_sec: float) -> bool:
+    """Extends the job's visibility timeout. False means the job was taken over by another worker."""
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute(HEARTBEAT_QUERY, (visibility_sec, job_id, worker_id))
+        return cursor.rowcount == 1
+
+
+def complete_job(job_id: str, worker_id: str, result: dict) -> bool:
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute(COMPLETE_QUERY, (json.dumps(result, ensure_ascii=False), job_id, worker_id))
+        return cursor.rowcount == 1
+
+
+def fail_job(job_id: str, worker_id: str, error: str, retry_delay_sec: float) -> bool:
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute(FAIL_QUERY, (retry_delay_sec, error[:2000], job_id, worker_id))
+        return cursor.rowcount == 1
+
+
+def take_finished_jobs(lease_sec: float, limit: int = 20) -> list[dict]:
+    """
+    Leases finished jobs for delivery and returns them, safe with several bot instances.
+    A job not marked delivered within lease_sec (the bot died, sending failed) is returned again.
+    """
+    with chronicle_pool.connection() as conn, conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(TAKE_FINISHED_QUERY, (limit, lease_sec))
+        return cursor.fetchall()
+
+
+def mark_delivered(job_id: str) -> bool:
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute(DELIVERED_QUERY, (job_id,))
+        return cursor.rowcount == 1
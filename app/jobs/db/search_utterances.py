@@ -0,0 +1,73 @@
+import os
+
+from psycopg2.extras import RealDictCursor
+
+from jobs.db.connection_pool import chronicle_pool
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Approximate mode: at most this many GIN matches are fetched and ranked, the first ones
+# the scan reaches (in table order, not by relevance). The scan stops there, so latency
+# stays flat for very common words on a huge table; the price is that the best matches
+# may be among the ones never ranked. Pages of one search see the same candidates as long
+# as the matching rows are not rewritten in between. 0 ranks every match (exact, slower).
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", 5000))
+
+SEARCH_QUERY = """
+    WITH q AS (
+        SELECT websearch_to_tsquery('simple', %(query)s) AS tsq
+    ),
+    candidates AS (
+        SELECT u.id, u.dialog_id, u.content, u.start_time, u.end_time, u.segment_number,
+               ts_rank_cd(u.content_tsv, q.tsq) AS rank
+        FROM utterances u, q
+        WHERE u.content_tsv @@ q.tsq
+        -- No ORDER BY on purpose: sorting would read every match before the limit applies
+        LIMIT %(candidates)s
+    )
+    SELECT c.id, c.dialog_id, c.content, c.start_time, c.end_time, c.segment_number, c.rank,
+           d.title, d.started_at
+    FROM candidates c
+    JOIN dialogs d ON d.id = c.dialog_id
+    {after}
+    ORDER BY c.rank DESC, c.id DESC
+    LIMIT %(limit)s
+    """
+
+AFTER_CLAUSE = "WHERE (c.rank, c.id) < (%(after_rank)s::real, %(after_id)s::uuid)"
+
+
+def search_utterances(query: str, limit: int = 10, after: tuple = None) -> tuple[list[dict], tuple]:
+    """
+    Ranked full-text search over utterances.
+    Keyset pagination: pass the returned cursor (rank, id) as `after` to get the next page.
+    Returns (rows, next_cursor or None).
+    """
+    params = {
+        "query": query,
+        # LIMIT NULL is no limit
+        "candidates": SEARCH_CANDIDATE_LIMIT or None,
+        "limit": limit + 1,
+    }
+    sql = SEARCH_QUERY.format(after=AFTER_CLAUSE if after else "")
+    if after:
+        params["after_rank"], params["after_id"] = after
+
+    with chronicle_pool.connection() as conn, conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]["rank"], str(rows[-1]["id"]))
+    return rows, next_cursor
+
+
+def explain_search(query: str, limit: int = 10) -> dict:
+    """EXPLAIN ANALYZE of the first page, to check how much of the match set a search touches."""
+    params = {"query": query, "candidates": SEARCH_CANDIDATE_LIMIT or None, "limit": limit + 1}
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + SEARCH_QUERY.format(after=""), params)
+        return cursor.fetchone()[0][0]["Plan"]
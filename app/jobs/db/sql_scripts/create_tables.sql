@@ -32,4 +32,49 @@ CREATE TABLE IF NOT EXISTS utterances (
     segment_number INTEGER,
     created_at TIMESTAMP DEFAULT now(),
     metadata JSONB
-);
\ No newline at end of file
+);
+
+-- Full-text search: the tsvector is generated by Postgres on every insert (COPY included).
+-- 'simple' config because dialogs come in several languages.
+ALTER TABLE utterances ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS utterances_content_tsv_idx
+    ON utterances USING GIN (content_tsv);
+
+CREATE INDEX IF NOT EXISTS utterances_dialog_segment_idx
+    ON utterances (dialog_id, segment_number);
+
+-- Transcription job queue, shared by the bot and any number of workers
+CREATE TABLE IF NOT EXISTS transcription_jobs (
+    id UUID PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    priority DOUBLE PRECISION NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id TEXT,
+    visible_at TIMESTAMP NOT NULL DEFAULT now(),
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS transcription_jobs_claim_idx
+    ON transcription_jobs (priority, created_at)
+    WHERE status IN ('queued', 'running');
+
+CREATE INDEX IF NOT EXISTS transcription_jobs_finished_idx
+    ON transcription_jobs (updated_at)
+    WHERE status IN ('done', 'failed');
+
+
+-- Rows of the on-disk embedding matrix, one per embedded utterance
+CREATE TABLE IF NOT EXISTS utterance_embeddings (
+    utterance_id UUID PRIMARY KEY REFERENCES utterances(id),
+    row_idx INTEGER NOT NULL UNIQUE,
+    model TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now()
+);
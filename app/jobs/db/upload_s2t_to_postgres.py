@@ -1,88 +1,131 @@
+import io
 import json
 import uuid
-import psycopg2
-import os
+import time
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
-from pathlib import Path
 
 from logging import getLogger
 logger = getLogger(__name__)
 
-POSTGRES_URL = os.getenv("POSTGRES_URL")
+from jobs.db.connection_pool import chronicle_pool
+from jobs.speech2text.staging_store import staging_store
+from metrics import DB_INSERT_SECONDS, DB_ROWS_TOTAL
+
+class EmptyTranscriptError(Exception):
+    pass
 
 def load_json(file_path: str):
     with open(file_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def insert_utterances(utterances: list[dict]):
-    logger.info("[INSERT DATA TO PGSQL. CONNECT TO DB]")
-    conn = psycopg2.connect(POSTGRES_URL)
-    cursor = conn.cursor()
-    logger.info("[INSERT DATA TO PGSQL. CONNECTION ESTABLISHED]")
-
-    dialog_insert_query = """
-        INSERT INTO dialogs (
-            id,
-            title,
-            started_at ,
-            ended_at,
-            topic_id,
-            tags,
-            source,
-            participants,
-            summary,
-            metadata
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-    logger.info("[INSERT DIALOG]")
-    cursor.execute(
-            dialog_insert_query,
-            (
-                utterances[0]["dialog_id"], #dialog_id
-                "TEST_" + str(datetime.now()), #title
-                datetime.fromisoformat(utterances[0]["created_at"]) + timedelta(seconds=utterances[0]["start_time"]), #started_at
-                datetime.fromisoformat(utterances[0]["created_at"]) + timedelta(seconds=utterances[-1]["end_time"]), #ended_at
-                0, #topic_id
-                [], #tags
-                "", #source
-                [], #participants
-                "", #summary
-                json.dumps({}), #metadata
-            )
-        )
-
-    utt_insert_query = """
-    INSERT INTO utterances (
-        id, dialog_id, speaker, content,
-        start_time, end_time, segment_number,
-        created_at, metadata
+DIALOG_INSERT_QUERY = """
+    INSERT INTO dialogs (
+        id,
+        title,
+        started_at ,
+        ended_at,
+        topic_id,
+        tags,
+        source,
+        participants,
+        summary,
+        metadata
     )
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    VALUES %s
     """
 
-    logger.info("[INSERT UTTERANCES]")
+# content_tsv (full-text search) is a generated column: Postgres fills it during the COPY
+UTTERANCE_COLUMNS = (
+    "id", "dialog_id", "speaker", "content",
+    "start_time", "end_time", "segment_number",
+    "created_at", "metadata",
+)
+
+UTTERANCE_COPY_QUERY = f"COPY utterances ({', '.join(UTTERANCE_COLUMNS)}) FROM STDIN"
+
+def dialog_row(utterances: list[dict]) -> tuple:
+    return (
+        utterances[0]["dialog_id"], #dialog_id
+        "TEST_" + str(datetime.now()), #title
+        datetime.fromisoformat(utterances[0]["created_at"]) + timedelta(seconds=utterances[0]["start_time"]), #started_at
+        datetime.fromisoformat(utterances[0]["created_at"]) + timedelta(seconds=utterances[-1]["end_time"]), #ended_at
+        0, #topic_id
+        [], #tags
+        "", #source
+        [], #participants
+        "", #summary
+        json.dumps({}), #metadata
+    )
+
+def _copy_value(value) -> str:
+    # COPY text format: \N is NULL, backslash and control characters are escaped
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def utterances_copy_buffer(utterances: list[dict]) -> io.StringIO:
+    buf = io.StringIO()
     for u in utterances:
-        cursor.execute(
-            utt_insert_query,
-            (
-                u["id"],
-                u["dialog_id"],
-                u.get("speaker"),
-                u["content"],
-                u["start_time"],
-                u["end_time"],
-                u["segment_number"],
-                u.get("created_at", datetime.now()),
-                json.dumps(u.get("metadata", {})),
-            )
+        row = (
+            u["id"],
+            u["dialog_id"],
+            u.get("speaker"),
+            u["content"],
+            u["start_time"],
+            u["end_time"],
+            u["segment_number"],
+            u.get("created_at", datetime.now()),
+            json.dumps(u.get("metadata", {}), ensure_ascii=False),
+        )
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def insert_dialogs(dialogs: list[list[dict]]) -> int:
+    """
+    Writes many dialogs in one transaction: one multi-row INSERT for the dialogs
+    and one COPY stream for all of their utterances. Dialogs without utterances
+    are skipped. Returns the number of utterances written.
+    """
+    skipped = sum(1 for utterances in dialogs if not utterances)
+    if skipped:
+        logger.warning(f"[INSERT DIALOGS] Skipped {skipped} dialogs without utterances")
+    dialogs = [utterances for utterances in dialogs if utterances]
+    if not dialogs:
+        return 0
+
+    started = time.perf_counter()
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        logger.info(f"[INSERT DIALOGS] {len(dialogs)}")
+        execute_values(cursor, DIALOG_INSERT_QUERY, [dialog_row(u) for u in dialogs])
+
+        logger.info("[COPY UTTERANCES]")
+        cursor.copy_expert(
+            UTTERANCE_COPY_QUERY,
+            utterances_copy_buffer([u for utterances in dialogs for u in utterances]),
         )
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-    logger.info(f"Uploaded {len(utterances)} utterances to Postgres successfully")
+    n_utterances = sum(len(u) for u in dialogs)
+    DB_INSERT_SECONDS.observe(time.perf_counter() - started)
+    DB_ROWS_TOTAL.inc(n_utterances)
+    logger.info(f"Uploaded {len(dialogs)} dialogs with {n_utterances} utterances to Postgres successfully")
+    return n_utterances
+
+def existing_dialog_ids(dialog_ids: list[str]) -> set[str]:
+    with chronicle_pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT id::text FROM dialogs WHERE id = ANY(%s::uuid[])", (list(dialog_ids),))
+        return {row[0] for row in cursor.fetchall()}
+
+def insert_utterances(utterances: list[dict]) -> int:
+    return insert_dialogs([utterances])
 
 from safe_func_dec import safe_run_sync
 @safe_run_sync
@@ -91,9 +134,31 @@ def run_import(json_path: str):
     data = load_json(json_path)
     insert_utterances(data)
 
+@safe_run_sync
+def run_import_staged(session_id: str) -> bool:
+    """
+    Uploads a staged transcript and drops it from staging. False if it expired or was never staged,
+    EmptyTranscriptError if it has no utterances, so nothing was written.
+    """
+    utterances = staging_store.get_utterances(session_id)
+    if utterances is None:
+        logger.warning(f"[IMPORT] {session_id} is not staged")
+        return False
+    logger.info(f"[IMPORT] {session_id} from staging")
+    written = insert_utterances(utterances)
+    staging_store.discard(session_id)
+    if not written:
+        raise EmptyTranscriptError(f"{session_id} has no utterances to upload")
+    return True
+
+@safe_run_sync
+def run_import_batch(json_paths: list[str]):
+    logger.info(f"[IMPORT] Загрузка {len(json_paths)} файлов")
+    insert_dialogs([load_json(path) for path in json_paths])
+
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) != 2:
-        logger.info("Use: python import_utterances.py path/to/utterances.json")
+    if len(sys.argv) < 2:
+        logger.info("Use: python import_utterances.py path/to/utterances.json [more.json ...]")
     else:
-        run_import(sys.argv[1])
+        run_import_batch(sys.argv[1:])
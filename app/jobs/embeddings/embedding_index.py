@@ -0,0 +1,275 @@
+import os
+import json
+import fcntl
+import threading
+from pathlib import Path
+
+import numpy as np
+from psycopg2.extras import RealDictCursor, execute_values
+
+from jobs.db.connection_pool import chronicle_pool
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+EMBEDDINGS_ENABLED = os.getenv("EMBEDDINGS_ENABLED", "0") == "1"
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", "data/embeddings")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+# Utterances pulled from Postgres per round, each round is encoded and appended in one go
+EMBEDDING_FETCH_SIZE = int(os.getenv("EMBEDDING_FETCH_SIZE", 8192))
+# Converting float16 rows dominates a scan, so up to this size the rows are kept in RAM as float32
+EMBEDDING_RAM_CACHE_MB = int(os.getenv("EMBEDDING_RAM_CACHE_MB", 1024))
+
+# Rows scored per step of a query, keeps the float32 copy of the block small
+SCAN_BLOCK_ROWS = 65536
+
+# Anti-join against the mapping table: only utterances without a matrix row are returned
+PENDING_QUERY = """
+    SELECT u.id, u.content
+    FROM utterances u
+    LEFT JOIN utterance_embeddings e ON e.utterance_id = u.id
+    WHERE e.utterance_id IS NULL {dialog_filter}
+    LIMIT %(limit)s
+    """
+
+MAPPING_INSERT_QUERY = """
+    INSERT INTO utterance_embeddings (utterance_id, row_idx, model)
+    VALUES %s
+    ON CONFLICT (utterance_id) DO NOTHING
+    """
+
+LOOKUP_QUERY = """
+    SELECT e.row_idx, u.id, u.dialog_id, u.content, u.start_time, u.end_time, u.segment_number,
+           d.title, d.started_at
+    FROM utterance_embeddings e
+    JOIN utterances u ON u.id = e.utterance_id
+    JOIN dialogs d ON d.id = u.dialog_id
+    WHERE e.row_idx = ANY(%s)
+    """
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine top-k over L2-normalized rows, scanned block by block.
+    Returns (row indexes, scores) sorted by score, best first.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    best_idx = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+
+    for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+        scores = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32) @ query
+        if len(scores) > k:
+            part = np.argpartition(scores, -k)[-k:]
+        else:
+            part = np.arange(len(scores))
+        best_idx = np.concatenate((best_idx, part + start))
+        best_scores = np.concatenate((best_scores, scores[part]))
+        if len(best_scores) > k:
+            keep = np.argpartition(best_scores, -k)[-k:]
+            best_idx, best_scores = best_idx[keep], best_scores[keep]
+
+    order = np.argsort(-best_scores)
+    return best_idx[order], best_scores[order]
+
+
+class EmbeddingIndex:
+    """
+    Sentence embeddings of all Chronicle utterances in one append-only float16 matrix on disk.
+    Postgres keeps the utterance -> matrix row mapping, which is also what makes updates incremental.
+    """
+
+    def __init__(self, directory: str, model_name: str):
+        self.directory = Path(directory)
+        self.model_name = model_name
+        self.vectors_path = self.directory / "vectors.f16"
+        self.meta_path = self.directory / "meta.json"
+        self.lock_path = self.directory / "update.lock"
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._dim = None
+        self._matrix = None
+        self._resident = None
+        self._resident_rows = 0
+        self._resident_lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"[EMBEDDINGS] Loading model {self.model_name}")
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+            return self._model
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            if self.meta_path.exists():
+                meta = json.loads(self.meta_path.read_text())
+                if meta["model"] != self.model_name:
+                    raise RuntimeError(
+                        f"Embedding index in {self.directory} was built with {meta['model']}, "
+                        f"not {self.model_name}. Remove it and TRUNCATE utterance_embeddings to rebuild."
+                    )
+                self._dim = meta["dim"]
+            else:
+                self._dim = self.model.get_sentence_embedding_dimension()
+        return self._dim
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * np.dtype(np.float16).itemsize
+
+    def rows(self) -> int:
+        if not self.vectors_path.exists():
+            return 0
+        return os.path.getsize(self.vectors_path) // self.row_bytes
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.astype(np.float16)
+
+    def matrix(self) -> np.ndarray:
+        """Read-only memory map of the matrix, reopened when it has grown."""
+        n_rows = self.rows()
+        if self._matrix is None or len(self._matrix) != n_rows:
+            if n_rows == 0:
+                return np.zeros((0, self.dim), dtype=np.float16)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(n_rows, self.dim))
+        return self._matrix
+
+    def vectors(self) -> np.ndarray:
+        """
+        Rows to score a query against: a float32 copy in RAM while it fits EMBEDDING_RAM_CACHE_MB,
+        only rows added since the last call are converted. Larger indexes are scanned from the map.
+        """
+        matrix = self.matrix()
+        n_rows = len(matrix)
+        max_rows = EMBEDDING_RAM_CACHE_MB * 2**20 // (self.dim * 4)
+        with self._resident_lock:
+            if n_rows > max_rows:
+                self._resident, self._resident_rows = None, 0
+                return matrix
+            if self._resident is None or len(self._resident) < n_rows:
+                capacity = min(max(n_rows, 2 * self._resident_rows, 1024), max_rows)
+                grown = np.empty((capacity, self.dim), dtype=np.float32)
+                if self._resident is not None:
+                    grown[:self._resident_rows] = self._resident[:self._resident_rows]
+                self._resident = grown
+            self._resident[self._resident_rows:n_rows] = matrix[self._resident_rows:n_rows]
+            self._resident_rows = n_rows
+            return self._resident[:n_rows]
+
+    def update(self, dialog_id: str = None) -> int:
+        """
+        Embeds utterances that have no matrix row yet, of one dialog or of the whole Chronicle.
+        Returns the number of utterances added.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        added = 0
+        with open(self.lock_path, "w") as lock:
+            # One writer at a time, across threads and processes
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._write_meta()
+                self._drop_partial_row()
+                while True:
+                    pending = self._pending(dialog_id)
+                    if not pending:
+                        break
+                    added += self._append(pending)
+                    if len(pending) < EMBEDDING_FETCH_SIZE:
+                        break
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        if added:
+            logger.info(f"[EMBEDDINGS] Added {added} utterances, index has {self.rows()} rows")
+        return added
+
+    def search(self, query: str, k: int = 10) -> list[dict]:
+        """Top-k utterances by cosine similarity to the query text, best first."""
+        vectors = self.vectors()
+        if len(vectors) == 0:
+            return []
+        query_vector = self.encode([query])[0]
+        # A few spare candidates: rows of an interrupted update have no mapping and are skipped
+        idx, scores = top_k(vectors, query_vector, k + 8)
+        score_by_row = dict(zip(idx.tolist(), scores.tolist()))
+
+        with chronicle_pool.connection() as conn, conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(LOOKUP_QUERY, (list(score_by_row),))
+            rows = cursor.fetchall()
+
+        for row in rows:
+            row["score"] = score_by_row[row["row_idx"]]
+        rows.sort(key=lambda r: r["score"], reverse=True)
+        return rows[:k]
+
+    def _write_meta(self):
+        if not self.meta_path.exists():
+            self.meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}))
+
+    def _drop_partial_row(self):
+        """A crash in the middle of an append can leave a torn last row."""
+        if self.vectors_path.exists():
+            size = os.path.getsize(self.vectors_path)
+            if size % self.row_bytes:
+                os.truncate(self.vectors_path, size - size % self.row_bytes)
+
+    def _pending(self, dialog_id: str = None) -> list[tuple]:
+        sql = PENDING_QUERY.format(dialog_filter="AND u.dialog_id = %(dialog_id)s" if dialog_id else "")
+        with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+            cursor.execute(sql, {"dialog_id": dialog_id, "limit": EMBEDDING_FETCH_SIZE})
+            return cursor.fetchall()
+
+    def _append(self, pending: list[tuple]) -> int:
+        ids = [row[0] for row in pending]
+        vectors = self.encode([row[1] or "" for row in pending])
+
+        # Vectors are durable before Postgres points at them; a crash in between
+        # only leaves unreferenced rows, and those utterances are embedded again
+        first_row = self.rows()
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        mapping = [(uid, first_row + i, self.model_name) for i, uid in enumerate(ids)]
+        with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+            execute_values(cursor, MAPPING_INSERT_QUERY, mapping, page_size=1000)
+        return len(ids)
+
+
+embedding_index = EmbeddingIndex(EMBEDDINGS_DIR, EMBEDDING_MODEL)
+
+
+if __name__ == "__main__":
+    # python -m jobs.embeddings.embedding_index backfill | search "query" [-k 10]
+    import argparse
+
+    from log_setup import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Semantic index over Chronicle utterances")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill = sub.add_parser("backfill", help="Embed all utterances that are not indexed yet")
+    backfill.add_argument("--dialog", help="Only this dialog id")
+    search = sub.add_parser("search", help="Top-k utterances for a query")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=10)
+    cli_args = parser.parse_args()
+
+    if cli_args.command == "backfill":
+        print(f"Added {embedding_index.update(cli_args.dialog)} utterances")
+    else:
+        for hit in embedding_index.search(cli_args.query, cli_args.k):
+            print(f"{hit['score']:.3f}  {hit['dialog_id']}  [{hit['start_time']:.1f}s]  {hit['content'].strip()}")
@@ -0,0 +1,97 @@
+import os
+import subprocess
+
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+SAMPLE_RATE = 16000
+PCM_SUFFIX = ".pcm16k.f32"
+# Speech regions found in a PCM file, kept next to it so they are detected once per job
+REGIONS_SUFFIX = ".vad.json"
+BYTES_PER_SAMPLE = 4
+# Frame energies are computed this many samples at a time, whatever the length of the audio
+ENERGY_BLOCK_SAMPLES = 2 ** 20
+
+
+def is_prepared(file_path: str) -> bool:
+    return str(file_path).endswith(PCM_SUFFIX)
+
+
+def pcm_path_for(file_path: str) -> str:
+    return str(file_path) + PCM_SUFFIX
+
+
+def prepare_audio(file_path: str) -> str:
+    """
+    Decodes an audio file once to mono 16 kHz float32 samples stored next to it.
+    Returns the path of the raw PCM file; reuses it if it is already up to date.
+    """
+    if is_prepared(file_path):
+        return file_path
+
+    pcm_path = pcm_path_for(file_path)
+    if os.path.exists(pcm_path) and os.path.getmtime(pcm_path) >= os.path.getmtime(file_path):
+        return pcm_path
+
+    tmp_path = pcm_path + ".part"
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", str(file_path),
+        "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE),
+        "-y", tmp_path,
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"Failed to decode audio {file_path}: {e.stderr.decode(errors='ignore')}") from e
+    os.replace(tmp_path, pcm_path)
+
+    logger.info(f"[AUDIO PREPARED] {pcm_path} ({pcm_duration(pcm_path):.1f}s)")
+    return pcm_path
+
+
+def load_pcm(pcm_path: str, start: int = 0, end: int = None) -> np.ndarray:
+    """
+    Memory-maps prepared samples [start:end) without reading them into RAM.
+    Copy-on-write mode keeps the array writable for torch.from_numpy without touching the file.
+    """
+    n_samples = os.path.getsize(pcm_path) // BYTES_PER_SAMPLE
+    end = n_samples if end is None else min(end, n_samples)
+    if end <= start:
+        return np.zeros(0, dtype=np.float32)
+    mm = np.memmap(pcm_path, dtype=np.float32, mode="c", offset=start * BYTES_PER_SAMPLE, shape=(end - start,))
+    return np.asarray(mm)
+
+
+def write_pcm(pcm_path: str, audio: np.ndarray) -> str:
+    tmp_path = pcm_path + ".part"
+    np.asarray(audio, dtype=np.float32).tofile(tmp_path)
+    os.replace(tmp_path, pcm_path)
+    return pcm_path
+
+
+def frame_energy(audio: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS energy of consecutive non-overlapping frames, read in bounded blocks of a memory-mapped file."""
+    n_frames = len(audio) // frame_len
+    energy = np.empty(n_frames, dtype=np.float32)
+    step = max(1, ENERGY_BLOCK_SAMPLES // frame_len)
+    for start in range(0, n_frames, step):
+        end = min(n_frames, start + step)
+        frames = np.asarray(audio[start * frame_len:end * frame_len], dtype=np.float32).reshape(end - start, frame_len)
+        energy[start:end] = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_len + 1e-12)
+    return energy
+
+
+def pcm_duration(pcm_path: str) -> float:
+    return os.path.getsize(pcm_path) / BYTES_PER_SAMPLE / SAMPLE_RATE
+
+
+def remove_prepared(file_path: str):
+    pcm_path = file_path if is_prepared(file_path) else pcm_path_for(file_path)
+    for path in (pcm_path, pcm_path + REGIONS_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from jobs.speech2text.model_registry import model_registry
+from jobs.speech2text.audio_prep import SAMPLE_RATE
+from jobs.speech2text.cpu_allocator import cpu_allocator
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+BATCH_DECODE_ENABLED = os.getenv("BATCH_DECODE_ENABLED", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 8))
+# Longest extra latency a job accepts while waiting for others to join its batch
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 100))
+# Only audio that fits one Whisper window is batched, longer audio needs the seeking decode loop
+BATCH_MAX_AUDIO_SEC = 30.0
+WINDOW_SAMPLES = int(BATCH_MAX_AUDIO_SEC * SAMPLE_RATE)
+
+# Same silence rule as whisper.transcribe
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+TIME_PRECISION = 0.02
+
+
+class _Request:
+    def __init__(self, audio: np.ndarray):
+        self.audio = audio
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchingEngine:
+    """
+    Decodes single-window jobs of concurrent callers together. Jobs with the same
+    model, language and temperature wait up to max_wait_ms for each other and run
+    through the encoder and decoder as one batch.
+    """
+
+    def __init__(self, max_batch: int, max_wait_ms: float):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        # Callers that can be in transcribe() at the same time; a batch of that size is dispatched at once
+        self.concurrency = 1
+        self._pending: dict[tuple, list[_Request]] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {"batches": 0, "windows": 0}
+
+    def set_concurrency(self, callers: int):
+        """Set by the worker pool that feeds the engine, so a single worker never waits for company."""
+        with self._cond:
+            self.concurrency = max(1, callers)
+
+    @property
+    def active(self) -> bool:
+        """With one caller every batch would be a batch of one: the plain transcribe path is used instead."""
+        return BATCH_DECODE_ENABLED and self.concurrency > 1
+
+    def accepts(self, audio: np.ndarray) -> bool:
+        return self.active and 0 < len(audio) <= WINDOW_SAMPLES
+
+    def transcribe(self, model_size: str, audio: np.ndarray, options: dict) -> dict:
+        """Blocks until the batch containing this audio is decoded. Returns a whisper.transcribe-like result."""
+        key = (model_size, options.get("language"), float(options.get("temperature") or 0.0))
+        request = _Request(audio)
+        with self._cond:
+            self._ensure_thread()
+            self._pending.setdefault(key, []).append(request)
+            self._cond.notify()
+        return request.future.result()
+
+    def _ensure_thread(self):
+        # Caller holds self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Waits for the oldest group to fill up or to reach its wait limit."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                key, requests = min(self._pending.items(), key=lambda item: item[1][0].enqueued_at)
+                remaining = requests[0].enqueued_at + self.max_wait - time.monotonic()
+                if len(requests) >= min(self.max_batch, self.concurrency) or remaining <= 0:
+                    batch = requests[:self.max_batch]
+                    rest = requests[self.max_batch:]
+                    if rest:
+                        self._pending[key] = rest
+                    else:
+                        del self._pending[key]
+                    return key, batch
+                self._cond.wait(remaining)
+
+    def _run(self):
+        while True:
+            key, batch = self._next_batch()
+            try:
+                results = self._decode(key, batch)
+            except Exception as e:
+                logger.exception(f"[BATCH DECODE FAILED] {key}: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+    def _decode(self, key: tuple, batch: list[_Request]) -> list[dict]:
+        import torch
+        import whisper
+        from whisper.audio import N_FRAMES, N_SAMPLES
+        from whisper.tokenizer import get_tokenizer
+
+        model_size, language, temperature = key
+        decode_options = whisper.DecodingOptions(
+            task="transcribe",
+            language=language,
+            temperature=temperature,
+            without_timestamps=False,
+            fp16=False,
+        )
+        started = time.perf_counter()
+        # A batch holds one share of the cores, like any single job
+        with model_registry.acquire(model_size) as model, cpu_allocator.inference():
+            mel = torch.stack([self._window_mel(r.audio, model.dims.n_mels, N_SAMPLES, N_FRAMES) for r in batch]).to(model.device)
+            decoded = whisper.decode(model, mel, decode_options)
+
+            results = []
+            for request, result in zip(batch, decoded):
+                tokenizer = get_tokenizer(
+                    model.is_multilingual,
+                    num_languages=model.num_languages,
+                    language=result.language,
+                    task="transcribe",
+                )
+                results.append(self._to_transcript(result, tokenizer, len(request.audio) / SAMPLE_RATE))
+
+        self.stats["batches"] += 1
+        self.stats["windows"] += len(batch)
+        logger.info(
+            f"[BATCH DECODE] model={model_size} batch={len(batch)} "
+            f"in {time.perf_counter() - started:.2f}s, stats={self.stats}"
+        )
+        return results
+
+    @staticmethod
+    def _window_mel(audio: np.ndarray, n_mels: int, n_samples: int, n_frames: int):
+        """
+        The window's log-mel exactly as whisper.transcribe builds it: from the audio padded
+        with 30 s of silence, cut to the frames of the audio itself, then padded to a full window.
+        """
+        import whisper
+
+        mel = whisper.log_mel_spectrogram(audio, n_mels, padding=n_samples)
+        content_frames = mel.shape[-1] - n_frames
+        return whisper.pad_or_trim(mel[:, :content_frames], n_frames)
+
+    @staticmethod
+    def _to_transcript(result, tokenizer, duration_sec: float) -> dict:
+        """Splits the decoded tokens into segments at their timestamp tokens, like whisper.transcribe does."""
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return {"text": "", "segments": [], "language": result.language}
+
+        segments = []
+        start = None
+        text_tokens = []
+
+        def close(end: float):
+            text = tokenizer.decode(text_tokens)
+            if text.strip():
+                segments.append({
+                    "id": len(segments),
+                    "seek": 0,
+                    "start": start,
+                    "end": min(end, duration_sec),
+                    "text": text,
+                    "tokens": list(text_tokens),
+                    "temperature": result.temperature,
+                    "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio,
+                    "no_speech_prob": result.no_speech_prob,
+                })
+
+        for token in result.tokens:
+            if token >= tokenizer.timestamp_begin:
+                t = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+                if start is None:
+                    start = t
+                elif text_tokens:
+                    close(t)
+                    start, text_tokens = None, []
+                else:
+                    # Second of a pair of timestamps opens the next segment
+                    start = t
+            else:
+                if start is None:
+                    start = segments[-1]["end"] if segments else 0.0
+                text_tokens.append(token)
+
+        if text_tokens:
+            # The window ended before the closing timestamp
+            close(duration_sec)
+
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": result.language,
+        }
+
+
+batching_engine = BatchingEngine(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
@@ -0,0 +1,280 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+from jobs.speech2text.cpu_allocator import cpu_allocator
+from jobs.speech2text.staging_store import utterance_rows, APP_DIR
+from log_setup import setup_logging
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".ogg", ".oga", ".opus", ".mp3", ".m4a", ".aac", ".wav", ".flac", ".webm", ".mp4", ".wma"}
+BULK_DIR = APP_DIR / "temp_data" / "bulk"
+# Dialog ids are derived from the file, so a re-run can tell which dialogs already reached the Chronicle
+DIALOG_NAMESPACE = uuid.UUID("c927d95e-ed89-4cb1-a94b-a00241ad4bc2")
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dialog_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    audio_sec REAL,
+    segments INTEGER,
+    error TEXT,
+    finished_at REAL NOT NULL
+);
+"""
+
+
+def dialog_id_for(path: Path) -> str:
+    stat = path.stat()
+    return str(uuid.uuid5(DIALOG_NAMESPACE, f"{path}|{stat.st_size}|{stat.st_mtime_ns}"))
+
+
+def read_sources(source: str, language: str = None) -> list[dict]:
+    """
+    Audio files to process: every audio file under a directory, or a manifest with
+    one path per line (.txt) or one JSON object per line (.jsonl) with "path" and
+    optional "language", "speaker" and "created_at". Relative paths are taken from
+    the manifest's directory.
+    """
+    source = Path(source).resolve()
+    if source.is_dir():
+        entries = [{"path": p} for p in sorted(source.rglob("*")) if p.suffix.lower() in AUDIO_EXTENSIONS]
+    elif source.suffix == ".jsonl":
+        with open(source, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(source, encoding="utf-8") as f:
+            entries = [{"path": line.strip()} for line in f if line.strip()]
+
+    base = source if source.is_dir() else source.parent
+    items = []
+    for entry in entries:
+        path = (base / entry["path"]).resolve()
+        if not path.is_file():
+            logger.warning(f"[BULK] Skipping missing file {path}")
+            continue
+        items.append({
+            "path": str(path),
+            "dialog_id": dialog_id_for(path),
+            "language": entry.get("language", language),
+            "speaker": entry.get("speaker", ""),
+            "created_at": entry.get("created_at") or datetime.fromtimestamp(path.stat().st_mtime).isoformat(),
+        })
+    return items
+
+
+class Checkpoint:
+    """Files that are finished: transcribed and in the Chronicle, or failed."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.executescript(CHECKPOINT_SCHEMA)
+
+    def finished(self, retry_failed: bool) -> set[str]:
+        query = "SELECT path FROM files" + (" WHERE status = 'done'" if retry_failed else "")
+        with closing(sqlite3.connect(self.path)) as conn:
+            return {row[0] for row in conn.execute(query)}
+
+    def mark_done(self, results: list[dict]):
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, dialog_id, status, audio_sec, segments, finished_at) "
+                "VALUES (?, ?, 'done', ?, ?, ?)",
+                [(r["path"], r["dialog_id"], r["audio_sec"], len(r["segments"]), time.time()) for r in results],
+            )
+
+    def mark_failed(self, item: dict, error: Exception):
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (path, dialog_id, status, error, finished_at) VALUES (?, ?, 'failed', ?, ?)",
+                (item["path"], item["dialog_id"], str(error), time.time()),
+            )
+
+
+def _init_worker(model_size: str):
+    from jobs.speech2text.model_registry import model_registry
+
+    setup_logging()
+    # Loaded once per worker process and reused for every file it gets
+    model_registry.preload([model_size])
+
+
+def transcribe_file(item: dict, work_dir: str, model_size: str, temperature: float) -> dict:
+    """Runs in a worker process. The archive is read-only to us: the PCM goes to work_dir via a link."""
+    from jobs.speech2text.audio_prep import prepare_audio, remove_prepared
+    from jobs.speech2text.whisper_worker import run_whisper
+
+    link = os.path.join(work_dir, item["dialog_id"] + Path(item["path"]).suffix)
+    if not os.path.lexists(link):
+        os.symlink(item["path"], link)
+    try:
+        pcm_path = prepare_audio(link)
+        segments, _, timings = run_whisper(pcm_path, {
+            "model": model_size,
+            "language": item["language"],
+            "temperature": temperature,
+            "session_id": item["dialog_id"],
+        })
+    finally:
+        remove_prepared(link)
+        os.remove(link)
+
+    return {
+        **item,
+        "segments": [{key: seg[key] for key in ("id", "start", "end", "text")} for seg in segments],
+        "audio_sec": timings["duration_sec"],
+    }
+
+
+class BulkIngest:
+    """Collects finished transcripts and writes them to the Chronicle in batches of about batch_rows utterances."""
+
+    def __init__(self, checkpoint: Checkpoint, batch_rows: int):
+        from jobs.db.upload_s2t_to_postgres import insert_dialogs, existing_dialog_ids
+
+        self._insert_dialogs = insert_dialogs
+        self._existing_dialog_ids = existing_dialog_ids
+        self.checkpoint = checkpoint
+        self.batch_rows = batch_rows
+        self.pending: list[dict] = []
+        self.pending_rows = 0
+        self.files = 0
+        self.rows = 0
+
+    def add(self, result: dict):
+        self.pending.append(result)
+        self.pending_rows += len(result["segments"])
+        if self.pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # Dialogs committed just before an interrupted run ended are not inserted twice
+        existing = self._existing_dialog_ids([r["dialog_id"] for r in self.pending])
+        dialogs = [
+            utterance_rows(r["dialog_id"], r["segments"], r["speaker"], r["created_at"])
+            for r in self.pending if r["dialog_id"] not in existing
+        ]
+        self._insert_dialogs(dialogs)
+        self.checkpoint.mark_done(self.pending)
+
+        self.files += len(self.pending)
+        self.rows += sum(len(d) for d in dialogs)
+        self.pending = []
+        self.pending_rows = 0
+
+
+def run_bulk(args) -> dict:
+    items = read_sources(args.source, args.language)
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else BULK_DIR / f"{Path(args.source).resolve().name}.progress.sqlite3"
+    checkpoint = Checkpoint(checkpoint_path)
+    finished = checkpoint.finished(args.retry_failed)
+    todo = [item for item in items if item["path"] not in finished]
+    logger.info(f"[BULK] {len(items)} files, {len(items) - len(todo)} already finished, checkpoint {checkpoint_path}")
+    if not todo:
+        return {"files": 0, "failed": 0, "audio_hours": 0.0, "audio_hours_per_hour": 0.0}
+
+    # Files are the unit of parallelism: chunking inside a file is off and the cores are split between the workers
+    workers = max(1, args.workers)
+    os.environ["CHUNKED_MIN_DURATION_SEC"] = "inf"
+    os.environ["TRANSCRIBE_THREADS"] = str(args.threads or max(1, cpu_allocator.cores // workers))
+    work_dir = BULK_DIR / "work"
+    os.makedirs(work_dir, exist_ok=True)
+
+    ingest = BulkIngest(checkpoint, args.batch_rows)
+    failed = 0
+    audio_sec = 0.0
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.model,),
+    )
+    try:
+        futures = {
+            pool.submit(transcribe_file, item, str(work_dir), args.model, args.temperature): item
+            for item in todo
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A worker died (killed for memory, say): no file is at fault, so none is marked
+                # failed and a plain re-run picks up every unfinished one
+                logger.error(
+                    f"[BULK] A worker process died, aborting with {len(todo) - done + 1} files unfinished. "
+                    f"Run again to continue."
+                )
+                raise
+            except Exception as e:
+                logger.error(f"[BULK] {item['path']} failed: {e}")
+                checkpoint.mark_failed(item, e)
+                failed += 1
+                continue
+            audio_sec += result["audio_sec"]
+            ingest.add(result)
+
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"[BULK] {done}/{len(todo)} files, {audio_sec / 3600:.2f} audio hours in {elapsed / 3600:.2f} h "
+                f"({audio_sec / elapsed:.2f} audio-hours/hour)"
+            )
+    except BaseException:
+        # Whatever finished before an interruption is still stored and checkpointed. If that
+        # fails too (the interruption may be a failed flush), the original error is the one raised
+        try:
+            ingest.flush()
+        except Exception as e:
+            logger.error(f"[BULK] Storing the finished transcripts failed as well: {e}")
+        raise
+    else:
+        ingest.flush()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "files": ingest.files,
+        "failed": failed,
+        "utterances": ingest.rows,
+        "audio_hours": audio_sec / 3600,
+        "wall_hours": elapsed / 3600,
+        "audio_hours_per_hour": audio_sec / elapsed if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    # python -m jobs.speech2text.bulk_transcribe /archive/dir | manifest.txt | manifest.jsonl [--workers 4]
+    import argparse
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Transcribe an audio archive into the Chronicle")
+    parser.add_argument("source", help="Directory of audio files, or a .txt / .jsonl manifest")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--language", default=None, help="Language of files the manifest does not set (default: detect)")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=max(1, cpu_allocator.cores // 4), help="Worker processes, each with its own model")
+    parser.add_argument("--threads", type=int, help="Torch threads per worker (default: cores / workers)")
+    parser.add_argument("--batch-rows", type=int, default=20000, help="Utterances per Chronicle insert")
+    parser.add_argument("--checkpoint", help="Progress file (default: temp_data/bulk/<source>.progress.sqlite3)")
+    parser.add_argument("--retry-failed", action="store_true", help="Process files that failed in earlier runs again")
+    cli_args = parser.parse_args()
+
+    summary = run_bulk(cli_args)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,229 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+
+from jobs.speech2text.model_registry import model_registry, model_ram_bytes
+from jobs.speech2text.audio_prep import load_pcm, frame_energy, SAMPLE_RATE
+from jobs.speech2text.cpu_allocator import cpu_allocator, FIXED_THREADS
+from jobs.speech2text.batched_decode import batching_engine, BATCH_MAX_AUDIO_SEC
+from log_setup import setup_logging
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+FRAME_SEC = 0.02
+
+# Chunk processes run with a fixed thread count, a chunk is too short to rebalance
+CHUNK_THREADS = FIXED_THREADS or 2
+CHUNKED_MIN_DURATION_SEC = float(os.getenv("CHUNKED_MIN_DURATION_SEC", 600))
+CHUNK_TARGET_SEC = float(os.getenv("CHUNK_TARGET_SEC", 300))
+CHUNK_OVERLAP_SEC = float(os.getenv("CHUNK_OVERLAP_SEC", 1.0))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", max(1, cpu_allocator.cores // CHUNK_THREADS)))
+
+_pools: dict = {}
+_pools_lock = threading.Lock()
+
+
+class _ChunkPool:
+    """
+    Worker processes of one model size. Each keeps its model resident between
+    chunks, so the pool has as many processes as copies of the model fit in the
+    parent's model RAM budget, charged to it for as long as the pool lives.
+    """
+
+    def __init__(self, model_size: str):
+        self.model_size = model_size
+        self.model_bytes = model_ram_bytes(model_size)
+        self.workers = model_registry.reserve(self.model_bytes, CHUNK_WORKERS)
+        self.jobs = 0
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_chunk_worker,
+            initargs=(CHUNK_THREADS,),
+        )
+        logger.info(f"[CHUNK POOL] {model_size}: {self.workers} workers of up to {CHUNK_WORKERS}")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        model_registry.unreserve(self.workers * self.model_bytes)
+        logger.info(f"[CHUNK POOL] {self.model_size} closed")
+
+
+def execution_mode(speech_sec: float) -> str:
+    """How run_whisper decodes this much audio (after the VAD pass): chunked, batched or single."""
+    if speech_sec >= CHUNKED_MIN_DURATION_SEC:
+        return "chunked"
+    if batching_engine.active and 0 < speech_sec <= BATCH_MAX_AUDIO_SEC:
+        return "batched"
+    return "single"
+
+
+def find_silence_cuts(audio: np.ndarray, target_sec: float, search_sec: float = None) -> list[int]:
+    """
+    Returns sample indices where the audio should be cut so that chunks are about
+    target_sec long. Each cut is placed in the quietest ~0.5 s stretch within
+    search_sec of the ideal position, so words are not split in half.
+    """
+    frame_len = int(SAMPLE_RATE * FRAME_SEC)
+    energy = frame_energy(audio, frame_len)
+    if len(energy) == 0:
+        return []
+
+    # Smooth over ~0.5 s so a single quiet frame between syllables is not picked
+    smooth = max(1, int(0.5 / FRAME_SEC))
+    energy = np.convolve(energy, np.ones(smooth) / smooth, mode="same")
+
+    target = int(target_sec / FRAME_SEC)
+    search = int((search_sec if search_sec is not None else min(30.0, target_sec / 4)) / FRAME_SEC)
+
+    cuts = []
+    last = 0
+    while len(energy) - last > target + search:
+        lo = max(last + 1, last + target - search)
+        hi = min(len(energy), last + target + search)
+        best = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(best * frame_len)
+        last = best
+    return cuts
+
+
+def plan_chunks(n_samples: int, cuts: list[int], overlap_sec: float) -> list[tuple[int, int, int, int]]:
+    """
+    Turns cut points into chunks. Each chunk is (keep_start, keep_end, read_start, read_end):
+    audio is read with overlap on both sides, segments are kept by the keep range.
+    """
+    overlap = int(overlap_sec * SAMPLE_RATE)
+    bounds = [0] + cuts + [n_samples]
+    return [
+        (start, end, max(0, start - overlap), min(n_samples, end + overlap))
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def _init_chunk_worker(threads: int):
+    import torch
+    torch.set_num_threads(threads)
+    setup_logging()
+
+
+def _transcribe_chunk(model_size: str, audio, options: dict, read_range: tuple[int, int] = None) -> dict:
+    # Given a prepared PCM path, the chunk is memory-mapped here instead of pickled over
+    if read_range is not None:
+        audio = load_pcm(audio, *read_range)
+    with model_registry.acquire(model_size) as model:
+        return model.transcribe(audio, **options)
+
+
+def _acquire_pool(model_size: str) -> _ChunkPool:
+    """The pool of this model size, counted as in use until _release_pool."""
+    with _pools_lock:
+        pool = _pools.get(model_size)
+        if pool is None:
+            # Idle pools of other sizes give their memory back first
+            for size, idle in list(_pools.items()):
+                if idle.jobs == 0:
+                    idle.close()
+                    del _pools[size]
+            pool = _pools[model_size] = _ChunkPool(model_size)
+        pool.jobs += 1
+        return pool
+
+
+def _release_pool(pool: _ChunkPool):
+    with _pools_lock:
+        pool.jobs -= 1
+
+
+def chunk_segments(chunk: tuple[int, int, int, int], result: dict) -> list[dict]:
+    """Segments of one chunk shifted to the original timeline, without the neighbours' overlap."""
+    keep_start, keep_end, read_start, _ = chunk
+    offset = read_start / SAMPLE_RATE
+    keep_from = keep_start / SAMPLE_RATE
+    keep_to = keep_end / SAMPLE_RATE
+
+    segments = []
+    for seg in result["segments"]:
+        start = seg["start"] + offset
+        end = seg["end"] + offset
+        if keep_from <= (start + end) / 2 < keep_to:
+            segments.append({**seg, "start": start, "end": end})
+    return segments
+
+
+def merge_chunk_results(chunks: list[tuple[int, int, int, int]], results: list[dict]) -> dict:
+    """
+    Shifts chunk segments to the original timeline, drops the ones that belong
+    to a neighbour's overlap and renumbers them into one Whisper-like result.
+    """
+    segments = []
+    languages = Counter()
+    for chunk, result in zip(chunks, results):
+        if result.get("language"):
+            languages[result["language"]] += 1
+        segments.extend(chunk_segments(chunk, result))
+
+    segments.sort(key=lambda s: s["start"])
+    for i, seg in enumerate(segments):
+        seg["id"] = i
+
+    return {
+        "text": "".join(seg["text"] for seg in segments),
+        "segments": segments,
+        "language": languages.most_common(1)[0][0] if languages else None,
+    }
+
+
+def transcribe_chunked(
+    model_size: str, audio: np.ndarray, options: dict, pcm_path: str = None, on_segments=None, checkpoint=None
+) -> dict:
+    """
+    Transcribes long audio as silence-aligned chunks in parallel processes.
+    on_segments gets the segments of each chunk in order, as soon as it and the ones before it are done.
+    With a checkpoint every finished chunk is saved, and chunks saved by an earlier run are not decoded again.
+    """
+    cuts = find_silence_cuts(audio, CHUNK_TARGET_SEC)
+    chunks = plan_chunks(len(audio), cuts, CHUNK_OVERLAP_SEC)
+    done = checkpoint.restore(chunks) if checkpoint is not None else {}
+    pool = _acquire_pool(model_size)
+    logger.info(
+        f"[CHUNKED TRANSCRIBE] {len(audio) / SAMPLE_RATE:.0f}s audio in {len(chunks)} chunks, "
+        f"{len(done)} restored, workers={pool.workers}"
+    )
+
+    # Saved as each chunk finishes, in any order, so a crash loses only the ones still running
+    futures = {}
+    results = dict(done)
+    emitted = 0
+    try:
+        for idx, (_, _, read_start, read_end) in enumerate(chunks):
+            if idx in done:
+                continue
+            if pcm_path is not None:
+                future = pool.executor.submit(_transcribe_chunk, model_size, pcm_path, options, (read_start, read_end))
+            else:
+                future = pool.executor.submit(_transcribe_chunk, model_size, np.ascontiguousarray(audio[read_start:read_end]), options)
+            futures[future] = idx
+
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            if checkpoint is not None:
+                checkpoint.save(idx, chunks[idx], results[idx])
+            while on_segments is not None and emitted in results:
+                on_segments(chunk_segments(chunks[emitted], results[emitted]))
+                emitted += 1
+    finally:
+        # Chunks not started yet are dropped, the running ones finish in their process
+        for future in futures:
+            future.cancel()
+        _release_pool(pool)
+    if on_segments is not None:
+        # Only left when every chunk came from the checkpoint
+        for idx in range(emitted, len(chunks)):
+            on_segments(chunk_segments(chunks[idx], results[idx]))
+    return merge_chunk_results(chunks, [results[idx] for idx in range(len(chunks))])
@@ -0,0 +1,155 @@
+import itertools
+import math
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Fixed intra-op threads per job; "auto" splits the available cores between the running jobs
+TRANSCRIBE_THREADS = os.getenv("TRANSCRIBE_THREADS", "auto")
+FIXED_THREADS = int(TRANSCRIBE_THREADS) if TRANSCRIBE_THREADS.isdigit() else None
+# Overrides the detected core count, e.g. when the container limit is not visible
+CPU_CORES = int(os.getenv("CPU_CORES", 0))
+# Pin each process worker to the cores of its job (process mode only)
+CPU_PINNING = os.getenv("CPU_PINNING", "0") == "1"
+
+
+def cgroup_cpu_limit():
+    """CPU quota of the container in cores, None if there is no limit."""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def detect_cpus() -> list[int]:
+    """CPUs this process may run on, cut down to the cgroup quota or CPU_CORES."""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = list(range(os.cpu_count() or 1))
+
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        # A quota of 2.5 cores still lets 3 threads make progress
+        cpus = cpus[:max(1, math.ceil(limit))]
+    if CPU_CORES > 0:
+        cpus = cpus[:CPU_CORES]
+    return cpus
+
+
+def pin_process(cpus) -> None:
+    """Moves every thread of the process, including existing torch pool threads, onto cpus."""
+    try:
+        tids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        tids = [0]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except (OSError, AttributeError):
+            pass
+
+
+@dataclass(frozen=True)
+class CpuGrant:
+    id: int
+    threads: int
+    cpus: tuple = ()
+
+
+class CpuAllocator:
+    """
+    Splits the available cores between the transcription jobs running at the moment.
+    A starting job gets an equal share of the cores given the jobs already running,
+    preferring cores no other job holds. Shares of running jobs are not shrunk: the
+    cores are briefly oversubscribed until one of them finishes, and the next job
+    to start sees the freed cores.
+    """
+
+    def __init__(self, cpus: list[int], fixed_threads: int = None, pinning: bool = False):
+        self.cpus = list(cpus)
+        self.cores = len(self.cpus)
+        self.fixed_threads = fixed_threads
+        self.pinning = pinning
+        self._grants: dict[int, CpuGrant] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _share(self, jobs: int) -> int:
+        if self.fixed_threads is not None:
+            return self.fixed_threads
+        return max(1, self.cores // max(1, jobs))
+
+    def expected_threads(self) -> int:
+        """Threads a job starting now would get, for time estimates."""
+        with self._lock:
+            return self._share(len(self._grants) + 1)
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return len(self._grants)
+
+    def allocate(self) -> CpuGrant:
+        with self._lock:
+            threads = self._share(len(self._grants) + 1)
+            cpus = ()
+            if self.pinning:
+                # Least used cores first, so jobs stay on disjoint cores while there are enough
+                used = Counter(cpu for grant in self._grants.values() for cpu in grant.cpus)
+                cpus = tuple(sorted(self.cpus, key=lambda cpu: used[cpu])[:threads])
+            grant = CpuGrant(next(self._ids), threads, cpus)
+            self._grants[grant.id] = grant
+        return grant
+
+    def release(self, grant: CpuGrant) -> None:
+        with self._lock:
+            self._grants.pop(grant.id, None)
+
+    def adopt(self, grant: CpuGrant) -> None:
+        """
+        Makes a grant from the parent process the whole budget of this worker process,
+        so the jobs it runs stay within the cores the parent gave out.
+        """
+        with self._lock:
+            self.cores = grant.threads
+            if grant.cpus:
+                self.cpus = list(grant.cpus)
+        if grant.cpus:
+            pin_process(grant.cpus)
+
+    @contextmanager
+    def inference(self):
+        """
+        Holds a share of the cores for one model run and sets the torch threads of the
+        calling thread to it. torch.set_num_threads only affects the OpenMP team of the
+        thread that calls it, so concurrent jobs each run with their own share.
+        """
+        import torch
+
+        grant = self.allocate()
+        try:
+            torch.set_num_threads(grant.threads)
+            logger.info(f"[CPU GRANT] threads={grant.threads} of {self.cores}, jobs={self.active}")
+            yield grant.threads
+        finally:
+            self.release(grant)
+
+
+cpu_allocator = CpuAllocator(detect_cpus(), FIXED_THREADS, CPU_PINNING)
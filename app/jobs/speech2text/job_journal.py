@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from jobs.speech2text.staging_store import APP_DIR
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+JOB_JOURNAL_PATH = APP_DIR / os.getenv("JOB_JOURNAL_PATH", "temp_data/jobs/journal.sqlite3")
+# Windows left behind by jobs that were never finished (queue workers) are dropped after this
+JOB_JOURNAL_TTL_HOURS = float(os.getenv("JOB_JOURNAL_TTL_HOURS", 72))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    session_id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    cache_keys TEXT NOT NULL DEFAULT '[]',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS windows (
+    session_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    bounds TEXT NOT NULL,
+    result TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    PRIMARY KEY (session_id, idx)
+);
+"""
+
+
+class WindowCheckpoint:
+    """The finished windows of one transcription, saved as soon as each is decoded."""
+
+    def __init__(self, journal: "JobJournal", session_id: str):
+        self.journal = journal
+        self.session_id = session_id
+        self.restored = 0
+
+    def restore(self, windows: list[tuple]) -> dict[int, dict]:
+        """Results of the saved windows that match the plan; a plan made with other settings starts over."""
+        saved = self.journal.windows(self.session_id)
+        done = {idx: result for idx, (bounds, result) in saved.items() if idx < len(windows) and bounds == list(windows[idx])}
+        self.restored = len(done)
+        if saved:
+            logger.info(f"[CHECKPOINT RESTORED] {self.session_id} {len(done)} of {len(windows)} windows done, {len(saved) - len(done)} stale")
+        return done
+
+    def save(self, idx: int, window: tuple, result: dict):
+        self.journal.save_window(self.session_id, idx, window, result)
+
+
+class JobJournal:
+    """
+    Durable record of the transcriptions in progress and of their decoded
+    windows, so a job interrupted by a crash or redeploy can be found on the
+    next start and continue from its last finished window.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Worker processes of the scheduler write windows to the same file
+        return sqlite3.connect(self.path, timeout=30)
+
+    def begin(self, data: dict, file_path: str, cache_keys: list[str]):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (session_id, chat_id, data, file_path, cache_keys, created_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data, file_path = excluded.file_path, "
+                "cache_keys = excluded.cache_keys",
+                (data["session_id"], data["chat_id"], json.dumps(data, ensure_ascii=False), str(file_path),
+                 json.dumps(cache_keys), time.time()),
+            )
+
+    def resumed(self, session_id: str) -> int:
+        """Counts one more start of the job and returns how many there were."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE jobs SET attempts = attempts + 1 WHERE session_id = ?", (session_id,))
+            row = conn.execute("SELECT attempts FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def unfinished(self) -> list[dict]:
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT session_id, chat_id, data, file_path, cache_keys, attempts FROM jobs ORDER BY created_at"
+            ).fetchall()
+        return [
+            {
+                "session_id": session_id,
+                "chat_id": chat_id,
+                "data": json.loads(data),
+                "file_path": file_path,
+                "cache_keys": json.loads(cache_keys),
+                "attempts": attempts,
+            }
+            for session_id, chat_id, data, file_path, cache_keys, attempts in rows
+        ]
+
+    def finish(self, session_id: str):
+        """The job is delivered or given up: nothing of it is kept."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM windows WHERE session_id = ?", (session_id,))
+
+    def checkpoint(self, session_id: str) -> WindowCheckpoint:
+        return WindowCheckpoint(self, session_id)
+
+    def windows(self, session_id: str) -> dict[int, tuple[list, dict]]:
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute("SELECT idx, bounds, result FROM windows WHERE session_id = ?", (session_id,)).fetchall()
+        return {idx: (json.loads(bounds), json.loads(result)) for idx, bounds, result in rows}
+
+    def save_window(self, session_id: str, idx: int, window: tuple, result: dict):
+        payload = {"segments": result.get("segments", []), "language": result.get("language")}
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO windows (session_id, idx, bounds, result, saved_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, idx, json.dumps([int(b) for b in window]),
+                 json.dumps(payload, ensure_ascii=False, default=float), time.time()),
+            )
+
+    def prune(self, ttl_sec: float = JOB_JOURNAL_TTL_HOURS * 3600):
+        with self._lock, closing(self._connect()) as conn, conn:
+            deleted = conn.execute(
+                "DELETE FROM windows WHERE saved_at < ? AND session_id NOT IN (SELECT session_id FROM jobs)",
+                (time.time() - ttl_sec,),
+            ).rowcount
+        if deleted:
+            logger.info(f"[JOB JOURNAL] Dropped {deleted} stale windows")
+
+
+job_journal = JobJournal(JOB_JOURNAL_PATH)
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from jobs.speech2text.model_registry import model_registry
+from jobs.speech2text.audio_prep import SAMPLE_RATE
+from jobs.speech2text.cpu_allocator import cpu_allocator
+from metrics import LANGUAGE_DETECT_TOTAL
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+LANGUAGE_DETECT_ENABLED = os.getenv("LANGUAGE_DETECT_ENABLED", "1") == "1"
+LANGUAGE_DETECT_MODEL = os.getenv("LANGUAGE_DETECT_MODEL", "tiny")
+LANGUAGE_DETECT_SEC = float(os.getenv("LANGUAGE_DETECT_SEC", 15))
+# Below this probability the main model detects the language itself, as before
+LANGUAGE_DETECT_MIN_PROB = float(os.getenv("LANGUAGE_DETECT_MIN_PROB", 0.8))
+CACHE_SIZE = 1024
+
+# Whisper parameter counts: a detection pass costs roughly one encoder run, which scales with them
+MODEL_PARAMS_M = {"tiny": 39, "base": 74, "small": 244, "medium": 769, "large": 1550, "turbo": 809}
+
+
+class LanguageDetector:
+    """
+    Detects the spoken language with a small resident model on the first seconds
+    of speech, so the main model is given an explicit language instead of
+    spending one pass of its own (one per chunk for long audio) on it.
+    Results are kept per session: a retried or resumed job does not detect again.
+    """
+
+    def __init__(self, model_size: str, sample_sec: float, min_prob: float):
+        self.model_size = model_size
+        self.sample_sec = sample_sec
+        self.min_prob = min_prob
+        self._cache: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"detected": 0, "fallback": 0, "cached": 0, "agreed": 0, "disagreed": 0, "saved_sec": 0.0}
+
+    def applies(self, model_size: str) -> bool:
+        return LANGUAGE_DETECT_ENABLED and model_size != self.model_size
+
+    def _detect(self, audio: np.ndarray) -> tuple[str, float]:
+        import whisper
+
+        sample = whisper.pad_or_trim(np.asarray(audio[:int(self.sample_sec * SAMPLE_RATE)], dtype=np.float32))
+        with model_registry.acquire(self.model_size) as model, cpu_allocator.inference():
+            mel = whisper.log_mel_spectrogram(sample, model.dims.n_mels).to(model.device)
+            _, probs = model.detect_language(mel)
+        language = max(probs, key=probs.get)
+        return language, float(probs[language])
+
+    def detect(self, session_id: str, audio: np.ndarray) -> tuple[Optional[str], Optional[str], float, float]:
+        """
+        Returns (language, guess, probability, seconds). language is None when the
+        guess is not confident enough and the main model should detect on its own.
+        """
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                self._cache.move_to_end(session_id)
+                self.stats["cached"] += 1
+        if cached is not None:
+            guess, prob, elapsed = *cached, 0.0
+        else:
+            started = time.perf_counter()
+            guess, prob = self._detect(audio)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._cache[session_id] = (guess, prob)
+                if len(self._cache) > CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        confident = prob >= self.min_prob
+        self.stats["detected" if confident else "fallback"] += 1
+        LANGUAGE_DETECT_TOTAL.labels(outcome="confident" if confident else "fallback").inc()
+        logger.info(
+            f"[LANGUAGE DETECT] {session_id} {guess} p={prob:.2f} in {elapsed:.2f}s"
+            f"{' (cached)' if cached is not None else ''}, {'used' if confident else 'left to the main model'}"
+        )
+        return (guess if confident else None), guess, prob, elapsed
+
+    def saved_seconds(self, model_size: str, detect_sec: float, passes: int) -> float:
+        """Main model detection time avoided, estimated from our own pass and the model sizes."""
+        ratio = MODEL_PARAMS_M.get(model_size, MODEL_PARAMS_M["small"]) / MODEL_PARAMS_M.get(self.model_size, MODEL_PARAMS_M["tiny"])
+        return max(0.0, passes * detect_sec * ratio - detect_sec)
+
+    def record(self, session_id: str, model_size: str, guess: str, used: bool, detect_sec: float, passes: int, result_language: str):
+        """Accuracy is known where both models had a say: the fallback jobs, where the main model detected too."""
+        if used:
+            saved = self.saved_seconds(model_size, detect_sec, passes)
+            with self._lock:
+                self.stats["saved_sec"] += saved
+            logger.info(f"[LANGUAGE DETECT] {session_id} saved ~{saved:.1f}s of {model_size} detection ({passes} passes). Stats: {self.stats}")
+            return
+        if result_language is None:
+            return
+        agreed = result_language == guess
+        with self._lock:
+            self.stats["agreed" if agreed else "disagreed"] += 1
+        LANGUAGE_DETECT_TOTAL.labels(outcome="agreed" if agreed else "disagreed").inc()
+        logger.info(
+            f"[LANGUAGE DETECT] {session_id} {model_size} detected {result_language}, "
+            f"{self.model_size} guessed {guess}. Stats: {self.stats}"
+        )
+
+
+language_detector = LanguageDetector(LANGUAGE_DETECT_MODEL, LANGUAGE_DETECT_SEC, LANGUAGE_DETECT_MIN_PROB)
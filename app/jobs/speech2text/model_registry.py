@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+MODEL_RAM_BUDGET_MB = int(os.getenv("WHISPER_MODEL_RAM_BUDGET_MB", 4096))
+PRELOAD_MODELS = os.getenv("WHISPER_PRELOAD_MODELS", "")
+# fp32 weights of each size, for planning before a model is loaded
+MODEL_RAM_MB = {"tiny": 150, "base": 290, "small": 970, "medium": 3060, "large": 6170, "turbo": 3240}
+
+
+def model_ram_bytes(model_size: str) -> int:
+    """Approximate memory of one loaded copy; unknown names count as the large model."""
+    name = "turbo" if "turbo" in model_size else model_size.split(".")[0].split("-")[0]
+    return MODEL_RAM_MB.get(name, MODEL_RAM_MB["large"]) * 2**20
+
+
+class _ModelEntry:
+    def __init__(self, model_size: str):
+        self.model_size = model_size
+        self.model = None
+        self.nbytes = 0
+        self.refs = 0
+        self.load_lock = threading.Lock()
+        # Whisper installs its kv-cache hooks on the shared decoder modules for every
+        # decode call, so two decodes on one instance would corrupt each other's cache.
+        self.infer_lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded Whisper models.
+    Each size is loaded once; least recently used sizes are evicted
+    when the resident weights exceed the RAM budget. Models that child
+    processes keep resident (chunk workers) are charged to the same budget
+    through reserve().
+    """
+
+    def __init__(self, ram_budget_bytes: int):
+        self.ram_budget_bytes = ram_budget_bytes
+        self.reserved_bytes = 0
+        self._entries: "OrderedDict[str, _ModelEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "hits": 0, "evictions": 0, "load_seconds": 0.0}
+
+    @contextmanager
+    def acquire(self, model_size: str):
+        """Yields a loaded model for exclusive inference. Loads it on first use."""
+        with self._lock:
+            entry = self._entries.get(model_size)
+            if entry is None:
+                entry = _ModelEntry(model_size)
+                self._entries[model_size] = entry
+            self._entries.move_to_end(model_size)
+            entry.refs += 1
+
+        try:
+            with entry.load_lock:
+                if entry.model is None:
+                    self._load(entry)
+                else:
+                    with self._lock:
+                        self._stats["hits"] += 1
+
+            with entry.infer_lock:
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                self._evict()
+
+    def is_loaded(self, model_size: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(model_size)
+            return entry is not None and entry.model is not None
+
+    def preload(self, model_sizes):
+        for model_size in model_sizes:
+            model_size = model_size.strip()
+            if not model_size:
+                continue
+            logger.info(f"[MODEL REGISTRY] Preloading {model_size}")
+            with self.acquire(model_size):
+                pass
+
+    def reserve(self, nbytes: int, copies: int) -> int:
+        """
+        Charges up to `copies` models of nbytes that other processes hold to this budget,
+        evicting idle models here to make room for one. Returns how many were charged:
+        as many as fit, but at least one, so work can always go on.
+        """
+        with self._lock:
+            self._evict(extra=nbytes)
+            free = self.ram_budget_bytes - self._resident() - self.reserved_bytes
+            granted = max(1, min(copies, free // nbytes))
+            self.reserved_bytes += granted * nbytes
+            if granted * nbytes > free:
+                logger.warning(
+                    f"[MODEL REGISTRY] Reserved {nbytes / 2**20:.0f} MB for another process, "
+                    f"over the {self.ram_budget_bytes / 2**20:.0f} MB budget"
+                )
+            return granted
+
+    def unreserve(self, nbytes: int):
+        with self._lock:
+            self.reserved_bytes = max(0, self.reserved_bytes - nbytes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            resident = {
+                size: entry.nbytes
+                for size, entry in self._entries.items()
+                if entry.model is not None
+            }
+            return {
+                **self._stats,
+                "resident_models": list(resident),
+                "resident_bytes": sum(resident.values()),
+                "reserved_bytes": self.reserved_bytes,
+                "ram_budget_bytes": self.ram_budget_bytes,
+            }
+
+    def _load(self, entry: _ModelEntry):
+        # Deferred so that importing the registry does not pull in torch
+        import whisper
+
+        logger.info(f"[MODEL REGISTRY] Loading {entry.model_size}")
+        started = time.perf_counter()
+        model = whisper.load_model(entry.model_size)
+        elapsed = time.perf_counter() - started
+        nbytes = sum(p.numel() * p.element_size() for p in model.parameters())
+
+        with self._lock:
+            entry.model = model
+            entry.nbytes = nbytes
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] += elapsed
+            self._evict()
+
+        logger.info(
+            f"[MODEL REGISTRY] Loaded {entry.model_size} in {elapsed:.1f}s "
+            f"({nbytes / 2**20:.0f} MB). Stats: {self.stats()}"
+        )
+
+    def _resident(self) -> int:
+        # Caller must hold self._lock
+        return sum(e.nbytes for e in self._entries.values() if e.model is not None)
+
+    def _evict(self, extra: int = 0):
+        # Caller must hold self._lock; extra is room wanted on top of the current use
+        budget = self.ram_budget_bytes - self.reserved_bytes - extra
+        resident = self._resident()
+        for size in list(self._entries):
+            if resident <= budget:
+                break
+            entry = self._entries[size]
+            if entry.refs > 0 or entry.model is None:
+                continue
+            resident -= entry.nbytes
+            del self._entries[size]
+            self._stats["evictions"] += 1
+            logger.info(f"[MODEL REGISTRY] Evicted {size} ({entry.nbytes / 2**20:.0f} MB freed)")
+
+        if resident > budget and not extra:
+            logger.warning(
+                f"[MODEL REGISTRY] Resident models use {resident / 2**20:.0f} MB "
+                f"and other processes {self.reserved_bytes / 2**20:.0f} MB, "
+                f"over the {self.ram_budget_bytes / 2**20:.0f} MB budget (all in use)"
+            )
+
+
+model_registry = ModelRegistry(MODEL_RAM_BUDGET_MB * 2**20)
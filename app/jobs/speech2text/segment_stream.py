@@ -0,0 +1,66 @@
+import builtins
+import importlib
+import re
+import threading
+from contextlib import contextmanager
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# What whisper.transcribe prints for every segment of a finished window with verbose=True
+SEGMENT_LINE = re.compile(r"^\[((?:\d+:)?\d+:\d+\.\d+) --> ((?:\d+:)?\d+:\d+\.\d+)\] (.*)$", re.S)
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def parse_timestamp(value: str) -> float:
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_segment_line(line: str):
+    match = SEGMENT_LINE.match(line)
+    if match is None:
+        return None
+    start, end, text = match.groups()
+    return {"start": parse_timestamp(start), "end": parse_timestamp(end), "text": text}
+
+
+def _print(*args, **kwargs):
+    sink = getattr(_local, "sink", None)
+    if sink is None:
+        builtins.print(*args, **kwargs)
+        return
+    segment = parse_segment_line(" ".join(str(arg) for arg in args))
+    if segment is not None:
+        sink(segment)
+
+
+def _install():
+    global _installed
+    with _install_lock:
+        if not _installed:
+            # The package exports the transcribe function under the module's name
+            module = importlib.import_module("whisper.transcribe")
+            module.print = _print
+            _installed = True
+
+
+@contextmanager
+def capture_segments(callback):
+    """
+    Hands the segments model.transcribe(..., verbose=True) prints after each 30 s
+    window to callback instead of stdout. Whisper has no per-window hook, but its
+    verbose output is exactly that, so the decoding itself is the same as without
+    streaming. Only the calling thread is captured; other jobs print as usual.
+    """
+    _install()
+    _local.sink = callback
+    try:
+        yield
+    finally:
+        _local.sink = None
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+import zlib
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Anchored to the app directory, not to whatever the working directory happens to be
+APP_DIR = Path(__file__).resolve().parent.parent.parent
+STAGING_PATH = APP_DIR / os.getenv("STAGING_PATH", "temp_data/staging/transcripts.sqlite3")
+STAGING_TTL_HOURS = float(os.getenv("STAGING_TTL_HOURS", 48))
+STAGING_MAX_MB = int(os.getenv("STAGING_MAX_MB", 512))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS staged (
+    session_id TEXT PRIMARY KEY,
+    speaker TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    n_segments INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS staged_expires_at ON staged (expires_at);
+"""
+
+# Little-endian columns: segment number, start ms, end ms, text byte length
+COLUMN_DTYPES = ("<i4", "<i8", "<i8", "<i4")
+
+
+def pack_segments(segments: list[dict]) -> bytes:
+    """
+    Columnar encoding of Whisper segments: fixed-width numeric columns followed by
+    the UTF-8 texts back to back, zlib-compressed. Times are kept in milliseconds.
+    """
+    texts = [seg["text"].encode("utf-8") for seg in segments]
+    columns = (
+        [seg["id"] for seg in segments],
+        [round(seg["start"] * 1000) for seg in segments],
+        [round(seg["end"] * 1000) for seg in segments],
+        [len(t) for t in texts],
+    )
+    body = b"".join(np.asarray(col, dtype=dtype).tobytes() for col, dtype in zip(columns, COLUMN_DTYPES))
+    return zlib.compress(struct.pack("<I", len(segments)) + body + b"".join(texts), 6)
+
+
+def unpack_segments(payload: bytes) -> list[dict]:
+    raw = zlib.decompress(payload)
+    (n,) = struct.unpack_from("<I", raw)
+    offset = 4
+    columns = []
+    for dtype in COLUMN_DTYPES:
+        col = np.frombuffer(raw, dtype=dtype, count=n, offset=offset)
+        columns.append(col.tolist())
+        offset += col.nbytes
+
+    segments = []
+    for seg_id, start_ms, end_ms, length in zip(*columns):
+        segments.append({
+            "id": seg_id,
+            "start": start_ms / 1000,
+            "end": end_ms / 1000,
+            "text": raw[offset:offset + length].decode("utf-8"),
+        })
+        offset += length
+    return segments
+
+
+def utterance_rows(dialog_id: str, segments: list[dict], speaker: str, created_at: str) -> list[dict]:
+    """Whisper segments as rows for the Chronicle utterances table."""
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "dialog_id": str(dialog_id),
+            "content": seg["text"],
+            "start_time": seg["start"],
+            "end_time": seg["end"],
+            "segment_number": seg["id"],
+            "created_at": created_at,
+            "speaker": speaker,
+            "metadata": {}
+        }
+        for seg in segments
+    ]
+
+
+class StagingStore:
+    """
+    Transcripts waiting for the user's decision to store them in the Chronicle.
+    One row per session, dropped on upload, on "don't save", after the TTL, or
+    oldest first once the store grows over max_bytes.
+    """
+
+    def __init__(self, path: Path, ttl_sec: float, max_bytes: int):
+        self.path = Path(path)
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put(self, session_id: str, segments: list[dict], speaker: str = "", created_at: str = ""):
+        payload = pack_segments(segments)
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO staged (session_id, speaker, created_at, n_segments, payload, size, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, str(speaker), str(created_at), len(segments), payload, len(payload), time.time() + self.ttl_sec),
+            )
+            self._evict(conn, keep=session_id)
+
+    def get_utterances(self, session_id: str):
+        """Utterance rows for the Chronicle upload, or None if the session is unknown or expired."""
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT speaker, created_at, payload FROM staged WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+
+        speaker, created_at, payload = row
+        return utterance_rows(session_id, unpack_segments(payload), speaker, created_at)
+
+    def discard(self, session_id: str):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM staged WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        with self._lock, closing(self._connect()) as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM staged").fetchone()
+        return {"entries": entries, "size_bytes": size}
+
+    def _evict(self, conn, keep: str):
+        expired = conn.execute("DELETE FROM staged WHERE expires_at <= ?", (time.time(),)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM staged").fetchone()[0]
+        evicted = 0
+        if total > self.max_bytes:
+            # The transcript just staged stays even if it alone is over the cap
+            rows = conn.execute(
+                "SELECT session_id, size FROM staged WHERE session_id != ? ORDER BY expires_at", (keep,)
+            ).fetchall()
+            for session_id, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM staged WHERE session_id = ?", (session_id,))
+                total -= size
+                evicted += 1
+        if expired or evicted:
+            logger.info(f"[STAGING] Dropped {expired} expired and {evicted} oldest transcripts, {total} bytes left")
+
+
+staging_store = StagingStore(STAGING_PATH, STAGING_TTL_HOURS * 3600, STAGING_MAX_MB * 2**20)
@@ -0,0 +1,38 @@
+import os
+import uuid
+from pathlib import Path
+
+from jobs.speech2text.staging_store import staging_store
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+def write_transcript_outputs(segments: list, summary: str, args: dict) -> list:
+    """
+    Stages the utterances for the Chronicle upload and writes the text transcript if requested.
+    Shared by fresh transcriptions and cache hits. Returns:
+    [info_summary, transcript_file_path or None, session_id, segments]
+    """
+    session_id = args.get("session_id", str(uuid.uuid4()))
+    user_id = args.get("user_id", '')
+    session_start_dttm = args.get("session_start_dttm", '')
+    output_type = args.get("output_type", "text")
+
+    BASE_DIR = Path.cwd() #Path(__file__).resolve().parent.parent
+    text_save_dir = BASE_DIR / os.getenv("TRANSCRIPTS_DIR", "temp_data/transcripts")
+    os.makedirs(text_save_dir, exist_ok=True)
+
+    # Kept until the user decides whether to store the dialog in the Chronicle
+    staging_store.put(session_id, segments, speaker=user_id, created_at=session_start_dttm)
+
+    # Decide whether to save full text
+    file_path_txt = None
+    if output_type == "text" and "".join(seg["text"] for seg in segments).strip():
+        transcript = "\n\n".join(seg["text"].strip() for seg in segments)
+        filename = f"transcript_{user_id}_{session_start_dttm}.txt"
+        file_path_txt = os.path.join(text_save_dir, filename)
+        with open(file_path_txt, "w", encoding="utf-8") as f:
+            f.write(transcript)
+
+    return [summary, file_path_txt, session_id, segments]
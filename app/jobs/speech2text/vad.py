@@ -0,0 +1,146 @@
+import json
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+from jobs.speech2text.audio_prep import frame_energy, load_pcm, SAMPLE_RATE, REGIONS_SUFFIX
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_MIN_SPEECH_RATIO = float(os.getenv("VAD_MIN_SPEECH_RATIO", 0.01))
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", 12))
+VAD_PAD_SEC = float(os.getenv("VAD_PAD_SEC", 0.3))
+VAD_MIN_SILENCE_SEC = float(os.getenv("VAD_MIN_SILENCE_SEC", 1.0))
+
+FRAME_SEC = 0.03
+MIN_SPEECH_SEC = 0.25
+ABSOLUTE_FLOOR_DB = -55.0
+# Silence left between joined speech regions so Whisper does not glue words together
+JOIN_GAP_SEC = 0.2
+# With less speech than this the silence is cut out, otherwise Whisper gets the audio as it is
+VAD_COMPACT_BELOW = 0.95
+
+
+def detect_speech_regions(audio: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Energy-based voice activity detection. Returns speech regions as
+    (start_sample, end_sample), padded and with short pauses bridged.
+    """
+    frame_len = int(SAMPLE_RATE * FRAME_SEC)
+    energy = frame_energy(audio, frame_len)
+    if len(energy) == 0:
+        return []
+
+    db = 20 * np.log10(energy)
+    noise_floor = np.percentile(db, 10)
+    threshold = max(noise_floor + VAD_MARGIN_DB, ABSOLUTE_FLOOR_DB)
+    if np.percentile(db, 95) < threshold:
+        # No frame clearly stands out: either silence/noise only or speech without pauses
+        return [] if np.percentile(db, 95) < ABSOLUTE_FLOOR_DB else [(0, len(audio))]
+
+    active = db > threshold
+
+    # Run boundaries of active frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+    min_gap = int(VAD_MIN_SILENCE_SEC / FRAME_SEC)
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    min_len = int(MIN_SPEECH_SEC / FRAME_SEC)
+    pad = int(VAD_PAD_SEC * SAMPLE_RATE)
+    regions = []
+    for start, end in merged:
+        if end - start < min_len:
+            continue
+        s = max(0, start * frame_len - pad)
+        e = min(len(audio), end * frame_len + pad)
+        if regions and s <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], e)
+        else:
+            regions.append((s, e))
+    return regions
+
+
+def speech_regions(pcm_path: str) -> list[tuple[int, int]]:
+    """
+    Speech regions of a prepared PCM file. Saved next to it the first time, so the
+    time estimate and run_whisper (maybe in another process) share one VAD pass.
+    """
+    regions_path = pcm_path + REGIONS_SUFFIX
+    if os.path.exists(regions_path) and os.path.getmtime(regions_path) >= os.path.getmtime(pcm_path):
+        try:
+            with open(regions_path, encoding="utf-8") as f:
+                return [tuple(region) for region in json.load(f)]
+        except (OSError, ValueError) as e:
+            logger.warning(f"[VAD] Unreadable regions {regions_path}, detecting again: {e}")
+
+    regions = detect_speech_regions(load_pcm(pcm_path))
+    tmp_path = regions_path + ".part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(regions, f)
+    os.replace(tmp_path, regions_path)
+    return regions
+
+
+def decoded_seconds(pcm_path: str) -> float:
+    """Seconds Whisper decodes after the VAD pass, by run_whisper's rules: 0 if the audio is rejected as silent."""
+    n_samples = len(load_pcm(pcm_path))
+    if not VAD_ENABLED or n_samples == 0:
+        return n_samples / SAMPLE_RATE
+    timeline = SpeechTimeline(speech_regions(pcm_path))
+    speech_ratio = timeline.speech_samples / n_samples
+    if speech_ratio < VAD_MIN_SPEECH_RATIO:
+        return 0.0
+    if speech_ratio < VAD_COMPACT_BELOW:
+        return timeline.length / SAMPLE_RATE
+    return n_samples / SAMPLE_RATE
+
+
+class SpeechTimeline:
+    """
+    Joins speech regions into one compact array and maps times on it
+    back to the original recording.
+    """
+
+    def __init__(self, regions: list[tuple[int, int]]):
+        self.regions = regions
+        gap = int(JOIN_GAP_SEC * SAMPLE_RATE)
+        self.offsets = []
+        pos = 0
+        for start, end in regions:
+            self.offsets.append(pos)
+            pos += end - start + gap
+        self.length = max(0, pos - gap)
+        self.gap = gap
+
+    @property
+    def speech_samples(self) -> int:
+        return sum(end - start for start, end in self.regions)
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        out = np.zeros(self.length, dtype=np.float32)
+        for (start, end), offset in zip(self.regions, self.offsets):
+            out[offset:offset + end - start] = audio[start:end]
+        return out
+
+    def to_original(self, t: float) -> float:
+        sample = t * SAMPLE_RATE
+        i = max(0, bisect_right(self.offsets, sample) - 1)
+        start, end = self.regions[i]
+        # Times inside a join gap stick to the end of the region before it
+        return min(start + (sample - self.offsets[i]), end) / SAMPLE_RATE
+
+    def remap_segments(self, segments: list[dict]) -> list[dict]:
+        return [
+            {**seg, "start": self.to_original(seg["start"]), "end": self.to_original(seg["end"])}
+            for seg in segments
+        ]
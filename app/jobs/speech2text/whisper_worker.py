@@ -1,93 +1,199 @@
 import os
-import json
 import uuid
-import whisper
+import time
 from math import exp
-from pathlib import Path
-
-import torch
-torch.set_num_threads(int(os.getenv("TRANSCRIBE_THREADS", 2)))
 
 from logging import getLogger
 logger = getLogger(__name__)
 
+from jobs.speech2text.model_registry import model_registry
+from jobs.speech2text.audio_prep import prepare_audio, load_pcm, write_pcm, SAMPLE_RATE, PCM_SUFFIX
+from jobs.speech2text.vad import speech_regions, SpeechTimeline, VAD_ENABLED, VAD_MIN_SPEECH_RATIO, VAD_COMPACT_BELOW
+from jobs.speech2text.chunked_transcribe import transcribe_chunked, execution_mode, CHUNK_THREADS, CHUNK_TARGET_SEC
+from jobs.speech2text.cpu_allocator import cpu_allocator
+from jobs.speech2text.transcript_outputs import write_transcript_outputs
+from jobs.speech2text.batched_decode import batching_engine
+from jobs.speech2text.segment_stream import capture_segments
+from jobs.speech2text.language_detect import language_detector
+from jobs.speech2text.job_journal import job_journal
+from jobs.speech2text.windowed_transcribe import transcribe_windows, RESUME_WINDOWED_DECODE, RESUME_WINDOW_SEC
+
 from safe_func_dec import safe_run_sync
 @safe_run_sync
-def transcribe_audio(file_path: str, args: dict) -> list:
+def transcribe_audio(file_path: str, args: dict, on_segments=None, resumable: bool = False) -> list:
     """
     Transcribes an audio file using Whisper and returns:
-    [info_summary, transcript_file_path or None]
+    [info_summary, transcript_file_path or None, session_id, segments, timings]
+    """
+    args = {**args, "session_id": args.get("session_id", str(uuid.uuid4()))}
+    segments, summary, timings = run_whisper(file_path, args, on_segments, resumable)
+    write_started = time.perf_counter()
+    outputs = write_transcript_outputs(segments, summary, args)
+    timings["write_sec"] = time.perf_counter() - write_started
+
+    logger.info("[WHISPER WORKER SUCCESSFULLY FINISHED]")
+
+    return outputs + [timings]
+
+
+def run_whisper(file_path: str, args: dict, on_segments=None, resumable: bool = False) -> tuple:
+    """
+    Runs the speech-to-text part only, without writing any files.
+    Returns (segments, info_summary, timings).
+
+    on_segments, if given, is called from this thread with the segments of every
+    finished window (or chunk), on the original timeline. They are a preview: the
+    returned segments are the same as without it.
+
+    resumable saves every finished window (or chunk) to the job journal under the
+    session id, and a rerun of the same session continues after the saved ones.
     """
     model_size = args.get("model", "small")
     language = args.get("language", None)
     temperature = args.get("temperature") or 0.0
     session_id = args.get("session_id", str(uuid.uuid4()))
-    user_id = args.get("user_id", '')
-    session_start_dttm = args.get("session_start_dttm", '')
-    output_type = args.get("output_type", "text")
-
-    BASE_DIR = Path.cwd() #Path(__file__).resolve().parent.parent
-    text_save_dir = BASE_DIR / os.getenv("TRANSCRIPTS_DIR", "temp_data/transcripts")
-    os.makedirs(text_save_dir, exist_ok=True)
 
     logger.info(f"[TRANSCRIBE] Starting transcription {session_id}\nModel={model_size}, lang={language}, temp={temperature}")
 
-    # Load whisper model (this can be cached at higher level too)
-    logger.info("[LOAD MODEL]")
-    model = whisper.load_model(model_size)
-
-    # Transcribe audio
-    logger.info("[EXECUTE WHISPER]")
-    result = model.transcribe(
-        file_path,
-        language=None if language == "auto" else language,
-        temperature=temperature
-    )
-    logger.info("[WHISPER EXECUTED]")
-
-    segments = result["segments"]
-
-    utterances = []
-
-    for seg in segments:
-        utterance = {
-            "id": str(uuid.uuid4()),
-            "dialog_id": str(session_id),
-            "content": seg["text"],
-            "start_time": seg["start"],
-            "end_time": seg["end"],
-            "segment_number": seg["id"],
-            "created_at": str(session_start_dttm),
-            "speaker": user_id,         # Можно будет потом добавить
-            "metadata": {}
-        }
-        utterances.append(utterance)
-    
-    os.makedirs("jobs/speech2text/temp/", exist_ok=True)
-    with open(f"jobs/speech2text/temp/utterances_{session_id}.json", "w", encoding="utf-8") as f:
-        json.dump(utterances, f, ensure_ascii=False, indent=2)
-
-
-    avg_logprob = result["segments"][0]["avg_logprob"] if result.get("segments") else None
+    # Decoded once to 16 kHz PCM (a no-op if run_transcription already did it),
+    # the memory-mapped samples serve both the plain and the chunked path
+    pcm_path = prepare_audio(file_path)
+    audio = load_pcm(pcm_path)
+    duration_sec = len(audio) / SAMPLE_RATE
+    options = {
+        "language": None if language == "auto" else language,
+        "temperature": temperature,
+    }
+
+    timings = {
+        "duration_sec": duration_sec,
+        # Replaced by the share the job actually gets once it runs
+        "threads": cpu_allocator.expected_threads(),
+        "load_sec": None,
+    }
+
+    # Voice activity pre-pass: Whisper only sees the speech, joined end to end
+    timeline = None
+    speech_pcm_path = None
+    if VAD_ENABLED and duration_sec > 0:
+        # Found already if the time estimate ran on this file
+        regions = speech_regions(pcm_path)
+        timeline = SpeechTimeline(regions)
+        speech_ratio = timeline.speech_samples / len(audio)
+        logger.info(
+            f"[VAD] {session_id} speech={timeline.speech_samples / SAMPLE_RATE:.1f}s of {duration_sec:.1f}s, "
+            f"skipped {1 - speech_ratio:.1%} in {len(regions)} regions"
+        )
+        if speech_ratio < VAD_MIN_SPEECH_RATIO:
+            logger.info(f"[VAD] {session_id} rejected: no speech")
+            timings.update(mode="vad_rejected", speech_sec=0.0, inference_sec=0.0)
+            summary = (
+                f"Language: None\n"
+                f"Model size: {model_size}\n"
+                f"Temperature: {temperature}\n"
+                f"No speech detected in the file 🔇\n"
+            )
+            return [], summary, timings
+        if speech_ratio < VAD_COMPACT_BELOW:
+            audio = timeline.compact(audio)
+            speech_pcm_path = pcm_path[:-len(PCM_SUFFIX)] + ".speech" + PCM_SUFFIX
+            pcm_path = write_pcm(speech_pcm_path, audio)
+        else:
+            timeline = None
+
+    def emit(segments: list[dict]):
+        try:
+            on_segments(timeline.remap_segments(segments) if timeline is not None else segments)
+        except Exception as e:
+            logger.warning(f"[STREAM SEGMENTS FAILED] {session_id}: {e}")
+
+    speech_sec = len(audio) / SAMPLE_RATE
+    timings["speech_sec"] = speech_sec
+    # Same decision as the time estimate, so runs train the calibration key they are predicted from
+    timings["mode"] = execution_mode(speech_sec)
+
+    # "Auto": the small resident model picks the language once, on the first seconds of speech
+    detection = None
+    if options["language"] is None and language_detector.applies(model_size):
+        try:
+            language, guess, _, detect_sec = language_detector.detect(session_id, audio)
+        except Exception as e:
+            logger.warning(f"[LANGUAGE DETECT FAILED] {session_id}: {e}")
+        else:
+            options["language"] = language
+            timings["language_detect_sec"] = detect_sec
+            detection = (guess, language is not None, detect_sec)
+
+    checkpoint = job_journal.checkpoint(session_id) if resumable else None
+    try:
+        if timings["mode"] == "chunked":
+            timings["threads"] = CHUNK_THREADS
+            logger.info(f"[EXECUTE WHISPER CHUNKED] duration={speech_sec:.0f}s")
+            started = time.perf_counter()
+            # The chunk pool has its own processes, the lease only makes other jobs take smaller shares
+            grant = cpu_allocator.allocate()
+            try:
+                result = transcribe_chunked(
+                    model_size, audio, options, pcm_path=pcm_path, on_segments=emit if on_segments else None,
+                    checkpoint=checkpoint,
+                )
+            finally:
+                cpu_allocator.release(grant)
+        elif timings["mode"] == "batched":
+            # One Whisper window: decoded together with other short jobs of the same model
+            if not model_registry.is_loaded(model_size):
+                load_started = time.perf_counter()
+                model_registry.preload([model_size])
+                timings["load_sec"] = time.perf_counter() - load_started
+            logger.info("[EXECUTE WHISPER BATCHED]")
+            started = time.perf_counter()
+            result = batching_engine.transcribe(model_size, audio, options)
+        else:
+            # Shared model: loaded once per process, reused across jobs
+            logger.info("[ACQUIRE MODEL]")
+            cold = not model_registry.is_loaded(model_size)
+            acquire_started = time.perf_counter()
+            with model_registry.acquire(model_size) as model:
+                if cold:
+                    timings["load_sec"] = time.perf_counter() - acquire_started
+                # Transcribe audio on this job's share of the cores
+                with cpu_allocator.inference() as threads:
+                    timings["threads"] = threads
+                    logger.info("[EXECUTE WHISPER]")
+                    started = time.perf_counter()
+                    if RESUME_WINDOWED_DECODE and checkpoint is not None and speech_sec > 1.5 * RESUME_WINDOW_SEC:
+                        # Decoded in windows that are saved one by one, a crash costs one window
+                        result = transcribe_windows(model, audio, options, checkpoint, emit if on_segments else None)
+                    elif on_segments is None:
+                        result = model.transcribe(audio, **options)
+                    else:
+                        with capture_segments(lambda segment: emit([segment])):
+                            result = model.transcribe(audio, verbose=True, **options)
+    finally:
+        if speech_pcm_path is not None and os.path.exists(speech_pcm_path):
+            os.remove(speech_pcm_path)
+    timings["inference_sec"] = time.perf_counter() - started
+    if checkpoint is not None:
+        timings["restored_windows"] = checkpoint.restored
+    logger.info(f"[WHISPER EXECUTED] {timings}")
+
+    if timeline is not None:
+        result["segments"] = timeline.remap_segments(result["segments"])
+
+    if detection is not None:
+        # Without a language every chunk would have detected it on its own
+        passes = max(1, round(speech_sec / CHUNK_TARGET_SEC)) if timings["mode"] == "chunked" else 1
+        language_detector.record(session_id, model_size, *detection, passes, result.get("language"))
+
+    avg_logprob = result["segments"][0].get("avg_logprob") if result.get("segments") else None
     no_speech_prob = result.get("no_speech_prob", None)
 
     summary = (
         f"Language: {result.get('language')}\n"
         f"Model size: {model_size}\n"
         f"Temperature: {temperature}\n"
-        f"Degree of confidence: {round(exp(avg_logprob) * 100, 2)}%\n"
+        f"Degree of confidence: {str(round(exp(avg_logprob) * 100, 2)) + '%' if avg_logprob is not None else 'None'}\n"
         f"No-speech file probability: {str(round(no_speech_prob * 100, 2)) + '%' if no_speech_prob is not None else 'None'}\n"
     )
 
-    # Decide whether to save full text
-    file_path_txt = None
-    if output_type == "text" and result["text"].strip():
-        transcript = "\n\n".join(u["content"].strip() for u in utterances)
-        filename = f"transcript_{user_id}_{session_start_dttm}.txt"
-        file_path_txt = os.path.join(text_save_dir, filename)
-        with open(file_path_txt, "w", encoding="utf-8") as f:
-            f.write(transcript)
-
-    logger.info("[WHISPER WORKER SUCCESSFULLY FINISHED]")
-
-    return [summary, file_path_txt, session_id]
+    return result["segments"], summary, timings
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+from jobs.speech2text.audio_prep import SAMPLE_RATE
+from jobs.speech2text.chunked_transcribe import find_silence_cuts, plan_chunks, chunk_segments, merge_chunk_results
+from jobs.speech2text.segment_stream import capture_segments
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Single-model jobs of the scheduler are decoded in saved windows, so a crash costs at most one
+# window instead of the whole file. Jobs under 1.5 windows are decoded in one piece and start over.
+# Whisper loses some context at each cut (the previous window's text is passed on as the prompt);
+# set to 0 to keep the one-piece transcript and restart long jobs from the beginning instead.
+# Chunked jobs are checkpointed per chunk either way.
+RESUME_WINDOWED_DECODE = os.getenv("RESUME_WINDOWED_DECODE", "1") == "1"
+# Windowed jobs are decoded in windows of about this length, the most a crash can throw away
+RESUME_WINDOW_SEC = float(os.getenv("RESUME_WINDOW_SEC", 120))
+PROMPT_CHARS = 200
+
+
+def plan_windows(audio: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """Silence-aligned windows without overlap, in the chunk format of chunked_transcribe."""
+    return plan_chunks(len(audio), find_silence_cuts(audio, RESUME_WINDOW_SEC), 0.0)
+
+
+def transcribe_windows(model, audio: np.ndarray, options: dict, checkpoint, on_segments=None) -> dict:
+    """
+    Transcribes the audio window by window on one model, saving each finished
+    window to the checkpoint; windows saved by an earlier run are not decoded
+    again. The end of a window's text is the next one's prompt, so decoding
+    carries on across the cut like across Whisper's own 30 s windows.
+    """
+    windows = plan_windows(audio)
+    done = checkpoint.restore(windows)
+    logger.info(f"[WINDOWED TRANSCRIBE] {len(audio) / SAMPLE_RATE:.0f}s audio in {len(windows)} windows, {len(done)} restored")
+
+    results = []
+    for idx, window in enumerate(windows):
+        result = done.get(idx)
+        if result is not None:
+            if on_segments is not None:
+                on_segments(chunk_segments(window, result))
+        else:
+            window_options = dict(options)
+            prompt = "".join(seg["text"] for seg in results[-1]["segments"]).strip()[-PROMPT_CHARS:] if results else ""
+            if prompt:
+                window_options["initial_prompt"] = prompt
+            samples = np.ascontiguousarray(audio[window[0]:window[1]])
+            if on_segments is None:
+                result = model.transcribe(samples, **window_options)
+            else:
+                offset = window[0] / SAMPLE_RATE
+                shift = lambda seg: {**seg, "start": seg["start"] + offset, "end": seg["end"] + offset}
+                with capture_segments(lambda seg: on_segments([shift(seg)])):
+                    result = model.transcribe(samples, verbose=True, **window_options)
+            checkpoint.save(idx, window, result)
+        if options.get("language") is None and result.get("language"):
+            # Detected once, the following windows need not detect again
+            options = {**options, "language": result["language"]}
+        results.append(result)
+
+    return merge_chunk_results(windows, results)
@@ -1,16 +1,18 @@
+# First import: marks the process start for the start-up time metric
+from readiness import readiness
 import asyncio
 from ui.bot import start_bot
-from services.db_interaction.init_db import init_db
 from log_setup import setup_logging
+from metrics import start_metrics_server
 from logging import getLogger
 
 def main():
     setup_logging()
     logger = getLogger(__name__)
     logger.info("[Chronicle starting]")
-    logger.info("[DB INIT STARTED]")
-    init_db()
-    logger.info("[DB INIT ENDED. STARTING BOT]")
+    start_metrics_server()
+    # Database init and Whisper warm-up run in the background once polling has started
+    logger.info(f"[STARTING BOT] imports took {readiness.uptime():.2f}s")
     asyncio.run(start_bot())
 
 if __name__ == "__main__":
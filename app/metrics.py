@@ -0,0 +1,94 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 disables the endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Stage durations go from a hash of a voice note to the inference of a long recording
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+
+STAGE_SECONDS = Histogram(
+    "chronicle_stage_seconds", "Duration of pipeline stages", ("stage",), buckets=STAGE_BUCKETS)
+# Whisper only decodes the speech found by VAD: the first is its decoding speed, the second what the user sees
+TRANSCRIPTION_RTF = Histogram(
+    "chronicle_transcription_rtf", "Inference time divided by the speech Whisper decoded", ("model", "mode"), buckets=RTF_BUCKETS)
+TRANSCRIPTION_AUDIO_RTF = Histogram(
+    "chronicle_transcription_audio_rtf", "Inference time divided by the whole audio duration", ("model", "mode"), buckets=RTF_BUCKETS)
+JOBS_TOTAL = Counter(
+    "chronicle_transcription_jobs_total", "Finished transcription requests by outcome", ("outcome",))
+JOBS_IN_FLIGHT = Gauge(
+    "chronicle_transcription_jobs_in_flight", "Transcriptions currently running")
+QUEUE_DEPTH = Gauge(
+    "chronicle_transcription_queue_depth", "Transcriptions waiting for a worker")
+MODEL_CACHE_TOTAL = Counter(
+    "chronicle_model_cache_total", "Whisper model lookups, hit when already loaded", ("model", "result"))
+DB_INSERT_SECONDS = Histogram(
+    "chronicle_db_insert_seconds", "Latency of one Chronicle insert transaction", buckets=STAGE_BUCKETS)
+DB_ROWS_TOTAL = Counter(
+    "chronicle_db_utterances_inserted_total", "Utterance rows written to the Chronicle")
+STARTUP_SECONDS = Gauge(
+    "chronicle_startup_seconds", "Seconds from process start until a component was ready", ("component",))
+COMPONENT_READY = Gauge(
+    "chronicle_component_ready", "1 when a component is ready, 0 if it failed to start", ("component",))
+TELEGRAM_SENDS_TOTAL = Counter(
+    "chronicle_telegram_sends_total", "Outgoing Telegram calls: sent, retried, coalesced or failed", ("outcome",))
+ADMISSION_TOTAL = Counter(
+    "chronicle_admission_total", "Admission decisions on received audio, made before downloading", ("decision",))
+LANGUAGE_DETECT_TOTAL = Counter(
+    "chronicle_language_detect_total", "Fast language detections: confident, fallback, and agreed or disagreed with the main model", ("outcome",))
+
+
+def observe_stage(stage: str, seconds: float, trace: str = None):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    logger.info(f"[SPAN] {stage} {seconds:.3f}s" + (f" {trace}" if trace else ""))
+
+
+@contextmanager
+def span(stage: str, trace: str = None):
+    """
+    Times a pipeline stage into chronicle_stage_seconds and logs it with the trace id
+    (the session id), so one request can be followed through the log.
+    Works around awaits as well.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, trace)
+
+
+def record_transcription(model_size: str, timings: dict, trace: str = None):
+    """Metrics of a finished Whisper run from the timings it returns, also for runs in other processes."""
+    if timings.get("load_sec") is not None:
+        observe_stage("model_load", timings["load_sec"], trace)
+    if timings.get("write_sec") is not None:
+        observe_stage("file_write", timings["write_sec"], trace)
+    if timings.get("inference_sec") is not None:
+        observe_stage("inference", timings["inference_sec"], trace)
+        labels = {"model": model_size, "mode": timings.get("mode")}
+        if timings.get("speech_sec"):
+            TRANSCRIPTION_RTF.labels(**labels).observe(timings["inference_sec"] / timings["speech_sec"])
+        if timings.get("duration_sec"):
+            TRANSCRIPTION_AUDIO_RTF.labels(**labels).observe(timings["inference_sec"] / timings["duration_sec"])
+    if timings.get("mode") in ("single", "batched"):
+        MODEL_CACHE_TOTAL.labels(model=model_size, result="miss" if timings.get("load_sec") is not None else "hit").inc()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serves /metrics in Prometheus text format from a daemon thread."""
+    if not port:
+        return None
+    try:
+        server = start_http_server(port, addr=host)
+    except OSError as e:
+        logger.warning(f"[METRICS] Could not listen on {host}:{port}: {e}")
+        return None
+    logger.info(f"[METRICS] Serving http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,53 @@
+import time
+import threading
+
+from metrics import STARTUP_SECONDS, COMPONENT_READY
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Imported first thing by the entry points, so this is close to the process start
+PROCESS_STARTED = time.monotonic()
+
+
+class Readiness:
+    """
+    Start-up state of the parts of the bot that come up in the background.
+    A component is pending until it is marked ready or failed.
+    """
+
+    def __init__(self, components: tuple):
+        self._state = {name: "pending" for name in components}
+        self._lock = threading.Lock()
+
+    def mark_ready(self, component: str):
+        elapsed = time.monotonic() - PROCESS_STARTED
+        with self._lock:
+            self._state[component] = "ready"
+        STARTUP_SECONDS.labels(component=component).set(elapsed)
+        COMPONENT_READY.labels(component=component).set(1)
+        logger.info(f"[READY] {component} after {elapsed:.2f}s")
+
+    def mark_failed(self, component: str, error: Exception):
+        with self._lock:
+            self._state[component] = f"failed: {error}"
+        COMPONENT_READY.labels(component=component).set(0)
+        logger.error(f"[NOT READY] {component}: {error}")
+
+    def skip(self, component: str):
+        with self._lock:
+            self._state.pop(component, None)
+
+    def is_ready(self, component: str) -> bool:
+        with self._lock:
+            return self._state.get(component) == "ready"
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self._state)
+
+    def uptime(self) -> float:
+        return time.monotonic() - PROCESS_STARTED
+
+
+readiness = Readiness(("polling", "database", "speech"))
@@ -1,29 +1,70 @@
-from jobs.db.upload_s2t_to_postgres import run_import
+from jobs.db.upload_s2t_to_postgres import run_import_staged, EmptyTranscriptError
+from jobs.db.connection_pool import chronicle_pool
+from jobs.embeddings.embedding_index import embedding_index, EMBEDDINGS_ENABLED
+from metrics import span
+from services.ui_utils.tg_outbox import outbox
 from aiogram import Bot
-import os
+import asyncio
 
 from logging import getLogger
 logger = getLogger(__name__)
 
+# Strong references to fire-and-forget indexing tasks
+_index_tasks = set()
+
+
+async def index_dialog(session_id):
+    try:
+        await asyncio.to_thread(embedding_index.update, session_id)
+    except Exception as e:
+        # Left for the next backfill run
+        logger.warning(f"[EMBEDDINGS] Indexing {session_id} failed: {e}")
+
+
 async def save_to_chronicle(bot: Bot, session_id, chat_id):
     logger.info(f'[CHRONICLE UPLOAD STARTED] {session_id}')
-    ut_file_name = f"jobs/speech2text/temp/utterances_{session_id}.json"
 
-    await bot.send_message(
-        chat_id=chat_id,
-        text=f"⚙️ Your dialog is being uploaded to the Chronicle.\nID: {session_id}\n\nYou will be notified once the upload is done. 🔔"
-    )
+    with span("telegram_send", session_id):
+        await outbox.status(
+            chat_id,
+            session_id,
+            f"⚙️ Your dialog is being uploaded to the Chronicle.\nID: {session_id}\n\nYou will be notified once the upload is done. 🔔"
+        )
 
-    run_import(ut_file_name)
+    # Runs on the DB pool threads so polling and other handlers keep going
+    with span("db_ingest", session_id):
+        try:
+            staged = await chronicle_pool.run(run_import_staged, session_id)
+        except EmptyTranscriptError:
+            await outbox.status(
+                chat_id,
+                session_id,
+                f"🔇 Nothing was saved: no speech was recognized in this file.\nID: {session_id}"
+            )
+            outbox.forget_status(chat_id, session_id)
+            return
 
-    await bot.send_message(
-        chat_id=chat_id,
-        text=f"👌 Your file was uploaded to the Chronicle.\nID: {session_id}"
-    )
+    if not staged:
+        await outbox.status(
+            chat_id,
+            session_id,
+            f"⌛ This transcript is no longer available for saving. Please send the file again.\nID: {session_id}"
+        )
+        outbox.forget_status(chat_id, session_id)
+        return
 
-    import os
+    with span("telegram_send", session_id):
+        await outbox.status(
+            chat_id,
+            session_id,
+            f"👌 Your file was uploaded to the Chronicle.\nID: {session_id}"
+        )
+    outbox.forget_status(chat_id, session_id)
 
-    os.remove(ut_file_name)
+    if EMBEDDINGS_ENABLED:
+        task = asyncio.create_task(index_dialog(session_id))
+        _index_tasks.add(task)
+        task.add_done_callback(_index_tasks.discard)
 
     logger.info(f"[CHRONICLE UPLOAD ENDED] {session_id}")
 
@@ -0,0 +1,64 @@
+import datetime
+import html
+import secrets
+from collections import OrderedDict
+
+from jobs.db.connection_pool import chronicle_pool
+from jobs.db.search_utterances import search_utterances
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+PAGE_SIZE = 5
+MAX_CONTENT_CHARS = 300
+MAX_OPEN_CURSORS = 1000
+
+# Telegram callback data is limited to 64 bytes, so "next page" buttons carry a short token
+_cursors: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def _remember_cursor(query: str, cursor: tuple, first_n: int) -> str:
+    token = secrets.token_urlsafe(8)
+    _cursors[token] = (query, cursor, first_n)
+    while len(_cursors) > MAX_OPEN_CURSORS:
+        _cursors.popitem(last=False)
+    return token
+
+
+def _format_hit(n: int, row: dict) -> str:
+    start = str(datetime.timedelta(seconds=int(row["start_time"] or 0)))
+    end = str(datetime.timedelta(seconds=int(row["end_time"] or 0)))
+    content = row["content"].strip()
+    if len(content) > MAX_CONTENT_CHARS:
+        content = content[:MAX_CONTENT_CHARS] + "…"
+    title = row["title"] or "Untitled dialog"
+    return (
+        f"<b>{n}. {html.escape(title)}</b> · {start}–{end}\n"
+        f"{html.escape(content)}\n"
+        f"<code>{row['dialog_id']}</code>"
+    )
+
+
+async def search_chronicle(query: str = None, token: str = None) -> tuple:
+    """
+    Runs a Chronicle search for a new query or for the next page behind a token.
+    Returns (html_text, next_page_token or None).
+    """
+    after = None
+    first_n = 1
+    if token is not None:
+        if token not in _cursors:
+            return "⌛ This search has expired. Please run /search again.", None
+        query, after, first_n = _cursors.pop(token)
+
+    rows, next_cursor = await chronicle_pool.run(search_utterances, query, PAGE_SIZE, after)
+    logger.info(f"[CHRONICLE SEARCH] {query!r}: {len(rows)} hits, more={next_cursor is not None}")
+
+    if not rows:
+        return ("🔎 Nothing more found." if after else f"🔎 Nothing found for «{html.escape(query)}»."), None
+
+    text = f"🔎 Results for «{html.escape(query)}»:\n\n" + "\n\n".join(
+        _format_hit(n, row) for n, row in enumerate(rows, start=first_n)
+    )
+    next_token = _remember_cursor(query, next_cursor, first_n + len(rows)) if next_cursor else None
+    return text, next_token
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from services.transcript.job_scheduler import TranscriptionScheduler
+from services.transcript.transcript_duration_estimate import predict_transcription_time
+from metrics import ADMISSION_TOTAL
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# The cloud Bot API does not serve files above 20 MB, a local Bot API server goes up to 2000 MB
+MAX_AUDIO_MB = float(os.getenv("MAX_AUDIO_MB", 20))
+MAX_AUDIO_DURATION_SEC = float(os.getenv("MAX_AUDIO_DURATION_SEC", 4 * 3600))
+USER_MAX_ACTIVE_JOBS = int(os.getenv("USER_MAX_ACTIVE_JOBS", 2))
+USER_DAILY_AUDIO_SEC = float(os.getenv("USER_DAILY_AUDIO_SEC", 6 * 3600))
+# Local backend: a job waits before downloading while the queue is full or has more work than this ahead
+ADMISSION_MAX_BACKLOG_SEC = float(os.getenv("ADMISSION_MAX_BACKLOG_SEC", 3600))
+ADMISSION_MAX_DEFERRED = int(os.getenv("ADMISSION_MAX_DEFERRED", 50))
+ADMISSION_DEFER_TIMEOUT_SEC = float(os.getenv("ADMISSION_DEFER_TIMEOUT_SEC", 1800))
+ADMISSION_POLL_SEC = float(os.getenv("ADMISSION_POLL_SEC", 2))
+# Documents carry no duration, it is guessed from the size at a typical compressed bitrate (128 kbit/s)
+AUDIO_BYTES_PER_SEC = float(os.getenv("AUDIO_BYTES_PER_SEC", 16000))
+
+DAY_SEC = 24 * 3600
+
+
+def audio_seconds(data: dict) -> float:
+    if data.get("duration"):
+        return float(data["duration"])
+    return (data.get("file_size") or 0) / AUDIO_BYTES_PER_SEC
+
+
+def format_hours(seconds: float) -> str:
+    return f"{seconds / 3600:.1f} h" if seconds >= 3600 else f"{round(seconds / 60)} min"
+
+
+class AdmissionControl:
+    """
+    Decides on a received file from what Telegram tells about it (size,
+    duration) before a single byte is downloaded: hard limits, per-user quotas
+    (jobs in progress, audio per day) and, for the in-process scheduler, how
+    much work is already queued. Over-limit files are rejected, a busy queue
+    makes the job wait for its turn instead.
+    """
+
+    def __init__(self):
+        self._active: dict[int, set[str]] = {}
+        self._usage: dict[int, deque[tuple[float, float, str]]] = {}
+        self._reserved: dict[str, float] = {}
+        self._deferred: deque[str] = deque()
+
+    @staticmethod
+    def _user(data: dict) -> int:
+        return data.get("user_id") or data["chat_id"]
+
+    def _used_today(self, user: int, now: float) -> float:
+        usage = self._usage.get(user)
+        if not usage:
+            return 0.0
+        while usage and usage[0][0] <= now - DAY_SEC:
+            usage.popleft()
+        if not usage:
+            del self._usage[user]
+            return 0.0
+        return sum(seconds for _, seconds, _ in usage)
+
+    def _reject(self, decision: str, session_id: str, text: str) -> str:
+        ADMISSION_TOTAL.labels(decision=decision).inc()
+        logger.info(f"[ADMISSION REJECTED] {session_id} {decision}")
+        return text
+
+    def admit(self, data: dict) -> Optional[str]:
+        """
+        Checks the limits and quotas and counts the job against the user's quota,
+        until it is refunded. Returns the message to answer with if the file is not accepted.
+        """
+        session_id = data["session_id"]
+        user = self._user(data)
+        now = time.time()
+        seconds = audio_seconds(data)
+
+        size_mb = (data.get("file_size") or 0) / 2 ** 20
+        if size_mb > MAX_AUDIO_MB:
+            return self._reject(
+                "too_large", session_id,
+                f"📦 This file is {size_mb:.1f} MB, files up to {MAX_AUDIO_MB:g} MB are accepted. Please send a smaller or compressed one."
+            )
+        # Only a duration Telegram reported is held against the limit, not one guessed from the size
+        if data.get("duration") and data["duration"] > MAX_AUDIO_DURATION_SEC:
+            return self._reject(
+                "too_long", session_id,
+                f"⏱️ This recording is {format_hours(data['duration'])} long, up to {format_hours(MAX_AUDIO_DURATION_SEC)} are accepted. Please split it."
+            )
+        if len(self._active.get(user, ())) >= USER_MAX_ACTIVE_JOBS:
+            return self._reject(
+                "user_active_jobs", session_id,
+                f"✋ You already have {USER_MAX_ACTIVE_JOBS} transcripts in progress. Please send this file again once one of them is done."
+            )
+        used = self._used_today(user, now)
+        if used + seconds > USER_DAILY_AUDIO_SEC:
+            return self._reject(
+                "user_daily_quota", session_id,
+                f"📅 Your daily limit of {format_hours(USER_DAILY_AUDIO_SEC)} of audio is reached ({format_hours(used)} used). Please try again tomorrow."
+            )
+
+        self._active.setdefault(user, set()).add(session_id)
+        self._usage.setdefault(user, deque()).append((now, seconds, session_id))
+        ADMISSION_TOTAL.labels(decision="accepted").inc()
+        return None
+
+    def finish(self, data: dict):
+        """The job is over (delivered, failed or answered from the cache). Safe to call twice."""
+        user = self._user(data)
+        sessions = self._active.get(user)
+        if sessions is not None:
+            sessions.discard(data["session_id"])
+            if not sessions:
+                del self._active[user]
+
+    def refund(self, data: dict):
+        """The job's audio was not transcribed (rejected, failed, answered from the cache): it is not held against the quota."""
+        user = self._user(data)
+        usage = self._usage.get(user)
+        if usage is None:
+            return
+        kept = deque(entry for entry in usage if entry[2] != data["session_id"])
+        if kept:
+            self._usage[user] = kept
+        else:
+            del self._usage[user]
+
+    def _has_room(self, scheduler: TranscriptionScheduler) -> bool:
+        # Jobs that passed here but are still downloading count as queued already
+        if scheduler.queued + len(self._reserved) >= scheduler.queue_size:
+            return False
+        backlog = scheduler.backlog() + sum(self._reserved.values()) / scheduler.workers
+        return backlog <= ADMISSION_MAX_BACKLOG_SEC
+
+    async def wait_for_room(
+        self, scheduler: TranscriptionScheduler, data: dict, on_defer: Callable[[], Awaitable] = None,
+        patient: bool = False,
+    ) -> bool:
+        """
+        Returns True once the job may download and queue, with its place reserved
+        until release_room. Waiting jobs go in arrival order; False if there is no
+        room within ADMISSION_DEFER_TIMEOUT_SEC or too many are waiting already.
+        A patient job (one accepted before a restart) waits as long as it takes.
+        """
+        session_id = data["session_id"]
+        estimate = predict_transcription_time(audio_seconds(data), data["model"])
+        if not self._deferred and self._has_room(scheduler):
+            self._reserved[session_id] = estimate
+            return True
+        if not patient and len(self._deferred) >= ADMISSION_MAX_DEFERRED:
+            ADMISSION_TOTAL.labels(decision="busy").inc()
+            return False
+
+        ADMISSION_TOTAL.labels(decision="deferred").inc()
+        logger.info(f"[ADMISSION DEFERRED] {session_id} waiting={len(self._deferred) + 1}, backlog={scheduler.backlog():.0f}s")
+        if on_defer is not None:
+            try:
+                await on_defer()
+            except Exception as e:
+                logger.warning(f"[ADMISSION DEFER NOTIFY FAILED] {session_id}: {e}")
+
+        deadline = float("inf") if patient else time.monotonic() + ADMISSION_DEFER_TIMEOUT_SEC
+        self._deferred.append(session_id)
+        try:
+            while self._deferred[0] != session_id or not self._has_room(scheduler):
+                if time.monotonic() >= deadline:
+                    ADMISSION_TOTAL.labels(decision="busy").inc()
+                    return False
+                await asyncio.sleep(ADMISSION_POLL_SEC)
+            self._reserved[session_id] = estimate
+            return True
+        finally:
+            self._deferred.remove(session_id)
+
+    def release_room(self, session_id: str):
+        """The job is in the scheduler's queue now, or will not get there."""
+        self._reserved.pop(session_id, None)
+
+
+admission = AdmissionControl()
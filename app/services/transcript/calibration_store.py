@@ -0,0 +1,159 @@
+import os
+import platform
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+BASE_DIR = Path.cwd()
+CALIBRATION_PATH = BASE_DIR / os.getenv("TRANSCRIPT_CALIBRATION_PATH", "temp_data/cache/transcription_runs.sqlite3")
+# Weight kept by old observations on every new run, so the fit follows hardware/config changes
+CALIBRATION_DECAY = float(os.getenv("TRANSCRIPT_CALIBRATION_DECAY", 0.97))
+CALIBRATION_MIN_RUNS = int(os.getenv("TRANSCRIPT_CALIBRATION_MIN_RUNS", 3))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS coefficients (
+    key TEXT PRIMARY KEY,
+    n REAL NOT NULL,
+    sx REAL NOT NULL,
+    sy REAL NOT NULL,
+    sxx REAL NOT NULL,
+    sxy REAL NOT NULL,
+    runs INTEGER NOT NULL,
+    load_seconds REAL,
+    load_runs INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    ts REAL NOT NULL,
+    key TEXT NOT NULL,
+    model TEXT NOT NULL,
+    duration_sec REAL NOT NULL,
+    inference_sec REAL NOT NULL,
+    load_sec REAL,
+    predicted_sec REAL,
+    actual_sec REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts);
+"""
+
+
+def cpu_signature() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+CPU_SIGNATURE = cpu_signature()
+
+
+def calibration_key(model_size: str, threads: int, mode: str) -> str:
+    return f"{model_size}|{threads}|{mode}|{CPU_SIGNATURE}"
+
+
+class CalibrationStore:
+    """
+    Learns transcription speed from finished jobs. Per model, thread count,
+    execution mode and CPU it keeps an exponentially weighted least-squares fit of
+    inference_sec = rtf * duration_sec + overhead, plus an average cold model load time.
+    """
+
+    def __init__(self, path: Path, decay: float, min_runs: int):
+        self.path = Path(path)
+        self.decay = decay
+        self.min_runs = min_runs
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, key: str, model_size: str, duration_sec: float, inference_sec: float,
+               load_sec: float = None, predicted_sec: float = None):
+        actual = inference_sec + (load_sec or 0.0)
+        d = self.decay
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT n, sx, sy, sxx, sxy, runs, load_seconds, load_runs FROM coefficients WHERE key = ?", (key,)
+            ).fetchone()
+            n, sx, sy, sxx, sxy, runs, load_avg, load_runs = row or (0.0, 0.0, 0.0, 0.0, 0.0, 0, None, 0)
+
+            n = d * n + 1
+            sx = d * sx + duration_sec
+            sy = d * sy + inference_sec
+            sxx = d * sxx + duration_sec ** 2
+            sxy = d * sxy + duration_sec * inference_sec
+            if load_sec is not None:
+                load_avg = load_sec if load_avg is None else (1 - d) * load_sec + d * load_avg
+                load_runs += 1
+
+            conn.execute(
+                "INSERT OR REPLACE INTO coefficients (key, n, sx, sy, sxx, sxy, runs, load_seconds, load_runs, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, n, sx, sy, sxx, sxy, runs + 1, load_avg, load_runs, time.time()),
+            )
+            conn.execute(
+                "INSERT INTO runs (ts, key, model, duration_sec, inference_sec, load_sec, predicted_sec, actual_sec) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), key, model_size, duration_sec, inference_sec, load_sec, predicted_sec, actual),
+            )
+
+    def coefficients(self, key: str):
+        """Returns (rtf, overhead_sec, load_sec or None), or None while there is too little data."""
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT n, sx, sy, sxx, sxy, runs, load_seconds FROM coefficients WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        n, sx, sy, sxx, sxy, runs, load_avg = row
+        if runs < self.min_runs or sx <= 0:
+            return None
+
+        var = n * sxx - sx ** 2
+        rtf = (n * sxy - sx * sy) / var if var > 1e-9 * n * sxx else 0.0
+        overhead = (sy - rtf * sx) / n
+        if rtf <= 0 or overhead < 0:
+            # Durations too similar (or noisy) for a line: fall back to a pure ratio
+            rtf, overhead = sy / sx, 0.0
+        return rtf, overhead, load_avg
+
+    def error_report(self, bucket_sec: int = 86400) -> list[dict]:
+        """Mean absolute percentage error and bias of predictions per model and time bucket."""
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, model, COUNT(*), "
+                "AVG(ABS(predicted_sec - actual_sec) / MAX(actual_sec, 1.0)), "
+                "AVG((predicted_sec - actual_sec) / MAX(actual_sec, 1.0)) "
+                "FROM runs WHERE predicted_sec IS NOT NULL "
+                "GROUP BY bucket, model ORDER BY bucket, model",
+                (bucket_sec, bucket_sec),
+            ).fetchall()
+        return [
+            {"period_start": bucket, "model": model, "runs": count, "mape": mape, "bias": bias}
+            for bucket, model, count, mape, bias in rows
+        ]
+
+
+calibration_store = CalibrationStore(CALIBRATION_PATH, CALIBRATION_DECAY, CALIBRATION_MIN_RUNS)
+
+
+if __name__ == "__main__":
+    # python -m services.transcript.calibration_store [bucket_hours]
+    bucket_hours = float(sys.argv[1]) if len(sys.argv) > 1 else 24
+    print(f"{'period start':<17} {'model':<7} {'runs':>5} {'MAPE':>7} {'bias':>7}")
+    for r in calibration_store.error_report(int(bucket_hours * 3600)):
+        period = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["period_start"]))
+        print(f"{period:<17} {r['model']:<7} {r['runs']:>5} {r['mape']:>7.1%} {r['bias']:>+7.1%}")
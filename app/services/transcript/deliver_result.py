@@ -0,0 +1,36 @@
+from aiogram import Bot, types
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from services.ui_utils.tg_outbox import outbox
+import os
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+async def deliver_result(bot: Bot, data: dict, result: list):
+    session_id = data['session_id']
+    await outbox.send_message(
+        data['chat_id'],
+        f"✅ Done! Here is some info about your transcript 👇\nID: {session_id}\n\n{result[0]}"
+    )
+
+    if result[1] is not None:
+        await outbox.send_document(
+            data['chat_id'],
+            types.FSInputFile(result[1]),
+            caption=f"Your transcript, Sir 📄\nID: {session_id}"
+        )
+
+    # Store decision buttons
+    store_kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Yes, save it", callback_data=f"store_yes_{data['chat_id']}_{data['session_id']}"),
+        InlineKeyboardButton(text="No, don't save", callback_data=f"store_no_{data['chat_id']}_{data['session_id']}")]
+    ])
+
+    await outbox.send_message(
+        data['chat_id'],
+        f"Do you want to save it to our Chronicle? 📜",
+        reply_markup=store_kb
+    )
+
+    if result[1] is not None:
+        os.remove(result[1])
@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from typing import Awaitable, Callable, Optional
+
+from jobs.speech2text.batched_decode import batching_engine
+from jobs.speech2text.cpu_allocator import cpu_allocator, CpuGrant
+from log_setup import setup_logging
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 1))
+TRANSCRIBE_WORKER_MODE = os.getenv("TRANSCRIBE_WORKER_MODE", "thread")  # thread | process
+TRANSCRIBE_QUEUE_SIZE = int(os.getenv("TRANSCRIBE_QUEUE_SIZE", 20))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def run_transcribe_audio(file_path: str, data: dict, grant: CpuGrant = None, on_segments=None) -> list:
+    # Torch and Whisper are imported by the warm-up or the first job, not at bot startup
+    from jobs.speech2text.whisper_worker import transcribe_audio
+    if grant is not None:
+        # Worker process: the job runs on the cores the scheduler gave it
+        cpu_allocator.adopt(grant)
+    # Every scheduled job is in the job journal, its windows are checkpointed there
+    return transcribe_audio(file_path, data, on_segments, resumable=True)
+
+
+def warm_up_speech(preload_models: str = "") -> None:
+    """Imports the speech stack and loads the given models in the calling process."""
+    import whisper  # noqa: F401
+    from jobs.speech2text import whisper_worker  # noqa: F401
+    from jobs.speech2text.model_registry import model_registry
+    from jobs.speech2text.language_detect import LANGUAGE_DETECT_ENABLED, LANGUAGE_DETECT_MODEL
+
+    if preload_models:
+        model_registry.preload(preload_models.split(","))
+    if LANGUAGE_DETECT_ENABLED:
+        # Small enough to stay resident next to the main models
+        model_registry.preload([LANGUAGE_DETECT_MODEL])
+
+
+@dataclass(order=True)
+class TranscriptionJob:
+    # Shortest-estimated-job-first with aging: a job's key is its submit time plus its
+    # estimate, so short notes overtake long recordings but nothing waits forever.
+    priority: float
+    seq: int
+    file_path: str = field(compare=False)
+    data: dict = field(compare=False)
+    estimate: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    on_started: Optional[Callable[[float], Awaitable]] = field(compare=False, default=None)
+    # Called on the event loop with the segments of every finished window (thread mode only)
+    on_segments: Optional[Callable[[list], None]] = field(compare=False, default=None)
+    started_at: Optional[float] = field(compare=False, default=None)
+    submitted_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+class TranscriptionScheduler:
+    """
+    Runs transcription jobs on a fixed-size worker pool fed by a bounded priority queue.
+    """
+
+    def __init__(self, workers: int, queue_size: int, mode: str = "thread"):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.mode = mode
+        self._queue: list[TranscriptionJob] = []
+        self._running: dict[int, TranscriptionJob] = {}
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._executor = None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=setup_logging,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="whisper")
+            # Worker threads share one model, so their short jobs can be decoded as one batch
+            batching_engine.set_concurrency(self.workers)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"[SCHEDULER STARTED] workers={self.workers}, mode={self.mode}, queue_size={self.queue_size}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    async def warm_up(self, preload_models: str = ""):
+        """Imports Whisper and loads models where the jobs will run: once here, or once per worker process."""
+        loop = asyncio.get_running_loop()
+        runs = self.workers if self.mode == "process" else 1
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, warm_up_speech, preload_models) for _ in range(runs)
+        ))
+
+    def is_full(self) -> bool:
+        return len(self._queue) >= self.queue_size
+
+    async def submit(self, file_path: str, data: dict, estimate: float, on_started=None, on_segments=None) -> TranscriptionJob:
+        if self.is_full():
+            raise QueueFullError(f"Transcription queue is full ({self.queue_size} jobs)")
+
+        job = TranscriptionJob(
+            priority=time.monotonic() + estimate,
+            seq=next(self._seq),
+            file_path=file_path,
+            data=data,
+            estimate=estimate,
+            future=asyncio.get_running_loop().create_future(),
+            on_started=on_started,
+            on_segments=on_segments,
+        )
+        async with self._cond:
+            heapq.heappush(self._queue, job)
+            self._cond.notify()
+        logger.info(f"[JOB QUEUED] {data.get('session_id')} position={self.position(job)}, queued={len(self._queue)}")
+        return job
+
+    def position(self, job: TranscriptionJob) -> int:
+        """1-based position among waiting jobs, 0 once the job is running."""
+        if job.started_at is not None:
+            return 0
+        return sum(1 for other in self._queue if other < job) + 1
+
+    def backlog(self) -> float:
+        """Seconds of estimated work ahead of a job submitted now, spread over the workers."""
+        now = time.monotonic()
+        running_left = sum(max(0.0, j.estimate - (now - j.started_at)) for j in self._running.values())
+        return (running_left + sum(j.estimate for j in self._queue)) / self.workers
+
+    def eta(self, job: TranscriptionJob) -> float:
+        """Seconds until the job is expected to finish."""
+        now = time.monotonic()
+        if job.started_at is not None:
+            return max(0.0, job.estimate - (now - job.started_at))
+
+        running_left = sum(max(0.0, j.estimate - (now - j.started_at)) for j in self._running.values())
+        ahead = sum(other.estimate for other in self._queue if other < job)
+        if len(self._running) < self.workers and ahead == 0:
+            return job.estimate
+        return (running_left + ahead) / self.workers + job.estimate
+
+    async def _worker(self, worker_idx: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._cond:
+                while not self._queue:
+                    await self._cond.wait()
+                job = heapq.heappop(self._queue)
+
+            job.started_at = time.monotonic()
+            self._running[job.seq] = job
+            session_id = job.data.get("session_id")
+            grant = None
+            logger.info(f"[JOB STARTED] {session_id} worker={worker_idx}, queued={len(self._queue)}")
+            try:
+                if job.on_started is not None:
+                    try:
+                        await job.on_started(job.estimate)
+                    except Exception as e:
+                        logger.warning(f"[JOB START NOTIFY FAILED] {session_id}: {e}")
+
+                if self.mode == "process":
+                    # Each worker process is its own torch runtime, so its share is decided here
+                    grant = cpu_allocator.allocate()
+                    logger.info(f"[CPU GRANT] {session_id} threads={grant.threads}, cpus={list(grant.cpus) or 'any'}")
+                stream = None
+                if job.on_segments is not None and self.mode == "thread":
+                    # Whisper calls this from the worker thread, the callback belongs to the loop
+                    stream = lambda segments: loop.call_soon_threadsafe(job.on_segments, segments)
+                result = await loop.run_in_executor(
+                    self._executor, run_transcribe_audio, job.file_path, job.data, grant, stream
+                )
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                if grant is not None:
+                    cpu_allocator.release(grant)
+                self._running.pop(job.seq, None)
+                logger.info(f"[JOB FINISHED] {session_id} worker={worker_idx}")
+
+
+transcription_scheduler = TranscriptionScheduler(
+    workers=TRANSCRIBE_WORKERS,
+    queue_size=TRANSCRIBE_QUEUE_SIZE,
+    mode=TRANSCRIBE_WORKER_MODE,
+)
@@ -0,0 +1,91 @@
+import asyncio
+import os
+
+from services.ui_utils.tg_outbox import outbox
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+STREAM_TRANSCRIPT = os.getenv("STREAM_TRANSCRIPT", "1") == "1"
+# Telegram allows about one edit per second per chat, the transcript does not need more
+STREAM_EDIT_INTERVAL_SEC = float(os.getenv("STREAM_EDIT_INTERVAL_SEC", 3))
+MESSAGE_LIMIT = 4096
+
+
+def format_offset(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class LiveTranscript:
+    """
+    A message that shows the transcript while Whisper is still working on it.
+    It is sent with the first decoded text and edited at most every interval
+    seconds; once the text outgrows one message only its tail is shown.
+    """
+
+    def __init__(self, chat_id, session_id: str, interval: float = STREAM_EDIT_INTERVAL_SEC):
+        self.chat_id = chat_id
+        self.session_id = session_id
+        self.interval = interval
+        self.message_id = None
+        self._lines: list[str] = []
+        self._dirty = False
+        self._closed = False
+        self._task = None
+
+    def add(self, segments: list[dict]):
+        """Called on the event loop for every finished window."""
+        if self._closed:
+            return
+        lines = [f"[{format_offset(seg['start'])}] {seg['text'].strip()}" for seg in segments if seg["text"].strip()]
+        if not lines:
+            return
+        self._lines.extend(lines)
+        self._dirty = True
+        if self._task is None:
+            logger.info(f"[LIVE TRANSCRIPT] {self.session_id} first text")
+            self._task = asyncio.create_task(self._run())
+
+    def render(self) -> str:
+        header = f"📝 Transcribing, text so far:\nID: {self.session_id}\n\n"
+        body = "\n".join(self._lines)
+        # Telegram counts UTF-16 units, leave room for emoji and the like
+        room = MESSAGE_LIMIT - 2 * len(header)
+        if len(body) > room:
+            body = "…" + body[-(room - 1):]
+        return header + body
+
+    async def _run(self):
+        while not self._closed:
+            if self._dirty:
+                self._dirty = False
+                await self._flush()
+            await asyncio.sleep(self.interval)
+
+    async def _flush(self):
+        text = self.render()
+        try:
+            if self.message_id is None:
+                message = await outbox.send_message(self.chat_id, text)
+                self.message_id = message.message_id
+            else:
+                await outbox.edit_message_text(self.chat_id, self.message_id, text)
+        except Exception as e:
+            logger.warning(f"[LIVE TRANSCRIPT UPDATE FAILED] {self.session_id}: {e}")
+
+    async def close(self, delete: bool = True):
+        """Stops the updates. The message is deleted once the full transcript has been delivered."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if not delete and self._dirty:
+            # The job failed: leave what was decoded, including the last lines
+            await self._flush()
+        if delete and self.message_id is not None:
+            try:
+                await outbox.delete_message(self.chat_id, self.message_id)
+            except Exception as e:
+                logger.warning(f"[LIVE TRANSCRIPT DELETE FAILED] {self.session_id}: {e}")
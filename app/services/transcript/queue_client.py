@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+from aiogram import Bot
+
+from jobs.db.connection_pool import chronicle_pool
+from jobs.db.job_queue import enqueue_job, take_finished_jobs, mark_delivered
+from jobs.speech2text.transcript_outputs import write_transcript_outputs
+from services.transcript.deliver_result import deliver_result
+from services.transcript.result_cache import transcript_cache
+from services.ui_utils.tg_outbox import outbox
+from services.transcript.admission import admission
+from metrics import span
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "local")  # local | queue
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+QUEUE_DELIVERY_INTERVAL_SEC = float(os.getenv("QUEUE_DELIVERY_INTERVAL_SEC", 2))
+# A result not delivered within this is tried again, by this or another bot instance
+QUEUE_DELIVERY_LEASE_SEC = float(os.getenv("QUEUE_DELIVERY_LEASE_SEC", 300))
+
+
+async def enqueue_transcription(bot: Bot, data: dict):
+    await chronicle_pool.run(
+        enqueue_job,
+        data['session_id'],
+        data['chat_id'],
+        data,
+        priority_offset=data.get('duration') or 0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+    )
+    await outbox.send_message(
+        data['chat_id'],
+        f"📨 Your transcript is in the queue.\nID: {data['session_id']}\n\nYou will be notified once it is done. 🔔"
+    )
+
+
+async def deliver_finished_job(bot: Bot, job: dict):
+    data = job["payload"]
+    session_id = data['session_id']
+    admission.finish(data)
+
+    if job["outcome"] == "failed":
+        admission.refund(data)
+        logger.warning(f"[QUEUE JOB FAILED] {session_id}: {job['error']}")
+        await outbox.send_message(
+            job["chat_id"],
+            f"❌ Sorry, your transcript could not be done. Please try again later.\nID: {session_id}"
+        )
+        return
+
+    result = job["result"]
+    outputs = await asyncio.to_thread(write_transcript_outputs, result["segments"], result["summary"], data)
+    if data.get("file_unique_id"):
+        key = transcript_cache.key(f"tg:{data['file_unique_id']}", data)
+        await asyncio.to_thread(transcript_cache.put, [key], result["summary"], result["segments"], data.get("file_size") or 0)
+
+    with span("telegram_send", session_id):
+        await deliver_result(bot, data, outputs)
+    logger.info(f"[TRANSCRIPT ENDED] {session_id}")
+
+
+async def delivery_loop(bot: Bot):
+    """Sends results of jobs finished by out-of-process workers."""
+    logger.info("[QUEUE DELIVERY STARTED]")
+    while True:
+        try:
+            jobs = await chronicle_pool.run(take_finished_jobs, QUEUE_DELIVERY_LEASE_SEC)
+        except Exception as e:
+            logger.warning(f"[QUEUE DELIVERY] Polling failed: {e}")
+            jobs = []
+
+        for job in jobs:
+            try:
+                await deliver_finished_job(bot, job)
+                await chronicle_pool.run(mark_delivered, job["id"])
+            except Exception as e:
+                logger.exception(f"[QUEUE DELIVERY FAILED] {job['id']}, retried in {QUEUE_DELIVERY_LEASE_SEC:.0f}s: {e}")
+
+        if not jobs:
+            await asyncio.sleep(QUEUE_DELIVERY_INTERVAL_SEC)
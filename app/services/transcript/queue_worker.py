@@ -0,0 +1,132 @@
+import asyncio
+import os
+import socket
+from pathlib import Path
+
+from aiogram import Bot
+
+from jobs.db.connection_pool import chronicle_pool
+from jobs.db.job_queue import claim_job, heartbeat_job, complete_job, fail_job
+from jobs.speech2text.audio_prep import prepare_audio, remove_prepared
+from jobs.speech2text.whisper_worker import run_whisper
+from jobs.speech2text.batched_decode import batching_engine
+from jobs.speech2text.job_journal import job_journal
+from services.transcript.result_cache import SEGMENT_KEYS
+from services.transcript.transcript_duration_estimate import estimate_transcription_time, record_transcription_run
+from services.ui_utils.tg_audio_download import download_audio_from_telegram
+from services.transcript.admission import MAX_AUDIO_MB
+from metrics import span, record_transcription, JOBS_IN_FLIGHT, JOBS_TOTAL
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+BASE_DIR = Path.cwd()
+audio_save_dir = BASE_DIR / os.getenv("AUDIO_DIR", "temp_data/audio")
+os.makedirs(audio_save_dir, exist_ok=True)
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 1))
+JOB_VISIBILITY_SEC = float(os.getenv("JOB_VISIBILITY_SEC", 120))
+JOB_POLL_INTERVAL_SEC = float(os.getenv("JOB_POLL_INTERVAL_SEC", 2))
+JOB_RETRY_DELAY_SEC = float(os.getenv("JOB_RETRY_DELAY_SEC", 30))
+
+
+class QueueWorker:
+    """
+    Claims transcription jobs from the Postgres queue, runs Whisper and writes
+    the result back. Any number of these can run on any number of machines.
+    """
+
+    def __init__(self, bot: Bot, worker_id: str, concurrency: int):
+        self.bot = bot
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+
+    async def run(self):
+        logger.info(f"[QUEUE WORKER STARTED] {self.worker_id}, concurrency={self.concurrency}")
+        batching_engine.set_concurrency(self.concurrency)
+        await asyncio.to_thread(job_journal.prune)
+        await asyncio.gather(*(self._loop(slot) for slot in range(self.concurrency)))
+
+    async def _loop(self, slot: int):
+        while True:
+            try:
+                job = await chronicle_pool.run(claim_job, self.worker_id, JOB_VISIBILITY_SEC)
+            except Exception as e:
+                logger.warning(f"[QUEUE WORKER] Claim failed: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(JOB_POLL_INTERVAL_SEC)
+                continue
+            await self._process(job)
+
+    async def _process(self, job: dict):
+        job_id = str(job["id"])
+        data = job["payload"]
+        logger.info(f"[JOB CLAIMED] {job_id} attempt={job['attempts']} worker={self.worker_id}")
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        file_path = None
+        JOBS_IN_FLIGHT.inc()
+        try:
+            with span("download", job_id):
+                file_path = await download_audio_from_telegram(
+                    self.bot,
+                    data["file_id"],
+                    save_path=audio_save_dir,
+                    file_name=data.get("file_name"),
+                    mime_type=data.get("mime_type"),
+                    max_bytes=int(MAX_AUDIO_MB * 2 ** 20),
+                )
+            with span("decode", job_id):
+                pcm_path = await asyncio.to_thread(prepare_audio, file_path)
+            with span("probe", job_id):
+                predicted = await asyncio.to_thread(estimate_transcription_time, pcm_path, data["model"])
+
+            # A retry of this job on this machine continues after the windows saved before
+            segments, summary, timings = await asyncio.to_thread(run_whisper, pcm_path, data, None, True)
+            record_transcription(data["model"], timings, job_id)
+            await asyncio.to_thread(record_transcription_run, data["model"], timings, predicted)
+
+            result = {
+                "summary": summary,
+                "segments": [{k: seg.get(k) for k in SEGMENT_KEYS} for seg in segments],
+                "timings": timings,
+            }
+            await asyncio.to_thread(job_journal.finish, data["session_id"])
+            if await chronicle_pool.run(complete_job, job_id, self.worker_id, result):
+                JOBS_TOTAL.labels(outcome="done").inc()
+                logger.info(f"[JOB DONE] {job_id}")
+            else:
+                logger.warning(f"[JOB DONE BUT LOST] {job_id} was taken over by another worker")
+        except Exception as e:
+            JOBS_TOTAL.labels(outcome="failed").inc()
+            logger.exception(f"[JOB FAILED] {job_id}: {e}")
+            retry_delay = JOB_RETRY_DELAY_SEC * 2 ** (job["attempts"] - 1)
+            await chronicle_pool.run(fail_job, job_id, self.worker_id, f"{type(e).__name__}: {e}", retry_delay)
+        finally:
+            JOBS_IN_FLIGHT.dec()
+            heartbeat.cancel()
+            if file_path is not None:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                remove_prepared(file_path)
+
+    async def _heartbeat(self, job_id: str):
+        # Keeps the job invisible to other workers while we are alive
+        while True:
+            await asyncio.sleep(JOB_VISIBILITY_SEC / 3)
+            try:
+                if not await chronicle_pool.run(heartbeat_job, job_id, self.worker_id, JOB_VISIBILITY_SEC):
+                    logger.warning(f"[JOB HEARTBEAT] {job_id} is no longer ours")
+                    return
+            except Exception as e:
+                logger.warning(f"[JOB HEARTBEAT FAILED] {job_id}: {e}")
+
+
+async def run_worker():
+    bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
+    worker = QueueWorker(bot, f"{socket.gethostname()}:{os.getpid()}", WORKER_CONCURRENCY)
+    try:
+        await worker.run()
+    finally:
+        await bot.session.close()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+from pathlib import Path
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+BASE_DIR = Path.cwd()
+CACHE_PATH = BASE_DIR / os.getenv("TRANSCRIPT_CACHE_PATH", "temp_data/cache/transcripts.sqlite3")
+CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", 256))
+
+# Only what is needed to rebuild utterances and the summary, whisper tokens are dropped
+SEGMENT_KEYS = ("id", "start", "end", "text", "avg_logprob", "no_speech_prob")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    audio_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Persistent cache of transcription results keyed on the audio identity
+    (Telegram file_unique_id or content hash) plus the transcription parameters.
+    Entries are evicted least recently used first above max_bytes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(source: str, args: dict) -> str:
+        params = [
+            source,
+            args.get("model", "small"),
+            args.get("language") or "auto",
+            float(args.get("temperature") or 0.0),
+        ]
+        return hashlib.sha256(json.dumps(params).encode()).hexdigest()
+
+    def get(self, keys: list[str], count_miss: bool = True):
+        """Returns the cached payload for the first known key, or None."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            for key in keys:
+                row = conn.execute(
+                    "SELECT e.key, e.payload, e.audio_bytes FROM entries e "
+                    "WHERE e.key = ? OR e.key = (SELECT key FROM aliases WHERE alias = ?)",
+                    (key, key),
+                ).fetchone()
+                if row is None:
+                    continue
+                entry_key, payload, audio_bytes = row
+                conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), entry_key))
+                self._bump(conn, hits=1, bytes_saved=audio_bytes)
+                return json.loads(zlib.decompress(payload))
+
+            if count_miss:
+                self._bump(conn, misses=1)
+            return None
+
+    def alias(self, alias: str, key: str):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)", (alias, key))
+
+    def put(self, keys: list[str], summary: str, segments: list[dict], audio_bytes: int):
+        """Stores a result under keys[0], the other keys become aliases of it."""
+        payload = zlib.compress(json.dumps({
+            "summary": summary,
+            "segments": [{k: seg.get(k) for k in SEGMENT_KEYS} for seg in segments],
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, payload, size, audio_bytes, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (keys[0], payload, len(payload), audio_bytes, now, now),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)",
+                [(alias, keys[0]) for alias in keys[1:]],
+            )
+            self._evict(conn)
+
+    def stats(self) -> dict:
+        with self._lock, closing(self._connect()) as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "bytes_saved": counters.get("bytes_saved", 0),
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def _bump(self, conn, **counters):
+        conn.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(counters.items()),
+        )
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        conn.execute("DELETE FROM aliases WHERE key NOT IN (SELECT key FROM entries)")
+        logger.info(f"[TRANSCRIPT CACHE] Evicted {evicted} entries, {total} bytes left")
+
+
+transcript_cache = TranscriptCache(CACHE_PATH, CACHE_MAX_MB * 2**20)
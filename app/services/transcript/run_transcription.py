@@ -1,62 +1,279 @@
 # services/transcript.py
-from aiogram import Bot, types
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram import Bot
 from pathlib import Path
 import os
 import asyncio
 import datetime
-from jobs.speech2text.whisper_worker import transcribe_audio
-from services.transcript.transcript_duration_estimate import estimate_transcription_time
+from services.transcript.transcript_duration_estimate import estimate_transcription_time, record_transcription_run
+from services.transcript.job_scheduler import transcription_scheduler, QueueFullError
 from services.ui_utils.tg_audio_download import download_audio_from_telegram
+from services.transcript.result_cache import transcript_cache, file_sha256
+from services.transcript.deliver_result import deliver_result
+from services.transcript.queue_client import TRANSCRIBE_BACKEND, enqueue_transcription
+from services.transcript.live_transcript import LiveTranscript, STREAM_TRANSCRIPT
+from services.ui_utils.tg_outbox import outbox
+from services.transcript.admission import admission, MAX_AUDIO_MB
+from jobs.speech2text.audio_prep import prepare_audio, remove_prepared
+from jobs.speech2text.transcript_outputs import write_transcript_outputs
+from jobs.speech2text.job_journal import job_journal
+from metrics import span, observe_stage, record_transcription, JOBS_TOTAL
 
 BASE_DIR = Path.cwd()
 audio_save_dir = BASE_DIR / os.getenv("AUDIO_DIR", "temp_data/audio")
 os.makedirs(audio_save_dir, exist_ok=True)
+# Restarts a job is resumed after, more and it is taken for the cause of the crashes
+JOB_RESUME_MAX_ATTEMPTS = int(os.getenv("JOB_RESUME_MAX_ATTEMPTS", 3))
+_resumed_tasks = set()
 
 from logging import getLogger
 logger = getLogger(__name__)
 
+async def reject_queue_full(bot: Bot, data: dict):
+    session_id = data['session_id']
+    chat_id = data['chat_id']
+    admission.refund(data)
+    logger.info(f"[TRANSCRIPT REJECTED. QUEUE FULL] {session_id}")
+    await outbox.status(
+        chat_id,
+        session_id,
+        f"🚦 Too many transcripts are in progress right now. Please try again in a few minutes.\nID: {session_id}"
+    )
+    outbox.forget_status(chat_id, session_id)
+    JOBS_TOTAL.labels(outcome="rejected").inc()
+
+async def update_status(chat_id, session_id, text: str):
+    """Status updates are best effort: one that fails must not stop the job it is about."""
+    try:
+        await outbox.status(chat_id, session_id, text)
+    except Exception as e:
+        logger.warning(f"[STATUS UPDATE FAILED] {session_id}: {e}")
+
 async def run_transcription(bot: Bot, data: dict):
+    """Runs an admitted job; its per-user slot is given back here, or on delivery once the queue workers own the job."""
+    handed_off = False
+    try:
+        handed_off = await transcribe(bot, data)
+    except Exception:
+        admission.refund(data)
+        raise
+    finally:
+        if not handed_off:
+            admission.finish(data)
+
+async def transcribe(bot: Bot, data: dict) -> bool:
+    session_id = data['session_id']
+    chat_id = data['chat_id']
+
+    # Same Telegram file with the same settings: answer without downloading anything
+    cache_keys = []
+    if data.get("file_unique_id"):
+        cache_keys.append(transcript_cache.key(f"tg:{data['file_unique_id']}", data))
+        cached = await asyncio.to_thread(transcript_cache.get, cache_keys, False)
+        if cached is not None:
+            await deliver_cached(bot, data, cached)
+            return False
+
+    # Out-of-process workers download and transcribe, results come back via the delivery loop
+    if TRANSCRIBE_BACKEND == "queue":
+        await enqueue_transcription(bot, data)
+        return True
+
+    # Nothing is downloaded until the queue has room for the job, a busy queue makes it wait its turn
+    async def notify_deferred():
+        await outbox.status(
+            chat_id,
+            session_id,
+            f"🕰️ Many transcripts are in progress. Yours will start as soon as there is room.\nID: {session_id}"
+        )
+
+    if not await admission.wait_for_room(transcription_scheduler, data, notify_deferred):
+        await reject_queue_full(bot, data)
+        return False
+    try:
+        await transcribe_locally(bot, data, cache_keys)
+    finally:
+        admission.release_room(session_id)
+    return False
+
+async def transcribe_locally(bot: Bot, data: dict, cache_keys: list):
     session_id = data['session_id']
+    chat_id = data['chat_id']
+
     logger.info(f"[TRANSCRIPT STARTED. DOWNLOAD AUDIO FROM TG] {session_id}")
-    file_path = await download_audio_from_telegram(bot, data["file_id"], save_path=audio_save_dir)
-    transcript_dur = estimate_transcription_time(file_path, data['model'])
+    with span("download", session_id):
+        file_path = await download_audio_from_telegram(
+            bot,
+            data["file_id"],
+            save_path=audio_save_dir,
+            file_name=data.get("file_name"),
+            mime_type=data.get("mime_type"),
+            max_bytes=int(MAX_AUDIO_MB * 2 ** 20),
+        )
 
-    await bot.send_message(
-        chat_id=data['chat_id'],
-        text=f"⏳ Estimated time for transcript:\n\n{str(datetime.timedelta(seconds=transcript_dur))}"
-    )
+    # Same bytes re-uploaded as a new Telegram file: answer without decoding
+    with span("hash", session_id):
+        content_key = transcript_cache.key(f"sha256:{await asyncio.to_thread(file_sha256, file_path)}", data)
+    cached = await asyncio.to_thread(transcript_cache.get, [content_key])
+    if cached is not None:
+        for alias in cache_keys:
+            await asyncio.to_thread(transcript_cache.alias, alias, content_key)
+        os.remove(file_path)
+        await deliver_cached(bot, data, cached)
+        return
+    cache_keys.insert(0, content_key)
+    await transcribe_file(bot, data, file_path, cache_keys)
 
-    logger.info("[START WHISPER JOB]")
-    result = await asyncio.to_thread(transcribe_audio, file_path, data)
-    logger.info("[WHISPER JOB ENDED]")
+def discard_job(session_id: str, file_path: str):
+    """The job is delivered or given up: its audio and journal entry go."""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    remove_prepared(file_path)
+    job_journal.finish(session_id)
 
-    await bot.send_message(
-        chat_id=data['chat_id'],
-        text=f"✅ Done! Here is some info about your transcript 👇\nID: {session_id}\n\n{result[0]}"
-    )
+async def transcribe_file(bot: Bot, data: dict, file_path: str, cache_keys: list, resumed: bool = False):
+    """
+    Transcribes a downloaded file and delivers the result. Until then the job is
+    in the journal: after a crash or restart it is resumed from its last saved window.
+    A resumed job is never turned away by a full queue, it waits for room instead.
+    """
+    session_id = data['session_id']
+    chat_id = data['chat_id']
+    audio_bytes = os.path.getsize(file_path)
+    await asyncio.to_thread(job_journal.begin, data, file_path, cache_keys)
+
+    # Single decode: duration estimate and Whisper both read the prepared PCM
+    try:
+        with span("decode", session_id):
+            pcm_path = await asyncio.to_thread(prepare_audio, file_path)
+    except Exception:
+        await asyncio.to_thread(discard_job, session_id, file_path)
+        raise
+    with span("probe", session_id):
+        transcript_dur = await asyncio.to_thread(estimate_transcription_time, pcm_path, data['model'])
 
-    if result[1] is not None:
-        await bot.send_document(
-            chat_id=data['chat_id'],
-            document=types.FSInputFile(result[1]),
-            caption=f"Your transcript, Sir 📄\nID: {session_id}"
+    # Queue position, start and ETA are one status message, edited as the job moves on
+    async def notify_started(eta: float):
+        await outbox.status(
+            chat_id,
+            session_id,
+            f"🎙️ Your transcript has started.\nID: {session_id}\n\n⏳ Estimated time:\n\n{str(datetime.timedelta(seconds=round(eta)))}"
         )
 
-    # Store decision buttons
-    store_kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Yes, save it", callback_data=f"store_yes_{data['chat_id']}_{data['session_id']}"),
-        InlineKeyboardButton(text="No, don't save", callback_data=f"store_no_{data['chat_id']}_{data['session_id']}")]
-    ])
+    # Text shows up in a live message window by window instead of only at the end
+    live = LiveTranscript(chat_id, session_id) if STREAM_TRANSCRIPT else None
+    while True:
+        try:
+            job = await transcription_scheduler.submit(
+                pcm_path, data, transcript_dur, on_segments=live.add if live else None
+            )
+            break
+        except QueueFullError:
+            if not resumed:
+                await asyncio.to_thread(discard_job, session_id, file_path)
+                await reject_queue_full(bot, data)
+                return
+            logger.info(f"[RESUMED TRANSCRIPT WAITS. QUEUE FULL] {session_id}")
+        finally:
+            # Queued jobs are counted by the scheduler from here on
+            admission.release_room(session_id)
+        await admission.wait_for_room(transcription_scheduler, data, patient=True)
 
-    await bot.send_message(
-        chat_id=data['chat_id'],
-        text=f"Do you want to save it to our Chronicle? 📜",
-        reply_markup=store_kb
-    )
+    position = transcription_scheduler.position(job)
+    eta = transcription_scheduler.eta(job)
+    if position > 1 or eta > transcript_dur:
+        # Someone is ahead of us: report the queue now and the real start later
+        job.on_started = notify_started
+        await update_status(
+            chat_id,
+            session_id,
+            f"🕰️ Your transcript is #{position} in the queue.\nID: {session_id}\n\n⏳ Estimated time:\n\n{str(datetime.timedelta(seconds=round(eta)))}"
+        )
+    else:
+        await update_status(
+            chat_id,
+            session_id,
+            f"⏳ Estimated time for transcript:\nID: {session_id}\n\n{str(datetime.timedelta(seconds=transcript_dur))}"
+        )
+
+    logger.info("[START WHISPER JOB]")
+    try:
+        result = await job.future
+    except Exception:
+        JOBS_TOTAL.labels(outcome="failed").inc()
+        outbox.forget_status(chat_id, session_id)
+        if live is not None:
+            await live.close(delete=False)
+        await asyncio.to_thread(discard_job, session_id, file_path)
+        raise
+    logger.info("[WHISPER JOB ENDED]")
+    observe_stage("queue_wait", job.started_at - job.submitted_at, session_id)
+    record_transcription(data['model'], result[4], session_id)
 
-    if result[1] is not None:
-        os.remove(result[1])
-    os.remove(file_path)
+    delivered = False
+    try:
+        await asyncio.to_thread(record_transcription_run, data['model'], result[4], transcript_dur)
+        await asyncio.to_thread(transcript_cache.put, cache_keys, result[0], result[3], audio_bytes)
+
+        with span("telegram_send", session_id):
+            await deliver_result(bot, data, result)
+        delivered = True
+    finally:
+        # The live message goes once the full transcript is there, otherwise it keeps what was decoded
+        if live is not None:
+            await live.close(delete=delivered)
+        outbox.forget_status(chat_id, session_id)
+        JOBS_TOTAL.labels(outcome="done" if delivered else "failed").inc()
+        await asyncio.to_thread(discard_job, session_id, file_path)
 
     logger.info(f"[TRANSCRIPT ENDED] {session_id}")
+
+async def resume_transcriptions(bot: Bot):
+    """
+    Picks up the jobs the previous run did not finish. Each continues from its
+    last saved window and is delivered to the chat it came from. A job that
+    keeps dying with the process (out of memory, say) is given up.
+    """
+    await asyncio.to_thread(job_journal.prune)
+    jobs = await asyncio.to_thread(job_journal.unfinished)
+    if jobs:
+        logger.info(f"[RESUME TRANSCRIPTS] {len(jobs)} unfinished jobs")
+    for job in jobs:
+        data, session_id, chat_id = job["data"], job["session_id"], job["chat_id"]
+        attempts = await asyncio.to_thread(job_journal.resumed, session_id)
+        if attempts > JOB_RESUME_MAX_ATTEMPTS or not os.path.exists(job["file_path"]):
+            logger.warning(f"[RESUME GIVEN UP] {session_id} attempts={attempts}, file={job['file_path']}")
+            await asyncio.to_thread(discard_job, session_id, job["file_path"])
+            JOBS_TOTAL.labels(outcome="failed").inc()
+            await outbox.send_message(
+                chat_id,
+                f"❌ Sorry, your transcript could not be finished. Please send the file again.\nID: {session_id}"
+            )
+            continue
+
+        logger.info(f"[RESUME TRANSCRIPT] {session_id} attempt={attempts}")
+        await update_status(
+            chat_id,
+            session_id,
+            f"🔄 The bot was restarted. Your transcript continues where it stopped.\nID: {session_id}"
+        )
+        task = asyncio.create_task(resume_transcription(bot, data, job["file_path"], job["cache_keys"]))
+        _resumed_tasks.add(task)
+        task.add_done_callback(_resumed_tasks.discard)
+
+async def resume_transcription(bot: Bot, data: dict, file_path: str, cache_keys: list):
+    """Resumed jobs queue up behind each other like new ones, in the order they first came in."""
+    await admission.wait_for_room(transcription_scheduler, data, patient=True)
+    try:
+        await transcribe_file(bot, data, file_path, cache_keys, resumed=True)
+    finally:
+        admission.release_room(data["session_id"])
+
+async def deliver_cached(bot: Bot, data: dict, cached: dict):
+    # Nothing is decoded for a cached transcript
+    admission.refund(data)
+    result = await asyncio.to_thread(write_transcript_outputs, cached["segments"], cached["summary"], data)
+    logger.info(f"[TRANSCRIPT CACHE HIT] {data['session_id']} {await asyncio.to_thread(transcript_cache.stats)}")
+    with span("telegram_send", data['session_id']):
+        await deliver_result(bot, data, result)
+    JOBS_TOTAL.labels(outcome="cache_hit").inc()
+    logger.info(f"[TRANSCRIPT ENDED] {data['session_id']}")
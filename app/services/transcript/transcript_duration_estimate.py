@@ -1,5 +1,10 @@
 from pydub.utils import mediainfo
-from pydub import AudioSegment
+from jobs.speech2text.audio_prep import is_prepared, pcm_duration
+from jobs.speech2text.vad import decoded_seconds
+from jobs.speech2text.model_registry import model_registry
+from jobs.speech2text.chunked_transcribe import execution_mode, CHUNK_THREADS
+from jobs.speech2text.cpu_allocator import cpu_allocator
+from services.transcript.calibration_store import calibration_store, calibration_key
 import json
 import os
 import logging
@@ -35,13 +40,54 @@ else:
 
 
 def get_audio_duration(filepath):
+    # Prepared PCM: duration follows from the file size, no ffprobe spawn
+    if is_prepared(filepath):
+        return pcm_duration(filepath)
     info = mediainfo(filepath)
     duration_sec = float(info["duration"])
     return duration_sec
 
-def estimate_transcription_time(filepath, model_size):
-    duration_sec = get_audio_duration(filepath)
-    multiplier = MODEL_SPEED_FACTORS.get(model_size, 1.0)
-    load_penalty = MODEL_LOAD_TIME.get(model_size, 1.0)
-    estimated = duration_sec * multiplier + load_penalty
+def predict_transcription_time(duration_sec, model_size, threads=None):
+    # Learned from finished jobs on this machine, static JSON factors until there is enough data
+    mode = execution_mode(duration_sec)
+    if threads is None:
+        threads = CHUNK_THREADS if mode == "chunked" else cpu_allocator.expected_threads()
+    key = calibration_key(model_size, threads, mode)
+    fitted = calibration_store.coefficients(key)
+    if fitted is not None:
+        multiplier, overhead, load_penalty = fitted
+        if load_penalty is None:
+            load_penalty = MODEL_LOAD_TIME.get(model_size, 1.0)
+    else:
+        multiplier = MODEL_SPEED_FACTORS.get(model_size, 1.0)
+        overhead = 0.0
+        load_penalty = MODEL_LOAD_TIME.get(model_size, 1.0)
+
+    if model_registry.is_loaded(model_size):
+        load_penalty = 0.0
+    estimated = duration_sec * multiplier + overhead + load_penalty
     return round(estimated)
+
+def estimate_transcription_time(filepath, model_size):
+    # Prepared PCM: predicted from the speech Whisper will see, like the runs are recorded.
+    # A VAD pass over the file: call it off the event loop
+    if is_prepared(filepath):
+        return predict_transcription_time(decoded_seconds(filepath), model_size)
+    return predict_transcription_time(get_audio_duration(filepath), model_size)
+
+def record_transcription_run(model_size, timings: dict, predicted_sec=None):
+    if timings.get("restored_windows"):
+        # Part of the audio was decoded before a restart, the run says nothing about the speed
+        return
+    if timings["mode"] == "vad_rejected":
+        # Nothing was decoded
+        return
+    key = calibration_key(model_size, timings["threads"], timings["mode"])
+    calibration_store.record(
+        key,
+        model_size,
+        duration_sec=timings.get("speech_sec", timings["duration_sec"]),
+        inference_sec=timings["inference_sec"],
+        load_sec=timings.get("load_sec"),
+        predicted_sec=predicted_sec,
+    )
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+BASE_DIR = Path.cwd()
+FSM_STORAGE_PATH = BASE_DIR / os.getenv("FSM_STORAGE_PATH", "temp_data/fsm/sessions.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    bot_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL DEFAULT 0,
+    destiny TEXT NOT NULL,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    expires_at REAL,
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, destiny)
+);
+CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+"""
+
+KEY_WHERE = "bot_id = ? AND chat_id = ? AND user_id = ? AND thread_id = ? AND destiny = ?"
+
+
+def _key_params(key: StorageKey) -> tuple:
+    # NULL would never match in the primary key, the thread-less chats use 0
+    return key.bot_id, key.chat_id, key.user_id, key.thread_id or 0, key.destiny
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage that keeps sessions across bot restarts. Every state change sets
+    the session's inactivity deadline, which is reported to on_deadline
+    (None once the session is cleared) so the expiry scheduler can follow it.
+    """
+
+    def __init__(self, path: Path, timeout_sec: float, on_deadline: Callable[[StorageKey, Optional[float]], None] = None):
+        self.path = Path(path)
+        self.timeout_sec = timeout_sec
+        self.on_deadline = on_deadline
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _set_state(self, key: StorageKey, state: Optional[str], expires_at: Optional[float]):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO sessions (bot_id, chat_id, user_id, thread_id, destiny, state, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (bot_id, chat_id, user_id, thread_id, destiny) "
+                "DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at",
+                (*_key_params(key), state, expires_at),
+            )
+            conn.execute(f"DELETE FROM sessions WHERE {KEY_WHERE} AND state IS NULL AND data = '{{}}'", _key_params(key))
+
+    def _set_data(self, key: StorageKey, data: str):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO sessions (bot_id, chat_id, user_id, thread_id, destiny, data) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (bot_id, chat_id, user_id, thread_id, destiny) DO UPDATE SET data = excluded.data",
+                (*_key_params(key), data),
+            )
+            conn.execute(f"DELETE FROM sessions WHERE {KEY_WHERE} AND state IS NULL AND data = '{{}}'", _key_params(key))
+
+    def _get(self, key: StorageKey, column: str):
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {column} FROM sessions WHERE {KEY_WHERE}", _key_params(key)).fetchone()
+        return row[0] if row else None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        expires_at = time.time() + self.timeout_sec if state is not None else None
+        await asyncio.to_thread(self._set_state, key, state, expires_at)
+        if self.on_deadline is not None:
+            self.on_deadline(key, expires_at)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key, "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._set_data, key, json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await asyncio.to_thread(self._get, key, "data")
+        return json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        pass
+
+    def pending_deadlines(self) -> list[tuple[StorageKey, float]]:
+        """Deadlines of the sessions that were open when the bot stopped."""
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT bot_id, chat_id, user_id, thread_id, destiny, expires_at FROM sessions "
+                "WHERE state IS NOT NULL AND expires_at IS NOT NULL"
+            ).fetchall()
+        return [
+            (StorageKey(bot_id=bot_id, chat_id=chat_id, user_id=user_id, thread_id=thread_id or None, destiny=destiny), expires_at)
+            for bot_id, chat_id, user_id, thread_id, destiny, expires_at in rows
+        ]
+
+    def _expire(self, key: StorageKey, now: float):
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                f"SELECT state, data FROM sessions WHERE {KEY_WHERE} AND state IS NOT NULL AND expires_at <= ?",
+                (*_key_params(key), now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(f"DELETE FROM sessions WHERE {KEY_WHERE}", _key_params(key))
+        state, data = row
+        return state, json.loads(data)
+
+    async def expire(self, key: StorageKey):
+        """
+        Clears the session if its deadline has passed. Returns (state, data) of the
+        expired session, or None if the user moved on in the meantime.
+        """
+        return await asyncio.to_thread(self._expire, key, time.time())
@@ -1,11 +1,95 @@
+import mimetypes
 import os
+from pathlib import Path
+from typing import Optional
+
 from aiogram import Bot
 
+from logging import getLogger
+logger = getLogger(__name__)
+
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", 1 << 20))
+# Seconds per started MB on top of a fixed minimum, instead of aiogram's 30 s for any size
+DOWNLOAD_TIMEOUT_SEC = float(os.getenv("DOWNLOAD_TIMEOUT_SEC", 30))
+DOWNLOAD_SEC_PER_MB = float(os.getenv("DOWNLOAD_SEC_PER_MB", 5))
+
+# mimetypes knows some audio types under odd extensions, or not at all
+MIME_EXTENSIONS = {
+    "audio/ogg": ".ogg",
+    "audio/opus": ".opus",
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/mp4": ".m4a",
+    "audio/x-m4a": ".m4a",
+    "audio/aac": ".aac",
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/flac": ".flac",
+    "audio/x-flac": ".flac",
+    "audio/webm": ".webm",
+}
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+def audio_extension(telegram_path: str = None, file_name: str = None, mime_type: str = None) -> str:
+    """Extension to save the file under: Telegram's own path, then the sender's file name, then the MIME type."""
+    for name in (telegram_path, file_name):
+        suffix = Path(name).suffix.lower() if name else ""
+        if 1 < len(suffix) <= 6 and suffix[1:].isalnum():
+            return suffix
+    if mime_type:
+        return MIME_EXTENSIONS.get(mime_type.lower()) or mimetypes.guess_extension(mime_type) or ".ogg"
+    # Voice messages come without a name, they are OGG/Opus
+    return ".ogg"
+
+
 # Download audio from Telegram
-async def download_audio_from_telegram(bot: Bot, file_id: str, save_path: str) -> str:
+async def download_audio_from_telegram(
+    bot: Bot,
+    file_id: str,
+    save_path: str,
+    file_name: str = None,
+    mime_type: str = None,
+    max_bytes: Optional[int] = None,
+) -> str:
+    """
+    Streams the file to disk chunk by chunk under a .part name, renamed once complete.
+    A failed or oversized download leaves nothing behind.
+    """
     file = await bot.get_file(file_id)
-    file_path = file.file_path
-    destination = os.path.join(save_path, f"{file_id}.ogg")
+    if max_bytes and file.file_size and file.file_size > max_bytes:
+        raise FileTooLargeError(f"{file.file_size} bytes, the limit is {max_bytes}")
+
+    destination = os.path.join(save_path, f"{file_id}{audio_extension(file.file_path, file_name, mime_type)}")
+    partial = destination + ".part"
+
+    try:
+        if bot.session.api.is_local:
+            # Local Bot API server: the file is already on this machine
+            await bot.download_file(file.file_path, partial, chunk_size=DOWNLOAD_CHUNK_BYTES)
+        else:
+            size_mb = (file.file_size or 0) / 2 ** 20
+            stream = bot.session.stream_content(
+                url=bot.session.api.file_url(bot.token, file.file_path),
+                timeout=int(DOWNLOAD_TIMEOUT_SEC + DOWNLOAD_SEC_PER_MB * size_mb),
+                chunk_size=DOWNLOAD_CHUNK_BYTES,
+                raise_for_status=True,
+            )
+            received = 0
+            with open(partial, "wb") as f:
+                async for chunk in stream:
+                    received += len(chunk)
+                    # file_size is optional in the API, the cap also holds while streaming
+                    if max_bytes and received > max_bytes:
+                        raise FileTooLargeError(f"more than {max_bytes} bytes")
+                    f.write(chunk)
+        os.replace(partial, destination)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
 
-    await bot.download_file(file_path, destination)
-    return destination
\ No newline at end of file
+    return destination
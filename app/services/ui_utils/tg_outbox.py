@@ -0,0 +1,279 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import DeleteMessage, EditMessageText, SendDocument, SendMessage, TelegramMethod
+from aiogram.types import Message
+
+from metrics import TELEGRAM_SENDS_TOTAL
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Telegram's documented limits: about 30 messages per second overall, one per second
+# in a chat (short bursts are tolerated) and 20 per minute in a group
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", 30))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", 1))
+TG_CHAT_BURST = int(os.getenv("TG_CHAT_BURST", 3))
+TG_GROUP_RATE_PER_MIN = float(os.getenv("TG_GROUP_RATE_PER_MIN", 20))
+TG_SENDERS = int(os.getenv("TG_SENDERS", 4))
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", 5))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+@dataclass
+class _Outgoing:
+    chat_id: int
+    # Built right before sending, so a coalesced status goes out with its latest text
+    make: Callable[[], TelegramMethod]
+    future: asyncio.Future
+    status_key: Optional[str] = None
+    on_sent: Optional[Callable] = None
+    # Status messages: the sent one cannot be edited (deleted by the user, say), the next try sends a new one
+    on_edit_failed: Optional[Callable[[], None]] = None
+    attempts: int = field(default=0)
+
+
+class OutboundDispatcher:
+    """
+    Every message the bot sends goes through here. Messages of one chat keep
+    their order and respect a per-chat token bucket, all of them share a global
+    bucket, and a few sender tasks do the HTTP calls. 429 answers are retried
+    after the time Telegram asks for, network and server errors with backoff.
+
+    Status messages (queue position, ETA, start) are one message per job: a new
+    status for the same key replaces a queued one, or edits the one already sent.
+    """
+
+    def __init__(self, senders: int = TG_SENDERS):
+        self.senders = max(1, senders)
+        self.bot = None
+        self._global = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self._buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[int, deque[_Outgoing]] = {}
+        self._busy: set[int] = set()
+        self._status: dict[tuple, dict] = {}
+        self._wakeup = asyncio.Event()
+        self._work: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, bot: Bot):
+        if self._tasks:
+            return
+        self.bot = bot
+        self._work = asyncio.Queue(maxsize=self.senders)
+        self._tasks = [asyncio.create_task(self._schedule())]
+        self._tasks += [asyncio.create_task(self._sender()) for _ in range(self.senders)]
+        logger.info(f"[OUTBOX STARTED] senders={self.senders}, global={TG_GLOBAL_RATE}/s, chat={TG_CHAT_RATE}/s")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # Public API: each call resolves once Telegram accepted the message
+
+    def call(self, chat_id: int, method: TelegramMethod) -> asyncio.Future:
+        return self._enqueue(_Outgoing(chat_id, lambda: method, self._future()))
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self.call(chat_id, SendMessage(chat_id=chat_id, text=text, **kwargs))
+
+    def send_document(self, chat_id: int, document, **kwargs) -> asyncio.Future:
+        return self.call(chat_id, SendDocument(chat_id=chat_id, document=document, **kwargs))
+
+    def reply(self, message: Message, text: str, **kwargs) -> asyncio.Future:
+        return self.send_message(message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self.call(chat_id, EditMessageText(chat_id=chat_id, message_id=message_id, text=text, **kwargs))
+
+    def delete_message(self, chat_id: int, message_id: int) -> asyncio.Future:
+        return self.call(chat_id, DeleteMessage(chat_id=chat_id, message_id=message_id))
+
+    def status(self, chat_id: int, key: str, text: str, **kwargs) -> asyncio.Future:
+        """Shows text as the job's status message, sending it the first time and editing it afterwards."""
+        chat_id = int(chat_id)
+        state = self._status.setdefault((chat_id, key), {"message_id": None})
+        state["text"], state["kwargs"] = text, kwargs
+        for item in self._queues.get(chat_id, ()):
+            if item.status_key == key:
+                TELEGRAM_SENDS_TOTAL.labels(outcome="coalesced").inc()
+                return item.future
+
+        def make():
+            if state["message_id"] is None:
+                return SendMessage(chat_id=chat_id, text=state["text"], **state["kwargs"])
+            return EditMessageText(chat_id=chat_id, message_id=state["message_id"], text=state["text"], **state["kwargs"])
+
+        def sent(result):
+            if isinstance(result, Message):
+                state["message_id"] = result.message_id
+
+        def edit_failed():
+            state["message_id"] = None
+
+        return self._enqueue(_Outgoing(chat_id, make, self._future(), status_key=key, on_sent=sent, on_edit_failed=edit_failed))
+
+    def forget_status(self, chat_id: int, key: str):
+        """Once the job is over its status message is left as it is."""
+        self._status.pop((int(chat_id), key), None)
+
+    # Internals
+
+    def _future(self) -> asyncio.Future:
+        return asyncio.get_running_loop().create_future()
+
+    def _enqueue(self, item: _Outgoing) -> asyncio.Future:
+        if not self._tasks:
+            raise RuntimeError("Outbox is not started")
+        # Callback data carries chat ids as strings
+        item.chat_id = int(item.chat_id)
+        self._queues.setdefault(item.chat_id, deque()).append(item)
+        self._wakeup.set()
+        return item.future
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Negative ids are groups and channels
+            if chat_id < 0:
+                bucket = TokenBucket(TG_GROUP_RATE_PER_MIN / 60, 1)
+            else:
+                bucket = TokenBucket(TG_CHAT_RATE, TG_CHAT_BURST)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_buckets(self, now: float):
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._queues and c not in self._busy and b.idle(now)]:
+            del self._buckets[chat_id]
+
+    async def _schedule(self):
+        """Hands the next sendable message to the senders: one in flight per chat, in order."""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            best, wait = None, None
+            for chat_id, queue in self._queues.items():
+                if chat_id in self._busy:
+                    continue
+                delay = self._bucket(chat_id).delay(now)
+                if wait is None or delay < wait:
+                    best, wait = chat_id, delay
+            if best is not None:
+                wait = max(wait, self._global.delay(now))
+
+            if best is None or wait > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.take(now)
+            self._bucket(best).take(now)
+            queue = self._queues[best]
+            item = queue.popleft()
+            if not queue:
+                del self._queues[best]
+            self._busy.add(best)
+            if len(self._buckets) > 10000:
+                self._prune_buckets(now)
+            await self._work.put(item)
+
+    async def _sender(self):
+        while True:
+            item = await self._work.get()
+            try:
+                await self._deliver(item)
+            finally:
+                self._busy.discard(item.chat_id)
+                self._wakeup.set()
+
+    def _retry(self, item: _Outgoing, delay: float, reason: str):
+        item.attempts += 1
+        if item.attempts > TG_MAX_RETRIES:
+            TELEGRAM_SENDS_TOTAL.labels(outcome="failed").inc()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError(f"Gave up after {TG_MAX_RETRIES} retries: {reason}"))
+            return
+        TELEGRAM_SENDS_TOTAL.labels(outcome="retried").inc()
+        logger.warning(f"[OUTBOX RETRY] chat={item.chat_id} in {delay:.1f}s ({reason})")
+        self._bucket(item.chat_id).block(delay)
+        # Back to the front, so the chat's messages stay in order
+        self._queues.setdefault(item.chat_id, deque()).appendleft(item)
+
+    async def _deliver(self, item: _Outgoing):
+        method = item.make()
+        try:
+            result = await self.bot(method)
+        except TelegramRetryAfter as e:
+            self._retry(item, e.retry_after, "flood control")
+        except (TelegramNetworkError, TelegramServerError) as e:
+            self._retry(item, min(30.0, 2.0 ** item.attempts), str(e))
+        except TelegramBadRequest as e:
+            if item.status_key is not None and "message is not modified" in str(e):
+                TELEGRAM_SENDS_TOTAL.labels(outcome="sent").inc()
+                if not item.future.done():
+                    item.future.set_result(True)
+                return
+            if item.on_edit_failed is not None and isinstance(method, EditMessageText):
+                item.on_edit_failed()
+                self._retry(item, 0.0, f"status message not editable, sending a new one: {e}")
+                return
+            TELEGRAM_SENDS_TOTAL.labels(outcome="failed").inc()
+            if not item.future.done():
+                item.future.set_exception(e)
+        except Exception as e:
+            TELEGRAM_SENDS_TOTAL.labels(outcome="failed").inc()
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            TELEGRAM_SENDS_TOTAL.labels(outcome="sent").inc()
+            if item.on_sent is not None:
+                item.on_sent(result)
+            if not item.future.done():
+                item.future.set_result(result)
+
+
+outbox = OutboundDispatcher()
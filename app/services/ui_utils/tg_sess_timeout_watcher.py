@@ -1,28 +1,70 @@
-from aiogram import types
-from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State
 import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Hashable, Optional
 
 from logging import getLogger
 logger = getLogger(__name__)
 
-# Session time out
-async def start_timeout_watcher(
-    state: FSMContext,
-    target_state: State,
-    timeout_seconds: int,
-    callback_message: types.Message,
-    start_kb
-):
-    await asyncio.sleep(timeout_seconds)
-    current = await state.get_state()
-    if current == target_state.state:
-        session_id = await state.get_data['session_id']
-        logger.info(f"[SESSION {session_id} EXPIRED DUE TO INACTIVITY]")
-        await state.clear()
-        await callback_message.answer(
-            "⏳ Session expired due to inactivity.\nPlease start again.",
-            reply_markup=start_kb
-            )
 
+class SessionExpiry:
+    """
+    Inactivity deadlines of all FSM sessions in one min-heap, served by a single task.
+    A session has one deadline at a time: resetting it pushes a new heap entry and
+    the outdated one is skipped when it reaches the top, so both are O(log n).
+    """
 
+    def __init__(self, on_expire: Callable[[Hashable], Awaitable]):
+        self.on_expire = on_expire
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._deadlines: dict[Hashable, tuple[float, int]] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: Hashable, deadline: Optional[float]):
+        """Sets the session's deadline (a time.time() value), None removes it."""
+        if deadline is None:
+            self._deadlines.pop(key, None)
+            return
+        entry = (deadline, next(self._seq))
+        self._deadlines[key] = entry
+        heapq.heappush(self._heap, (*entry, key))
+        if self._heap[0][2] == key and self._heap[0][1] == entry[1]:
+            # New earliest deadline: the sleeping task has to wake up sooner
+            self._wakeup.set()
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [(deadline, seq, key) for key, (deadline, seq) in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> list[Hashable]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, seq, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == (deadline, seq):
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            for key in self._pop_due(time.time()):
+                try:
+                    await self.on_expire(key)
+                except Exception as e:
+                    logger.warning(f"[SESSION EXPIRY FAILED] {key}: {e}")
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is not None and timeout <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
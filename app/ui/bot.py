@@ -1,16 +1,27 @@
 from aiogram import Bot, Dispatcher, F, types
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup, default_state
-from aiogram.fsm.storage.memory import MemoryStorage
 import asyncio
 import os
 import datetime
 import uuid
-from services.transcript.run_transcription import run_transcription
-from services.ui_utils.tg_sess_timeout_watcher import start_timeout_watcher
+from services.transcript.run_transcription import run_transcription, resume_transcriptions
+from services.transcript.admission import admission
+from services.transcript.job_scheduler import transcription_scheduler
+from services.transcript.queue_client import TRANSCRIBE_BACKEND, delivery_loop
+from metrics import QUEUE_DEPTH, JOBS_IN_FLIGHT
+from services.ui_utils.tg_sess_timeout_watcher import SessionExpiry
+from services.ui_utils.sqlite_fsm_storage import SQLiteStorage, FSM_STORAGE_PATH
+from services.ui_utils.tg_outbox import outbox
 from ui.create_buttons import create_buttons
 from services.db_interaction.save_to_chronicle import save_to_chronicle
+from services.db_interaction.search_chronicle import search_chronicle
+from jobs.db.connection_pool import chronicle_pool
+from jobs.speech2text.staging_store import staging_store
+from jobs.speech2text.model_registry import PRELOAD_MODELS
+from services.db_interaction.init_db import init_db
+from readiness import readiness
 
 from logging import getLogger
 logger = getLogger(__name__)
@@ -25,13 +36,29 @@ class FormStates(StatesGroup):
     waiting_audio = State()
     waiting_store_decision = State()
 
+# Set up some params
+timeout_seconds = int(os.getenv("TIMEOUT_SECONDS", 600))
+
+# Session time out: one deadline per session, reset on every state change
+async def expire_session(key):
+    expired = await storage.expire(key)
+    if expired is None:
+        return
+    state, data = expired
+    logger.info(f"[SESSION {data.get('session_id')} EXPIRED DUE TO INACTIVITY] state={state}")
+    await outbox.send_message(
+        key.chat_id,
+        "⏳ Session expired due to inactivity.\nPlease start again.",
+        reply_markup=start_kb
+    )
+
+session_expiry = SessionExpiry(expire_session)
+storage = SQLiteStorage(FSM_STORAGE_PATH, timeout_seconds, on_deadline=session_expiry.schedule)
+
 # Set up bot
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-
-# Set up some params
-timeout_seconds = int(os.getenv("TIMEOUT_SECONDS", 600))
+dp = Dispatcher(storage=storage)
 
 # Create buttons
 start_kb, language_kb, model_kb, temp_kb, output_kb = create_buttons()
@@ -39,16 +66,47 @@ start_kb, language_kb, model_kb, temp_kb, output_kb = create_buttons()
 # Entry point
 @dp.message(CommandStart())
 async def cmd_start(message: types.Message):
-    await message.answer(
+    await outbox.send_message(
+        message.chat.id,
         "Welcome to the Polis Chronicler Bot 🏛️\nHere you can send your audio dialogues to transcribe them and record into our Chronicle.\nClick the button below to begin.",
         reply_markup=start_kb
     )
     logger.info('[BOT IS WORKING]')
 
+# Full-text search over the Chronicle
+def search_more_kb(token):
+    if token is None:
+        return None
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [types.InlineKeyboardButton(text="More results ➡️", callback_data=f"search_more_{token}")]
+    ])
+
+@dp.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject):
+    query = (command.args or "").strip()
+    if not query:
+        await outbox.reply(message, "Usage: /search <words or \"exact phrase\">")
+        return
+    text, token = await search_chronicle(query=query)
+    await outbox.send_message(message.chat.id, text, parse_mode="HTML", reply_markup=search_more_kb(token))
+
+@dp.callback_query(F.data.startswith("search_more_"))
+async def search_more(callback: types.CallbackQuery):
+    text, token = await search_chronicle(token=callback.data[len("search_more_"):])
+    await callback.answer()
+    await outbox.send_message(callback.message.chat.id, text, parse_mode="HTML", reply_markup=search_more_kb(token))
+
+# Start-up state of the background parts
+@dp.message(Command("status"))
+async def cmd_status(message: types.Message):
+    icons = {"ready": "🟢", "pending": "🟡"}
+    lines = [f"{icons.get(state, '🔴')} {name}: {state}" for name, state in readiness.status().items()]
+    await outbox.send_message(message.chat.id, "\n".join(lines) + f"\n\nUp for {datetime.timedelta(seconds=round(readiness.uptime()))}")
+
 # Prevent users from spamming random messages outside the flow
 @dp.message(F.state == default_state)
 async def catch_all(message: types.Message):
-    await message.reply("Please use the button 'Send file' to start a session. Everything else will be ignored. ⛔",
+    await outbox.reply(message, "Please use the button 'Send file' to start a session. Everything else will be ignored. ⛔",
     reply_markup=start_kb
     )
 
@@ -66,76 +124,80 @@ async def start_session(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(session_start_dttm=datetime.datetime.now().isoformat())
     await state.update_data(user_id=callback.from_user.id)
 
-    await callback.message.answer("Choose the language of your audio:", reply_markup=language_kb)
+    await outbox.send_message(callback.message.chat.id, "Choose the language of your audio:", reply_markup=language_kb)
     await state.set_state(FormStates.waiting_language)
 
-    asyncio.create_task(start_timeout_watcher(state=state, target_state=FormStates.waiting_language, timeout_seconds=timeout_seconds, callback_message=callback.message, start_kb=start_kb))
-
 
 @dp.callback_query(FormStates.waiting_language, F.data.startswith("lang_"))
 async def select_language(callback: types.CallbackQuery, state: FSMContext):
     lang = callback.data.split("_")[1]
     await state.update_data(language=lang)
-    await callback.message.answer("Choose the model size (the bigger size - the longer time):", reply_markup=model_kb)
+    await outbox.send_message(callback.message.chat.id, "Choose the model size (the bigger size - the longer time):", reply_markup=model_kb)
     await state.set_state(FormStates.waiting_model)
 
-    asyncio.create_task(start_timeout_watcher(state=state, target_state=FormStates.waiting_model, timeout_seconds=timeout_seconds, callback_message=callback.message, start_kb=start_kb))
-
 
 @dp.callback_query(FormStates.waiting_model, F.data.startswith("model_"))
 async def select_model(callback: types.CallbackQuery, state: FSMContext):
     model = callback.data.split("_")[1]
     await state.update_data(model=model)
-    await callback.message.answer(
+    await outbox.send_message(
+        callback.message.chat.id,
         "Select temperature (controls transcription creativity):",
         reply_markup=temp_kb
     )
     await state.set_state(FormStates.waiting_temperature)
 
-    asyncio.create_task(start_timeout_watcher(state=state, target_state=FormStates.waiting_temperature, timeout_seconds=timeout_seconds, callback_message=callback.message, start_kb=start_kb))
-
 
 @dp.callback_query(FormStates.waiting_temperature, F.data.startswith("temp_"))
 async def select_temperature(callback: types.CallbackQuery, state: FSMContext):
     temp_val = callback.data.split("_")[1]
     temperature = None if temp_val == "default" else float(temp_val)
     await state.update_data(temperature=temperature)
-    await callback.message.answer("Choose what you want to receive:", reply_markup=output_kb)
+    await outbox.send_message(callback.message.chat.id, "Choose what you want to receive:", reply_markup=output_kb)
     await state.set_state(FormStates.waiting_output_type)
 
-    asyncio.create_task(start_timeout_watcher(state=state, target_state=FormStates.waiting_output_type, timeout_seconds=timeout_seconds, callback_message=callback.message, start_kb=start_kb))
-
 
 @dp.callback_query(FormStates.waiting_output_type)
 async def select_output_type(callback: types.CallbackQuery, state: FSMContext):
     choice = "text" if "text" in callback.data else "info"
     await state.update_data(output_type=choice)
-    await callback.message.answer("🆗 Great. Now send me your audio file or voice message.")
+    await outbox.send_message(callback.message.chat.id, "🆗 Great. Now send me your audio file or voice message.")
     await state.set_state(FormStates.waiting_audio)
 
-    asyncio.create_task(start_timeout_watcher(state=state, target_state=FormStates.waiting_audio, timeout_seconds=timeout_seconds, callback_message=callback.message, start_kb=start_kb))
-
 @dp.message(FormStates.waiting_audio, F.voice | F.audio | F.document)
 async def receive_audio(message: types.Message, state: FSMContext):
     file = message.voice or message.audio or message.document
 
     if not file:
-        await message.reply("Please send an actual audio file or voice message.")
+        await outbox.reply(message, "Please send an actual audio file or voice message.")
         return
 
     if message.document and not message.document.mime_type.startswith("audio/"):
-        await message.reply("This doesn't look like an audio file. Only audio formats are supported.")
+        await outbox.reply(message, "This doesn't look like an audio file. Only audio formats are supported.")
         return
 
-    await message.reply("✔️ Your file has been received. You will be notified once the transcript is done. 🔔")
     await state.update_data(file_id=file.file_id)
+    await state.update_data(file_unique_id=file.file_unique_id)
+    await state.update_data(file_size=file.file_size)
+    await state.update_data(duration=getattr(file, "duration", None))
+    await state.update_data(file_name=getattr(file, "file_name", None))
+    await state.update_data(mime_type=getattr(file, "mime_type", None))
     await state.update_data(chat_id=message.chat.id)
 
     data = await state.get_data()
     session_id = data['session_id']
-    await bot.send_message(
-            chat_id=data['chat_id'],
-            text=f"Transcript ID: {session_id}")
+    # Decided from what the message tells about the file, before anything is downloaded
+    rejection = admission.admit(data)
+    if rejection is not None:
+        await outbox.reply(message, rejection)
+        # The session ends here like after a submitted file, which also cancels its expiry deadline
+        await state.clear()
+        await outbox.send_message(message.chat.id, "Session ended 🫡. Ready for another one:", reply_markup=start_kb)
+        return
+
+    await outbox.reply(message, "✔️ Your file has been received. You will be notified once the transcript is done. 🔔")
+    # First version of the job's status message, later edited with the queue position and ETA
+    await outbox.status(data['chat_id'], session_id, f"Transcript ID: {session_id}")
     
     logger.info(f"[SEND TRANSCRIPTION TASK] {data['session_id']}")
     asyncio.create_task(run_transcription(bot, data))
@@ -147,16 +209,17 @@ async def receive_audio(message: types.Message, state: FSMContext):
     chat_id = data['chat_id']
 
     await state.clear()
-    await bot.send_message(chat_id=chat_id, text="Session ended 🫡. Ready for another one:", reply_markup=start_kb)
+    await outbox.send_message(chat_id, "Session ended 🫡. Ready for another one:", reply_markup=start_kb)
 
 
 @dp.callback_query(F.data.startswith("store_"))
 async def store_decision(callback: types.CallbackQuery):
     cb_data = callback.data.split('_')
     if cb_data[1] == "yes":
-        await callback.message.answer("Your file will be saved to the Chronicle. 🦾")
+        await outbox.send_message(callback.message.chat.id, "Your file will be saved to the Chronicle. 🦾")
     else:
-        await callback.message.answer("Okay, file will not be saved.")
+        await outbox.send_message(callback.message.chat.id, "Okay, file will not be saved.")
+        await asyncio.to_thread(staging_store.discard, cb_data[3])
 
     
 
@@ -164,10 +227,65 @@ async def store_decision(callback: types.CallbackQuery):
         asyncio.create_task(save_to_chronicle(bot, cb_data[3], cb_data[2]))
         logger.info(f'[SEND CHRONICLE SAVING TASK] {cb_data[3]}')
 
-    await bot.send_message(chat_id=cb_data[2], text="Do you want to send another file? 🫴", reply_markup=start_kb)
+    await outbox.send_message(cb_data[2], "Do you want to send another file? 🫴", reply_markup=start_kb)
+
+
+# Slow start-up work, done after polling has begun so the bot answers right away
+async def init_database():
+    try:
+        await chronicle_pool.run(init_db)
+        readiness.mark_ready("database")
+    except Exception as e:
+        readiness.mark_failed("database", e)
+
+async def warm_up_speech():
+    try:
+        await transcription_scheduler.warm_up(PRELOAD_MODELS)
+        readiness.mark_ready("speech")
+    except Exception as e:
+        readiness.mark_failed("speech", e)
+
+_startup_tasks = set()
+
+async def on_startup():
+    readiness.mark_ready("polling")
+    jobs = [init_database()]
+    if TRANSCRIBE_BACKEND != "queue":
+        jobs.append(warm_up_speech())
+        # Transcripts cut off by the last shutdown or crash
+        jobs.append(resume_transcriptions(bot))
+    for job in jobs:
+        task = asyncio.create_task(job)
+        _startup_tasks.add(task)
+        task.add_done_callback(_startup_tasks.discard)
 
 
 # Main loop
 async def start_bot():
+    # Everything the bot sends goes through the rate-limited outbox
+    outbox.start(bot)
+    if TRANSCRIBE_BACKEND == "queue":
+        # Whisper runs in worker.py processes
+        readiness.skip("speech")
+        delivery_task = asyncio.create_task(delivery_loop(bot))
+    else:
+        delivery_task = None
+        transcription_scheduler.start()
+        QUEUE_DEPTH.set_function(lambda: transcription_scheduler.queued)
+        JOBS_IN_FLIGHT.set_function(lambda: transcription_scheduler.running)
+    # Sessions left open by the previous run keep their deadlines
+    for key, deadline in storage.pending_deadlines():
+        session_expiry.schedule(key, deadline)
+    expiry_task = asyncio.create_task(session_expiry.run())
+    logger.info(f"[SESSION EXPIRY STARTED] open sessions={len(session_expiry)}")
+    dp.startup.register(on_startup)
     logger.info('[START BOT POLLING]')
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        expiry_task.cancel()
+        if delivery_task is not None:
+            delivery_task.cancel()
+        await transcription_scheduler.stop()
+        await outbox.stop()
+        chronicle_pool.close()
@@ -0,0 +1,17 @@
+import asyncio
+from services.transcript.queue_worker import run_worker
+from services.db_interaction.init_db import init_db
+from log_setup import setup_logging
+from metrics import start_metrics_server
+from logging import getLogger
+
+def main():
+    setup_logging()
+    logger = getLogger(__name__)
+    logger.info("[Chronicle transcription worker starting]")
+    start_metrics_server()
+    init_db()
+    asyncio.run(run_worker())
+
+if __name__ == "__main__":
+    main()
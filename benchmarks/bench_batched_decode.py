@@ -0,0 +1,75 @@
+"""
+Throughput of cross-request batched decoding against the one-job-at-a-time path,
+in audio seconds per wall second, for N concurrent short jobs of one model.
+
+Real voice notes give the honest numbers (decoder length depends on the speech);
+without --audio, synthetic speech-like clips are used.
+
+    python benchmarks/bench_batched_decode.py --model small --jobs 8 --audio a.ogg b.ogg
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_pipeline import synth_speech
+
+from jobs.speech2text.audio_prep import prepare_audio, load_pcm, SAMPLE_RATE
+from jobs.speech2text.batched_decode import BatchingEngine, BATCH_MAX_AUDIO_SEC
+from jobs.speech2text.model_registry import model_registry
+
+
+def load_clips(args) -> list:
+    if args.audio:
+        clips = [load_pcm(prepare_audio(path))[:int(BATCH_MAX_AUDIO_SEC * SAMPLE_RATE)] for path in args.audio]
+    else:
+        clips = [synth_speech(args.clip_sec, seed=i) for i in range(args.jobs)]
+    # Cycle through the given files until there are enough jobs
+    return [clips[i % len(clips)] for i in range(args.jobs)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--jobs", type=int, default=8, help="Concurrent jobs")
+    parser.add_argument("--clip-sec", type=float, default=20.0, help="Length of synthetic clips")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=100)
+    parser.add_argument("--audio", nargs="*", help="Short audio files to use instead of synthetic clips")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    clips = load_clips(args)
+    audio_sec = sum(len(c) for c in clips) / SAMPLE_RATE
+    options = {"language": args.language, "temperature": 0.0}
+    model_registry.preload([args.model])
+
+    started = time.perf_counter()
+    for clip in clips:
+        with model_registry.acquire(args.model) as model:
+            model.transcribe(clip, **options)
+    sequential = time.perf_counter() - started
+
+    engine = BatchingEngine(args.max_batch, args.max_wait_ms)
+    engine.set_concurrency(args.jobs)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        list(pool.map(lambda clip: engine.transcribe(args.model, clip, options), clips))
+    batched = time.perf_counter() - started
+
+    results = {
+        "audio_sec": audio_sec,
+        "sequential_audio_sec_per_sec": audio_sec / sequential,
+        "batched_audio_sec_per_sec": audio_sec / batched,
+        "speedup": sequential / batched,
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:>30}: {value:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
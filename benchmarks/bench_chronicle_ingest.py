@@ -0,0 +1,112 @@
+"""
+Compares Chronicle ingest throughput: the old one-INSERT-per-segment loop
+against the bulk COPY path. Needs POSTGRES_URL pointing at a local database.
+
+    python benchmarks/bench_chronicle_ingest.py --dialogs 20 --segments 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import psycopg2
+
+from jobs.db.upload_s2t_to_postgres import insert_dialogs, dialog_row
+
+
+def make_dialog(n_segments: int) -> list[dict]:
+    dialog_id = str(uuid.uuid4())
+    created_at = datetime.now().isoformat()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "dialog_id": dialog_id,
+            "content": f" Synthetic utterance number {i}, with\ttabs and a \\ backslash.",
+            "start_time": i * 2.0,
+            "end_time": i * 2.0 + 1.8,
+            "segment_number": i,
+            "created_at": created_at,
+            "speaker": "bench",
+            "metadata": {},
+        }
+        for i in range(n_segments)
+    ]
+
+
+def rowwise_insert(conn, utterances: list[dict]):
+    """The pre-COPY ingest: one round trip per segment."""
+    with conn, conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO dialogs (id, title, started_at, ended_at, topic_id, tags, source, participants, summary, metadata) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            dialog_row(utterances),
+        )
+        for u in utterances:
+            cursor.execute(
+                "INSERT INTO utterances (id, dialog_id, speaker, content, start_time, end_time, segment_number, created_at, metadata) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                (
+                    u["id"], u["dialog_id"], u.get("speaker"), u["content"],
+                    u["start_time"], u["end_time"], u["segment_number"],
+                    u.get("created_at"), json.dumps(u.get("metadata", {})),
+                ),
+            )
+
+
+def cleanup(conn, dialogs: list[list[dict]]):
+    ids = [d[0]["dialog_id"] for d in dialogs]
+    with conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM utterances WHERE dialog_id = ANY(%s::uuid[])", (ids,))
+        cursor.execute("DELETE FROM dialogs WHERE id = ANY(%s::uuid[])", (ids,))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dialogs", type=int, default=10)
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ["POSTGRES_URL"])
+    n_rows = args.dialogs * args.segments
+    results = {}
+
+    dialogs = [make_dialog(args.segments) for _ in range(args.dialogs)]
+    started = time.perf_counter()
+    for d in dialogs:
+        rowwise_insert(conn, d)
+    results["rowwise_rows_per_sec"] = n_rows / (time.perf_counter() - started)
+    cleanup(conn, dialogs)
+
+    dialogs = [make_dialog(args.segments) for _ in range(args.dialogs)]
+    started = time.perf_counter()
+    for d in dialogs:
+        insert_dialogs([d])
+    results["copy_rows_per_sec"] = n_rows / (time.perf_counter() - started)
+    cleanup(conn, dialogs)
+
+    dialogs = [make_dialog(args.segments) for _ in range(args.dialogs)]
+    started = time.perf_counter()
+    insert_dialogs(dialogs)
+    results["copy_batch_rows_per_sec"] = n_rows / (time.perf_counter() - started)
+    cleanup(conn, dialogs)
+
+    conn.close()
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:>26}: {value:12.0f}")
+        print(f"{'speedup (copy / rowwise)':>26}: {results['copy_rows_per_sec'] / results['rowwise_rows_per_sec']:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Throughput of the semantic index: encoding (utterances/sec) with the configured
+sentence-transformers model and top-k retrieval (queries/sec) over a float16
+memory-mapped matrix, scanned from the map and from the float32 RAM copy.
+Retrieval runs on random vectors and needs neither the model nor Postgres.
+
+    python benchmarks/bench_embeddings.py --rows 1000000 --queries 200
+    python benchmarks/bench_embeddings.py --encode 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+import numpy as np
+
+from jobs.embeddings.embedding_index import EmbeddingIndex, top_k, EMBEDDING_MODEL
+
+WORDS = (
+    "meeting budget release customer deadline design review server database "
+    "schedule travel report invoice team weekend project feature bug call"
+).split()
+
+
+def make_sentences(n: int) -> list[str]:
+    rng = random.Random(0)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(4, 30))) for _ in range(n)]
+
+
+def bench_encode(n: int) -> float:
+    index = EmbeddingIndex(tempfile.mkdtemp(), EMBEDDING_MODEL)
+    sentences = make_sentences(n)
+    index.encode(sentences[:64])  # model load and warm-up
+    started = time.perf_counter()
+    index.encode(sentences)
+    return n / (time.perf_counter() - started)
+
+
+def bench_search(n_rows: int, dim: int, n_queries: int, k: int) -> dict:
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "vectors.f16"), "wb") as f:
+            for start in range(0, n_rows, 100_000):
+                block = rng.standard_normal((min(100_000, n_rows - start), dim), dtype=np.float32)
+                block /= np.linalg.norm(block, axis=1, keepdims=True)
+                f.write(block.astype(np.float16).tobytes())
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"model": "bench", "dim": dim}, f)
+        index = EmbeddingIndex(tmp, "bench")
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+
+        results = {}
+        for name, vectors in (("mapped", index.matrix()), ("resident", index.vectors())):
+            top_k(vectors, queries[0], k)  # page the matrix in
+            started = time.perf_counter()
+            for q in queries:
+                top_k(vectors, q, k)
+            results[f"search_{name}_queries_per_sec"] = n_queries / (time.perf_counter() - started)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000, help="Matrix rows for the retrieval benchmark")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--encode", type=int, default=0, help="Sentences to encode, 0 skips the model benchmark")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = bench_search(args.rows, args.dim, args.queries, args.k)
+    if args.encode:
+        results["encode_utterances_per_sec"] = bench_encode(args.encode)
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:>32}: {value:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+End-to-end benchmark of the transcription pipeline on synthetic audio.
+
+Every audio length is run through the same stages as a bot request, each timed
+on its own: download stand-in (file copy), duration probe, decode to PCM,
+duration estimate, transcription, transcript staging and Postgres ingest.
+The model is loaded once up front and reported as model_load_sec.
+
+The staging and ingest stages use synthetic segments at a fixed density
+(--segment-sec), so rows/sec does not depend on what Whisper makes of tones.
+Ingest runs only with POSTGRES_URL set, and the rows are deleted afterwards.
+
+    python benchmarks/bench_pipeline.py --lengths 30,120,600 --model tiny --out results.json
+    python benchmarks/bench_pipeline.py --save-baseline      # store the current numbers
+    python benchmarks/bench_pipeline.py                      # exits with 1 on a regression
+
+Baselines depend on the machine, so none is committed: save one on the machine
+that runs the check. Without a baseline the script exits with 1 before running.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+import wave
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+# Output paths of the pipeline are relative to app/, like in the bot
+os.chdir(APP_DIR)
+
+import numpy as np
+
+from jobs.speech2text.audio_prep import prepare_audio, remove_prepared, SAMPLE_RATE
+from jobs.speech2text.model_registry import model_registry
+from jobs.speech2text.cpu_allocator import cpu_allocator
+from jobs.speech2text.whisper_worker import run_whisper, write_transcript_outputs
+from jobs.speech2text.staging_store import staging_store
+from services.transcript.transcript_duration_estimate import get_audio_duration, estimate_transcription_time
+from services.transcript.calibration_store import CPU_SIGNATURE
+
+DEFAULT_BASELINE = BENCH_DIR / "baselines" / "pipeline.json"
+
+# metric -> True if higher is better
+COMPARED_METRICS = {
+    "rtf": False,
+    "ingest_rows_per_sec": True,
+}
+
+
+def synth_speech(duration_sec: float, seed: int = 0) -> np.ndarray:
+    """
+    Speech-like signal: voiced phrases of 1-4 s with a wandering pitch, harmonics and
+    syllable-rate amplitude modulation, separated by pauses over a low noise floor.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration_sec * SAMPLE_RATE)
+    audio = rng.normal(0, 0.002, n).astype(np.float32)
+
+    pos = int(rng.uniform(0.2, 1.0) * SAMPLE_RATE)
+    while pos < n:
+        length = min(int(rng.uniform(1.0, 4.0) * SAMPLE_RATE), n - pos)
+        t = np.arange(length) / SAMPLE_RATE
+        f0 = rng.uniform(100, 220) * (1 + 0.08 * np.sin(2 * np.pi * rng.uniform(0.3, 1.0) * t))
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        voiced = sum(np.sin(h * phase) / h for h in range(1, 6))
+        syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * t))
+        audio[pos:pos + length] += (0.2 * voiced * syllables).astype(np.float32)
+        pos += length + int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+
+    return np.clip(audio, -1, 1)
+
+
+def write_wav(path: str, audio: np.ndarray):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+
+def synth_segments(duration_sec: float, segment_sec: float) -> list[dict]:
+    count = max(1, int(duration_sec / segment_sec))
+    return [
+        {"id": i, "start": i * segment_sec, "end": (i + 1) * segment_sec, "text": f" Synthetic benchmark segment {i}."}
+        for i in range(count)
+    ]
+
+
+def timed(stages: dict, name: str, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    stages[name] = time.perf_counter() - started
+    return result
+
+
+def ingest(dialog_id: str) -> None:
+    from jobs.db.upload_s2t_to_postgres import run_import_staged
+    from jobs.db.connection_pool import chronicle_pool
+
+    run_import_staged(dialog_id)
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM utterances WHERE dialog_id = %s", (dialog_id,))
+        cursor.execute("DELETE FROM dialogs WHERE id = %s", (dialog_id,))
+
+
+def run_once(source: str, work_dir: str, duration_sec: float, args) -> dict:
+    stages = {}
+    session_id = str(uuid.uuid4())
+    data = {
+        "session_id": session_id,
+        "model": args.model,
+        "language": args.language,
+        "temperature": 0.0,
+        "output_type": "text",
+        "user_id": "bench",
+        "session_start_dttm": datetime.now().isoformat(),
+    }
+
+    downloaded = os.path.join(work_dir, f"{session_id}.wav")
+    timed(stages, "download", shutil.copyfile, source, downloaded)
+    timed(stages, "duration_probe", get_audio_duration, downloaded)
+    pcm_path = timed(stages, "decode", prepare_audio, downloaded)
+    timed(stages, "estimate", estimate_transcription_time, pcm_path, args.model)
+    segments, summary, timings = timed(stages, "transcribe", run_whisper, pcm_path, data)
+
+    synthetic = synth_segments(duration_sec, args.segment_sec)
+    _, txt_path, _, _ = timed(stages, "staging_write", write_transcript_outputs, synthetic, summary, data)
+
+    run = {
+        "length_sec": duration_sec,
+        "stages": stages,
+        "rtf": stages["transcribe"] / duration_sec,
+        "whisper_mode": timings.get("mode"),
+        "whisper_segments": len(segments),
+    }
+    try:
+        if os.getenv("POSTGRES_URL"):
+            timed(stages, "ingest", ingest, session_id)
+            run["ingest_rows"] = len(synthetic)
+            run["ingest_rows_per_sec"] = len(synthetic) / stages["ingest"]
+    finally:
+        staging_store.discard(session_id)
+        for path in (txt_path, downloaded):
+            if path and os.path.exists(path):
+                os.remove(path)
+        remove_prepared(downloaded)
+    return run
+
+
+def run_benchmark(args) -> dict:
+    lengths = [float(x) for x in args.lengths.split(",")]
+
+    load_started = time.perf_counter()
+    with model_registry.acquire(args.model):
+        pass
+    model_load_sec = time.perf_counter() - load_started
+
+    runs = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for i, length in enumerate(lengths):
+            source = os.path.join(work_dir, f"source_{int(length)}s.wav")
+            write_wav(source, synth_speech(length, seed=i))
+            attempts = [run_once(source, work_dir, length, args) for _ in range(args.repeat)]
+            # Fastest attempt: the least disturbed by whatever else runs on the machine
+            best = min(attempts, key=lambda r: r["rtf"])
+            if "ingest_rows_per_sec" in best:
+                best["ingest_rows_per_sec"] = max(r["ingest_rows_per_sec"] for r in attempts)
+            best["rtf_spread"] = statistics.pstdev([r["rtf"] for r in attempts])
+            runs.append(best)
+            print(f"{length:>7.0f}s  rtf={best['rtf']:.3f}  " + "  ".join(f"{k}={v:.3f}s" for k, v in best["stages"].items()))
+
+    return {
+        "meta": {
+            "model": args.model,
+            "threads": cpu_allocator.expected_threads(),
+            "cpu": CPU_SIGNATURE,
+            "python": platform.python_version(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "model_load_sec": model_load_sec,
+        "runs": runs,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a line per metric that is worse than the baseline by more than the tolerance."""
+    regressions = []
+    for key in ("model", "threads", "cpu"):
+        if results["meta"].get(key) != baseline["meta"].get(key):
+            print(f"warning: baseline {key} is {baseline['meta'].get(key)!r}, now {results['meta'].get(key)!r}")
+
+    baseline_runs = {r["length_sec"]: r for r in baseline["runs"]}
+    for run in results["runs"]:
+        base = baseline_runs.get(run["length_sec"])
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in run or metric not in base:
+                continue
+            now, then = run[metric], base[metric]
+            change = (now - then) / then if then else 0.0
+            worse = -change if higher_is_better else change
+            status = "REGRESSION" if worse > tolerance else "ok"
+            print(f"{run['length_sec']:>7.0f}s  {metric:<20} {then:10.3f} -> {now:10.3f}  {change:+7.1%}  {status}")
+            if status != "ok":
+                regressions.append(f"{metric} at {run['length_sec']:.0f}s: {then:.3f} -> {now:.3f} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", default="30,120,600", help="Comma-separated audio lengths in seconds")
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per length, the fastest one is kept")
+    parser.add_argument("--segment-sec", type=float, default=4.0, help="Synthetic segment length for staging and ingest")
+    parser.add_argument("--out", help="Write the results JSON here")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    if not args.save_baseline and not baseline_path.exists():
+        # Without a baseline nothing is compared, which must not pass as "no regression"
+        print(f"No baseline at {baseline_path}, run with --save-baseline to create one", file=sys.stderr)
+        sys.exit(1)
+
+    results = run_benchmark(args)
+    print(f"model_load_sec={results['model_load_sec']:.2f}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {baseline_path}")
+        return
+
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+    if regressions:
+        print("\nPERFORMANCE REGRESSION against the baseline:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
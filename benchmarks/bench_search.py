@@ -0,0 +1,125 @@
+"""
+Checks that /search stays flat as a word gets more matches. Synthetic utterances
+that all contain one word are added in steps; after each step the search is timed
+and its plan inspected (EXPLAIN ANALYZE): no more than SEARCH_CANDIDATE_LIMIT rows
+may be read from utterances or sorted, whatever the number of matches. Exits with 1
+when that does not hold or latency grows more than --max-growth times from the first
+step to the last. Needs POSTGRES_URL; the rows are deleted afterwards.
+
+    python benchmarks/bench_search.py --matches 20000,200000,1000000
+"""
+import argparse
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from jobs.db.connection_pool import chronicle_pool
+from jobs.db.search_utterances import search_utterances, explain_search, SEARCH_CANDIDATE_LIMIT
+from jobs.db.upload_s2t_to_postgres import insert_dialogs
+
+WORD = "benchmarkword"
+DIALOG_ROWS = 5000
+
+
+def make_dialog(n_segments: int, offset: int) -> list[dict]:
+    dialog_id = str(uuid.uuid4())
+    created_at = datetime.now().isoformat()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "dialog_id": dialog_id,
+            "content": f" Utterance {offset + i} mentions {WORD}" + f" {WORD}" * (i % 3),
+            "start_time": i * 2.0,
+            "end_time": i * 2.0 + 1.8,
+            "segment_number": i,
+            "created_at": created_at,
+            "speaker": "bench",
+            "metadata": {},
+        }
+        for i in range(n_segments)
+    ]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def unbounded_nodes(plan: dict, bound: int) -> list[str]:
+    """Plan nodes that handled more rows than the candidate bound: utterance rows read, or rows sorted."""
+    problems = []
+    for node in plan_nodes(plan):
+        rows = node.get("Actual Rows", 0) * node.get("Actual Loops", 1)
+        reads_utterances = node.get("Relation Name") == "utterances"
+        if (reads_utterances or node["Node Type"] == "Sort") and rows > bound:
+            problems.append(f"{node['Node Type']} on {node.get('Relation Name', '-')}: {rows} rows")
+    return problems
+
+
+def seed(total: int, seeded: list[str]):
+    while len(seeded) * DIALOG_ROWS < total:
+        dialog = make_dialog(DIALOG_ROWS, len(seeded) * DIALOG_ROWS)
+        insert_dialogs([dialog])
+        seeded.append(dialog[0]["dialog_id"])
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute("ANALYZE utterances")
+
+
+def cleanup(seeded: list[str]):
+    with chronicle_pool.connection() as conn, conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM utterances WHERE dialog_id = ANY(%s::uuid[])", (seeded,))
+        cursor.execute("DELETE FROM dialogs WHERE id = ANY(%s::uuid[])", (seeded,))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", default="20000,200000", help="Comma-separated match counts to test")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-growth", type=float, default=2.0, help="Allowed latency ratio, last step over first")
+    args = parser.parse_args()
+
+    if not SEARCH_CANDIDATE_LIMIT:
+        print("SEARCH_CANDIDATE_LIMIT=0 ranks every match, there is no bound to check")
+        sys.exit(1)
+
+    failures = []
+    latencies = []
+    seeded = []
+    try:
+        for total in sorted(int(x) for x in args.matches.split(",")):
+            seed(total, seeded)
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                search_utterances(WORD)
+                timings.append(time.perf_counter() - started)
+            latency = statistics.median(timings)
+            latencies.append(latency)
+
+            problems = unbounded_nodes(explain_search(WORD), SEARCH_CANDIDATE_LIMIT)
+            print(f"{total:>9} matches  p50={latency * 1000:8.1f} ms  {'ok' if not problems else 'UNBOUNDED'}")
+            failures += [f"{total} matches: {p}" for p in problems]
+    finally:
+        cleanup(seeded)
+        chronicle_pool.close()
+
+    growth = latencies[-1] / latencies[0] if latencies and latencies[0] else 1.0
+    print(f"latency growth: {growth:.2f}x (allowed {args.max_growth:.2f}x)")
+    if growth > args.max_growth:
+        failures.append(f"latency grew {growth:.2f}x")
+    if failures:
+        print("\nSEARCH IS NOT BOUNDED:", file=sys.stderr)
+        for line in failures:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
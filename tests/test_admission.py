@@ -0,0 +1,68 @@
+import pytest
+
+from services.transcript import admission as admission_module
+from services.transcript.admission import AdmissionControl
+
+
+def job(session_id, user=1, **kwargs):
+    return {"session_id": session_id, "chat_id": user, "user_id": user, "model": "small", "file_size": 2 ** 20, **kwargs}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(admission_module, "MAX_AUDIO_MB", 20)
+    monkeypatch.setattr(admission_module, "MAX_AUDIO_DURATION_SEC", 4 * 3600)
+    monkeypatch.setattr(admission_module, "USER_MAX_ACTIVE_JOBS", 2)
+    monkeypatch.setattr(admission_module, "USER_DAILY_AUDIO_SEC", 3600)
+
+
+def test_hard_limits(limits):
+    control = AdmissionControl()
+
+    assert "MB" in control.admit(job("big", file_size=21 * 2 ** 20))
+    assert "long" in control.admit(job("long", duration=5 * 3600))
+    assert control.admit(job("ok", duration=60)) is None
+
+
+def test_active_jobs_per_user(limits):
+    control = AdmissionControl()
+    first, second, third = job("a", duration=60), job("b", duration=60), job("c", duration=60)
+
+    assert control.admit(first) is None
+    assert control.admit(second) is None
+    assert "in progress" in control.admit(third)
+    # Other users are not affected
+    assert control.admit(job("d", user=2, duration=60)) is None
+
+    control.finish(first)
+    control.finish(first)
+    assert control.admit(third) is None
+
+
+def test_daily_audio_quota(limits):
+    control = AdmissionControl()
+
+    assert control.admit(job("a", duration=3000)) is None
+    control.finish(job("a"))
+    assert "daily limit" in control.admit(job("b", duration=1200))
+    assert control.admit(job("c", duration=600)) is None
+
+
+def test_duration_is_guessed_from_size_without_one():
+    assert admission_module.audio_seconds({"file_size": 160000}) == 160000 / admission_module.AUDIO_BYTES_PER_SEC
+    assert admission_module.audio_seconds({"duration": 42, "file_size": 160000}) == 42
+
+
+def test_refunded_jobs_do_not_count_against_the_quota(limits):
+    control = AdmissionControl()
+    failed, kept = job("a", duration=3000), job("b", duration=500)
+
+    assert control.admit(failed) is None
+    assert control.admit(kept) is None
+    control.refund(failed)
+    control.refund(failed)
+    control.finish(failed)
+
+    assert control.admit(job("c", duration=3000)) is None
+    control.finish(job("c"))
+    assert "daily limit" in control.admit(job("d", duration=200))
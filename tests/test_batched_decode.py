@@ -0,0 +1,86 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from jobs.speech2text.batched_decode import BatchingEngine, WINDOW_SAMPLES
+
+
+def recording_engine(monkeypatch, max_batch: int, max_wait_ms: float, concurrency: int):
+    engine = BatchingEngine(max_batch, max_wait_ms)
+    engine.set_concurrency(concurrency)
+    batches = []
+
+    def decode(key, batch):
+        batches.append((key, len(batch)))
+        return [{"key": key, "samples": len(r.audio)} for r in batch]
+
+    monkeypatch.setattr(engine, "_decode", decode)
+    return engine, batches
+
+
+def run_callers(engine: BatchingEngine, calls: list[tuple]) -> list[dict]:
+    results = [None] * len(calls)
+
+    def call(i, model_size, options):
+        results[i] = engine.transcribe(model_size, np.zeros(100 + i, dtype=np.float32), options)
+
+    threads = [threading.Thread(target=call, args=(i, *c)) for i, c in enumerate(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    return results
+
+
+def test_jobs_with_the_same_settings_share_a_batch(monkeypatch):
+    engine, batches = recording_engine(monkeypatch, max_batch=8, max_wait_ms=5000, concurrency=3)
+
+    results = run_callers(engine, [("small", {"language": "en"})] * 3)
+
+    # Dispatched as soon as all possible callers joined, long before the wait limit
+    assert batches == [(("small", "en", 0.0), 3)]
+    assert [r["samples"] for r in results] == [100, 101, 102]
+
+
+def test_different_models_or_languages_are_not_mixed(monkeypatch):
+    engine, batches = recording_engine(monkeypatch, max_batch=8, max_wait_ms=50, concurrency=4)
+
+    run_callers(engine, [("small", {"language": "en"}), ("small", {"language": "ru"}), ("tiny", {"language": "en"})])
+
+    assert sorted(batches) == [(("small", "en", 0.0), 1), (("small", "ru", 0.0), 1), (("tiny", "en", 0.0), 1)]
+
+
+def test_batches_are_capped_at_max_batch(monkeypatch):
+    engine, batches = recording_engine(monkeypatch, max_batch=2, max_wait_ms=50, concurrency=8)
+
+    run_callers(engine, [("small", {"language": "en"})] * 5)
+
+    assert sorted(size for _, size in batches) == [1, 2, 2]
+
+
+def test_a_single_caller_does_not_batch(monkeypatch):
+    engine = BatchingEngine(8, 100)
+    monkeypatch.setattr("jobs.speech2text.batched_decode.BATCH_DECODE_ENABLED", True)
+    audio = np.zeros(WINDOW_SAMPLES, dtype=np.float32)
+
+    assert not engine.accepts(audio)
+    engine.set_concurrency(2)
+    assert engine.accepts(audio)
+    assert not engine.accepts(np.zeros(WINDOW_SAMPLES + 1, dtype=np.float32))
+
+
+def test_timestamp_tokens_split_segments():
+    tokenizer = SimpleNamespace(timestamp_begin=1000, decode=lambda tokens: "".join(f" w{t}" for t in tokens))
+    result = SimpleNamespace(
+        # <0.00> 1 2 <1.00><1.00> 3 <2.00> 4 (window ends)
+        tokens=[1000, 1, 2, 1050, 1050, 3, 1100, 4],
+        no_speech_prob=0.1, avg_logprob=-0.3, temperature=0.0, compression_ratio=1.2, language="en",
+    )
+
+    transcript = BatchingEngine._to_transcript(result, tokenizer, duration_sec=2.5)
+
+    assert [(s["start"], s["end"], s["text"]) for s in transcript["segments"]] == [
+        (0.0, 1.0, " w1 w2"), (1.0, 2.0, " w3"), (2.0, 2.5, " w4"),
+    ]
+    assert transcript["text"] == " w1 w2 w3 w4"
@@ -0,0 +1,54 @@
+import pytest
+
+from services.transcript.calibration_store import CalibrationStore
+
+
+def test_no_coefficients_below_min_runs(tmp_path):
+    store = CalibrationStore(tmp_path / "runs.sqlite3", decay=1.0, min_runs=3)
+    store.record("k", "small", 60, 30)
+    store.record("k", "small", 120, 60)
+
+    assert store.coefficients("k") is None
+    assert store.coefficients("unknown") is None
+
+
+def test_fit_recovers_rate_and_overhead(tmp_path):
+    store = CalibrationStore(tmp_path / "runs.sqlite3", decay=1.0, min_runs=3)
+    for duration in (30, 60, 300, 600):
+        store.record("k", "small", duration, 0.4 * duration + 5, load_sec=2.0 if duration == 30 else None)
+
+    rtf, overhead, load_sec = store.coefficients("k")
+    assert rtf == pytest.approx(0.4)
+    assert overhead == pytest.approx(5)
+    assert load_sec == pytest.approx(2.0)
+
+
+def test_equal_durations_fall_back_to_a_ratio(tmp_path):
+    store = CalibrationStore(tmp_path / "runs.sqlite3", decay=1.0, min_runs=3)
+    for inference in (20, 30, 40):
+        store.record("k", "small", 100, inference)
+
+    assert store.coefficients("k") == (pytest.approx(0.3), 0.0, None)
+
+
+def test_decay_follows_a_change_of_speed(tmp_path):
+    store = CalibrationStore(tmp_path / "runs.sqlite3", decay=0.5, min_runs=3)
+    for duration in (60, 120, 180, 240):
+        store.record("k", "small", duration, 1.0 * duration)
+    for duration in (60, 120, 180, 240):
+        store.record("k", "small", duration, 0.5 * duration)
+
+    rtf, _, _ = store.coefficients("k")
+    assert 0.5 <= rtf < 0.6
+
+
+def test_error_report_compares_predictions_with_runs(tmp_path):
+    store = CalibrationStore(tmp_path / "runs.sqlite3", decay=1.0, min_runs=3)
+    store.record("k", "small", 100, 50, predicted_sec=60)
+    store.record("k", "small", 100, 50, predicted_sec=40)
+    store.record("k", "small", 100, 50)
+
+    (row,) = store.error_report()
+    assert row["runs"] == 2
+    assert row["mape"] == pytest.approx(0.2)
+    assert row["bias"] == pytest.approx(0.0)
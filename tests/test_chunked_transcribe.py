@@ -0,0 +1,44 @@
+from jobs.speech2text.audio_prep import SAMPLE_RATE
+from jobs.speech2text.chunked_transcribe import plan_chunks, merge_chunk_results
+
+
+def seg(start, end, text):
+    return {"id": 0, "start": start, "end": end, "text": text}
+
+
+def test_plan_chunks_overlaps_reads_but_not_keeps():
+    n = 30 * SAMPLE_RATE
+    chunks = plan_chunks(n, [10 * SAMPLE_RATE, 20 * SAMPLE_RATE], 1.0)
+
+    assert [c[:2] for c in chunks] == [(0, 10 * SAMPLE_RATE), (10 * SAMPLE_RATE, 20 * SAMPLE_RATE), (20 * SAMPLE_RATE, n)]
+    assert chunks[0][2:] == (0, 11 * SAMPLE_RATE)
+    assert chunks[1][2:] == (9 * SAMPLE_RATE, 21 * SAMPLE_RATE)
+    assert chunks[2][2:] == (19 * SAMPLE_RATE, n)
+
+
+def test_plan_chunks_without_cuts_is_one_chunk():
+    assert plan_chunks(5 * SAMPLE_RATE, [], 1.0) == [(0, 5 * SAMPLE_RATE, 0, 5 * SAMPLE_RATE)]
+
+
+def test_merge_drops_overlap_and_shifts_to_original_timeline():
+    chunks = plan_chunks(20 * SAMPLE_RATE, [10 * SAMPLE_RATE], 1.0)
+    results = [
+        # Read 0-11 s: the last segment is in the next chunk's keep range
+        {"language": "en", "segments": [seg(0.0, 4.0, " a"), seg(4.0, 9.5, " b"), seg(9.8, 10.9, " c")]},
+        # Read 9-20 s: the first segment (9.0-10.0 s original) belongs to the previous chunk
+        {"language": "en", "segments": [seg(0.0, 0.9, " b"), seg(1.0, 2.0, " c"), seg(2.0, 11.0, " d")]},
+    ]
+
+    merged = merge_chunk_results(chunks, results)
+
+    assert merged["text"] == " a b c d"
+    assert [(s["start"], s["end"]) for s in merged["segments"]] == [(0.0, 4.0), (4.0, 9.5), (10.0, 11.0), (11.0, 20.0)]
+    assert [s["id"] for s in merged["segments"]] == [0, 1, 2, 3]
+    assert merged["language"] == "en"
+
+
+def test_merge_takes_most_common_language():
+    chunks = plan_chunks(30 * SAMPLE_RATE, [10 * SAMPLE_RATE, 20 * SAMPLE_RATE], 0.0)
+    results = [{"language": lang, "segments": []} for lang in ("de", "en", "en")]
+
+    assert merge_chunk_results(chunks, results)["language"] == "en"
@@ -0,0 +1,54 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from psycopg2 import extensions
+
+from jobs.db.connection_pool import ChroniclePool
+
+
+class FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return nullcontext(SimpleNamespace(execute=lambda query: None))
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool:
+    """Like ThreadedConnectionPool: connections returned above minconn are closed."""
+
+    def __init__(self, minconn: int):
+        self.minconn = minconn
+        self.idle = []
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else FakeConn()
+
+    def putconn(self, conn, close=False):
+        if close or len(self.idle) >= self.minconn:
+            conn.close()
+        else:
+            self.idle.append(conn)
+
+
+def test_closed_connections_leave_no_timestamp(monkeypatch):
+    pool = ChroniclePool("", minconn=1, maxconn=4, timeout=1, healthcheck_interval=30)
+    fake = FakePool(minconn=1)
+    monkeypatch.setattr(pool, "_get_pool", lambda: fake)
+
+    with pool.connection() as first, pool.connection() as second:
+        pass
+
+    # One stays idle in the pool, the other was closed on return
+    assert [c for c in (first, second) if c.closed] == [first]
+    assert list(pool._last_used) == [id(second)]
+
+    pool.close()
+    assert pool._last_used == {}
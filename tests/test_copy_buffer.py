@@ -0,0 +1,20 @@
+from jobs.db.upload_s2t_to_postgres import _copy_value
+
+
+def test_none_is_null_marker():
+    assert _copy_value(None) == "\\N"
+
+
+def test_control_characters_are_escaped():
+    assert _copy_value("a\tb\nc\rd") == "a\\tb\\nc\\rd"
+
+
+def test_backslash_is_escaped_first():
+    # A literal backslash before "n" must not turn into a newline on the server
+    assert _copy_value("C:\\new") == "C:\\\\new"
+    assert _copy_value("\\N") == "\\\\N"
+
+
+def test_other_values_are_stringified():
+    assert _copy_value(1.5) == "1.5"
+    assert _copy_value("Привет") == "Привет"
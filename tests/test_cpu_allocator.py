@@ -0,0 +1,54 @@
+from jobs.speech2text import cpu_allocator as allocator_module
+from jobs.speech2text.cpu_allocator import CpuAllocator, CpuGrant
+
+
+def test_shares_split_the_cores_between_running_jobs():
+    allocator = CpuAllocator(list(range(8)))
+
+    first = allocator.allocate()
+    second = allocator.allocate()
+    third = allocator.allocate()
+
+    assert (first.threads, second.threads, third.threads) == (8, 4, 2)
+    assert allocator.active == 3
+    allocator.release(first)
+    allocator.release(second)
+    assert allocator.expected_threads() == 4
+
+
+def test_every_job_gets_at_least_one_thread():
+    allocator = CpuAllocator([0, 1])
+    grants = [allocator.allocate() for _ in range(4)]
+
+    assert [g.threads for g in grants] == [2, 1, 1, 1]
+
+
+def test_fixed_threads_ignore_the_load():
+    allocator = CpuAllocator(list(range(8)), fixed_threads=3)
+    allocator.allocate()
+
+    assert allocator.allocate().threads == 3
+
+
+def test_pinning_prefers_cores_no_job_holds():
+    allocator = CpuAllocator(list(range(4)), pinning=True)
+
+    first = allocator.allocate()
+    second = allocator.allocate()
+    allocator.release(first)
+    third = allocator.allocate()
+
+    assert first.cpus == (0, 1, 2, 3)
+    assert set(third.cpus).isdisjoint(second.cpus)
+
+
+def test_adopted_grant_is_the_whole_budget_of_a_worker(monkeypatch):
+    pinned = []
+    monkeypatch.setattr(allocator_module, "pin_process", pinned.append)
+    allocator = CpuAllocator(list(range(8)))
+
+    allocator.adopt(CpuGrant(0, 2, (4, 5)))
+
+    assert allocator.allocate().threads == 2
+    assert allocator.allocate().threads == 1
+    assert pinned == [(4, 5)]
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from jobs.speech2text.job_journal import JobJournal
+
+WINDOWS = [(0, 100, 0, 100), (100, 200, 100, 200), (200, 300, 200, 300)]
+
+
+def result(text):
+    return {"segments": [{"id": 0, "start": 0.0, "end": 1.0, "text": text}], "language": "en"}
+
+
+def test_restore_keeps_windows_with_matching_bounds(tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    checkpoint = journal.checkpoint("s1")
+    checkpoint.save(0, WINDOWS[0], result(" a"))
+    checkpoint.save(2, WINDOWS[2], result(" c"))
+
+    done = journal.checkpoint("s1").restore(WINDOWS)
+
+    assert sorted(done) == [0, 2]
+    assert done[0]["segments"][0]["text"] == " a"
+    assert done[2]["language"] == "en"
+
+
+def test_restore_drops_windows_of_another_plan(tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    journal.checkpoint("s1").save(0, WINDOWS[0], result(" a"))
+    journal.checkpoint("s1").save(1, WINDOWS[1], result(" b"))
+
+    # Same indexes, but the cuts moved (other settings, say): nothing matches
+    replanned = [(0, 150, 0, 150), (150, 300, 150, 300)]
+    checkpoint = journal.checkpoint("s1")
+    assert checkpoint.restore(replanned) == {}
+    assert checkpoint.restored == 0
+
+    # Saved windows past the end of a shorter plan are ignored too
+    checkpoint = journal.checkpoint("s1")
+    assert sorted(checkpoint.restore(WINDOWS[:1])) == [0]
+    assert checkpoint.restored == 1
+
+
+def test_finish_forgets_the_job_and_its_windows(tmp_path):
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    journal.begin({"session_id": "s1", "chat_id": 7}, "/tmp/a.ogg", ["key"])
+    journal.checkpoint("s1").save(0, WINDOWS[0], result(" a"))
+    assert journal.resumed("s1") == 1
+    assert [job["session_id"] for job in journal.unfinished()] == ["s1"]
+
+    journal.finish("s1")
+
+    assert journal.unfinished() == []
+    assert journal.checkpoint("s1").restore(WINDOWS) == {}
+
+
+class Crash(Exception):
+    pass
+
+
+class WindowModel:
+    """Stand-in Whisper model: one segment per call, named after the call; crashes on call crash_at."""
+
+    def __init__(self, crash_at: int = None):
+        self.crash_at = crash_at
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        if len(self.calls) + 1 == self.crash_at:
+            raise Crash
+        self.calls.append(options)
+        text = f" w{len(self.calls)}"
+        return {"segments": [{"id": 0, "start": 0.0, "end": len(audio) / 16000, "text": text}], "language": "en"}
+
+
+def test_windowed_decode_resumes_after_the_saved_windows(tmp_path, monkeypatch):
+    from jobs.speech2text import windowed_transcribe
+    from jobs.speech2text.windowed_transcribe import transcribe_windows
+
+    monkeypatch.setattr(windowed_transcribe, "RESUME_WINDOW_SEC", 10)
+    journal = JobJournal(tmp_path / "journal.sqlite3")
+    audio = np.random.default_rng(0).normal(0, 0.1, 16000 * 35).astype(np.float32)
+
+    with pytest.raises(Crash):
+        transcribe_windows(WindowModel(crash_at=3), audio, {"language": None}, journal.checkpoint("s1"))
+
+    model = WindowModel()
+    checkpoint = journal.checkpoint("s1")
+    result = transcribe_windows(model, audio, {"language": None}, checkpoint)
+
+    assert checkpoint.restored == 2
+    # The two saved windows are not decoded again; the rest know the language and get the prompt
+    assert len(model.calls) == len(result["segments"]) - 2
+    assert model.calls[0]["language"] == "en"
+    assert model.calls[0]["initial_prompt"] == "w2"
+    assert result["text"].startswith(" w1 w2 w1")
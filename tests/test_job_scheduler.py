@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from services.transcript import job_scheduler
+from services.transcript.job_scheduler import TranscriptionScheduler, QueueFullError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def submit_all(scheduler: TranscriptionScheduler, estimates: list[float]) -> list:
+    async def run():
+        return [await scheduler.submit(f"{i}.ogg", {"session_id": str(i)}, estimate) for i, estimate in enumerate(estimates)]
+    return asyncio.run(run())
+
+
+def test_shorter_jobs_wait_in_front(clock):
+    scheduler = TranscriptionScheduler(workers=1, queue_size=10)
+    long, short, medium = submit_all(scheduler, [300, 10, 60])
+
+    assert [scheduler.position(job) for job in (long, short, medium)] == [3, 1, 2]
+
+
+def test_aging_keeps_an_old_long_job_ahead(clock):
+    scheduler = TranscriptionScheduler(workers=1, queue_size=10)
+    (long,) = submit_all(scheduler, [300])
+    clock[0] += 600
+    (short,) = submit_all(scheduler, [10])
+
+    assert scheduler.position(long) == 1
+    assert scheduler.position(short) == 2
+
+
+def test_eta_counts_running_and_queued_work_per_worker(clock):
+    scheduler = TranscriptionScheduler(workers=2, queue_size=10)
+    running, first, second = submit_all(scheduler, [100, 20, 40])
+    # Started the way a worker starts it
+    scheduler._queue.remove(running)
+    running.started_at = clock[0]
+    scheduler._running[running.seq] = running
+    clock[0] += 30
+
+    assert scheduler.position(running) == 0
+    assert scheduler.eta(running) == 70
+    # A worker is free and nothing is ahead: it starts right away
+    assert scheduler.eta(first) == 20
+    # 70 s left of the running job and 20 s ahead, over two workers
+    assert scheduler.eta(second) == (70 + 20) / 2 + 40
+    assert scheduler.backlog() == (70 + 20 + 40) / 2
+
+
+def test_full_queue_rejects_new_jobs(clock):
+    scheduler = TranscriptionScheduler(workers=1, queue_size=2)
+    submit_all(scheduler, [10, 10])
+
+    assert scheduler.is_full()
+    with pytest.raises(QueueFullError):
+        submit_all(scheduler, [10])
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from jobs.speech2text.language_detect import LanguageDetector
+
+AUDIO = np.zeros(16000, dtype=np.float32)
+
+
+def detector_guessing(monkeypatch, language: str, prob: float) -> tuple[LanguageDetector, list]:
+    detector = LanguageDetector("tiny", sample_sec=15, min_prob=0.8)
+    calls = []
+
+    def detect(audio):
+        calls.append(len(audio))
+        return language, prob
+
+    monkeypatch.setattr(detector, "_detect", detect)
+    return detector, calls
+
+
+def test_confident_guess_is_used(monkeypatch):
+    detector, _ = detector_guessing(monkeypatch, "de", 0.95)
+
+    language, guess, prob, _ = detector.detect("s1", AUDIO)
+
+    assert (language, guess, prob) == ("de", "de", 0.95)
+    assert detector.stats["detected"] == 1
+
+
+def test_unsure_guess_falls_back_to_the_main_model(monkeypatch):
+    detector, _ = detector_guessing(monkeypatch, "uk", 0.55)
+
+    language, guess, _, _ = detector.detect("s1", AUDIO)
+
+    assert language is None
+    assert guess == "uk"
+    assert detector.stats["fallback"] == 1
+
+
+def test_a_session_is_detected_once(monkeypatch):
+    detector, calls = detector_guessing(monkeypatch, "en", 0.9)
+
+    detector.detect("s1", AUDIO)
+    language, _, _, elapsed = detector.detect("s1", AUDIO)
+
+    assert len(calls) == 1
+    assert (language, elapsed) == ("en", 0.0)
+    assert detector.stats["cached"] == 1
+
+
+def test_applies_only_to_other_models():
+    detector = LanguageDetector("tiny", sample_sec=15, min_prob=0.8)
+
+    assert detector.applies("small")
+    assert not detector.applies("tiny")
+
+
+def test_fallback_jobs_measure_agreement(monkeypatch):
+    detector, _ = detector_guessing(monkeypatch, "uk", 0.55)
+
+    detector.record("s1", "small", "uk", False, 0.5, 1, "ru")
+    detector.record("s2", "small", "uk", False, 0.5, 1, "uk")
+    detector.record("s3", "small", "uk", False, 0.5, 1, None)
+
+    assert (detector.stats["agreed"], detector.stats["disagreed"]) == (1, 1)
+
+
+def test_saved_time_scales_with_the_main_model_and_passes():
+    detector = LanguageDetector("tiny", sample_sec=15, min_prob=0.8)
+
+    # small is 244M parameters against 39M for tiny: each pass would cost 244/39 of ours
+    assert detector.saved_seconds("small", 0.39, 1) == pytest.approx(2.44 - 0.39)
+    assert detector.saved_seconds("small", 0.39, 3) == pytest.approx(3 * 2.44 - 0.39)
@@ -0,0 +1,26 @@
+from prometheus_client import REGISTRY
+
+from metrics import record_transcription
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_rtf_is_exported_over_speech_and_over_the_whole_audio():
+    labels = {"model": "test-rtf", "mode": "single"}
+
+    record_transcription("test-rtf", {"duration_sec": 100.0, "speech_sec": 40.0, "inference_sec": 20.0, "mode": "single"})
+
+    assert sample("chronicle_transcription_rtf_sum", **labels) == 0.5
+    assert sample("chronicle_transcription_audio_rtf_sum", **labels) == 0.2
+    assert sample("chronicle_model_cache_total", model="test-rtf", result="hit") == 1
+
+
+def test_rejected_audio_has_no_speech_rtf():
+    labels = {"model": "test-vad", "mode": "vad_rejected"}
+
+    record_transcription("test-vad", {"duration_sec": 30.0, "speech_sec": 0.0, "inference_sec": 0.0, "mode": "vad_rejected"})
+
+    assert sample("chronicle_transcription_rtf_count", **labels) == 0
+    assert sample("chronicle_transcription_audio_rtf_count", **labels) == 1
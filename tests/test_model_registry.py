@@ -0,0 +1,111 @@
+import threading
+import time
+
+from jobs.speech2text.model_registry import ModelRegistry, _ModelEntry
+
+MB = 2 ** 20
+
+
+def loaded(registry: ModelRegistry, model_size: str, nbytes: int):
+    """Puts a stand-in model in the registry, as _load would."""
+    entry = _ModelEntry(model_size)
+    entry.model, entry.nbytes = object(), nbytes
+    registry._entries[model_size] = entry
+    return entry
+
+
+def test_reserve_grants_what_fits_next_to_resident_models():
+    registry = ModelRegistry(4000 * MB)
+    loaded(registry, "small", 1000 * MB).refs = 1
+
+    assert registry.reserve(1000 * MB, 8) == 3
+    assert registry.stats()["reserved_bytes"] == 3000 * MB
+
+    registry.unreserve(3000 * MB)
+    assert registry.stats()["reserved_bytes"] == 0
+
+
+def test_reserve_evicts_idle_models_and_always_grants_one():
+    registry = ModelRegistry(2000 * MB)
+    loaded(registry, "small", 1000 * MB)
+    loaded(registry, "medium", 1500 * MB).refs = 1
+
+    # The idle small model goes, the busy medium stays: over budget, but one copy is granted
+    assert registry.reserve(1000 * MB, 4) == 1
+    assert registry.stats()["resident_models"] == ["medium"]
+
+
+def test_reserved_bytes_count_when_evicting_after_use():
+    registry = ModelRegistry(2000 * MB)
+    assert registry.reserve(1000 * MB, 1) == 1
+    loaded(registry, "tiny", 500 * MB)
+    loaded(registry, "small", 1000 * MB)
+
+    with registry._lock:
+        registry._evict()
+
+    assert registry.stats()["resident_models"] == ["small"]
+
+
+def fake_loader(registry: ModelRegistry, sizes: dict, loads: list):
+    """Replaces _load: records the load and puts a stand-in of sizes[model_size] bytes in place."""
+    def load(entry):
+        loads.append(entry.model_size)
+        with registry._lock:
+            entry.model, entry.nbytes = object(), sizes[entry.model_size]
+            registry._stats["loads"] += 1
+            registry._evict()
+    return load
+
+
+def test_least_recently_used_model_is_evicted(monkeypatch):
+    registry = ModelRegistry(2000 * MB)
+    loads = []
+    monkeypatch.setattr(registry, "_load", fake_loader(registry, {"a": 1000 * MB, "b": 1000 * MB, "c": 1000 * MB}, loads))
+
+    for size in ("a", "b", "a", "c"):
+        with registry.acquire(size):
+            pass
+
+    assert loads == ["a", "b", "c"]
+    assert registry.stats()["resident_models"] == ["a", "c"]
+    assert registry.stats()["hits"] == 1
+    assert registry.stats()["evictions"] == 1
+
+
+def test_model_in_use_is_not_evicted(monkeypatch):
+    registry = ModelRegistry(1000 * MB)
+    monkeypatch.setattr(registry, "_load", fake_loader(registry, {"a": 1000 * MB, "b": 1000 * MB}, []))
+
+    with registry.acquire("a"):
+        with registry.acquire("b"):
+            assert registry.is_loaded("a") and registry.is_loaded("b")
+        # Over budget once b is released: the busy a stays although it was used longer ago
+        assert registry.stats()["resident_models"] == ["a"]
+
+    assert registry.stats()["evictions"] == 1
+
+
+def test_concurrent_callers_load_once_and_infer_one_at_a_time(monkeypatch):
+    registry = ModelRegistry(4000 * MB)
+    loads = []
+    monkeypatch.setattr(registry, "_load", fake_loader(registry, {"a": 1000 * MB}, loads))
+    inside = []
+    overlaps = []
+
+    def work():
+        with registry.acquire("a"):
+            inside.append(1)
+            overlaps.append(len(inside))
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert loads == ["a"]
+    assert max(overlaps) == 1
+    assert registry.stats()["hits"] == 7
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import Chat, Message
+
+from services.ui_utils.tg_outbox import OutboundDispatcher
+
+
+class FakeBot:
+    """Answers SendMessage with a Message; errors queued in fail are raised first, one per call."""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = list(fail)
+        self.next_id = 100
+
+    async def __call__(self, method):
+        self.calls.append(method)
+        await asyncio.sleep(0)
+        if self.fail:
+            raise self.fail.pop(0)(method)
+        if isinstance(method, SendMessage):
+            self.next_id += 1
+            return Message(message_id=self.next_id, date=datetime.now(), chat=Chat(id=method.chat_id, type="private"), text=method.text)
+        return True
+
+
+def run(bot: FakeBot, scenario):
+    async def main():
+        outbox = OutboundDispatcher(senders=2)
+        outbox.start(bot)
+        try:
+            return await asyncio.wait_for(scenario(outbox), 5)
+        finally:
+            await outbox.stop()
+
+    return asyncio.run(main())
+
+
+def test_messages_of_a_chat_keep_their_order():
+    bot = FakeBot()
+
+    async def scenario(outbox):
+        await asyncio.gather(*(outbox.send_message(1, f"m{i}") for i in range(3)))
+
+    run(bot, scenario)
+    assert [m.text for m in bot.calls] == ["m0", "m1", "m2"]
+
+
+def test_queued_status_is_coalesced_then_edited():
+    bot = FakeBot()
+
+    async def scenario(outbox):
+        first = outbox.status(1, "job", "#3 in the queue")
+        second = outbox.status(1, "job", "#2 in the queue")
+        assert second is first
+        await first
+        await outbox.status(1, "job", "started")
+
+    run(bot, scenario)
+    assert len(bot.calls) == 2
+    assert isinstance(bot.calls[0], SendMessage) and bot.calls[0].text == "#2 in the queue"
+    assert isinstance(bot.calls[1], EditMessageText)
+    assert bot.calls[1].message_id == 101 and bot.calls[1].text == "started"
+
+
+def test_flood_control_is_retried_in_order():
+    bot = FakeBot(fail=[lambda method: TelegramRetryAfter(method, "Too Many Requests", 0)])
+
+    async def scenario(outbox):
+        return await asyncio.gather(outbox.send_message(1, "first"), outbox.send_message(1, "second"))
+
+    results = run(bot, scenario)
+    assert [m.text for m in bot.calls] == ["first", "first", "second"]
+    assert [m.text for m in results] == ["first", "second"]
+
+
+def test_status_is_sent_again_when_its_message_cannot_be_edited():
+    from aiogram.exceptions import TelegramBadRequest
+
+    bot = FakeBot()
+
+    async def scenario(outbox):
+        await outbox.status(1, "job", "queued")
+        bot.fail.append(lambda method: TelegramBadRequest(method, "Bad Request: message to edit not found"))
+        return await outbox.status(1, "job", "started")
+
+    result = run(bot, scenario)
+    assert [type(m) for m in bot.calls] == [SendMessage, EditMessageText, SendMessage]
+    assert bot.calls[2].text == "started"
+    assert result.message_id == 102
@@ -0,0 +1,44 @@
+from services.transcript.result_cache import TranscriptCache
+
+SEGMENTS = [{"id": 0, "start": 0.0, "end": 1.5, "text": " Hello", "tokens": [1, 2, 3], "avg_logprob": -0.2}]
+
+
+def test_key_depends_on_audio_and_settings():
+    args = {"model": "small", "language": "en", "temperature": 0}
+
+    assert TranscriptCache.key("file-a", args) == TranscriptCache.key("file-a", {**args, "temperature": 0.0})
+    assert TranscriptCache.key("file-a", args) != TranscriptCache.key("file-b", args)
+    assert TranscriptCache.key("file-a", args) != TranscriptCache.key("file-a", {**args, "model": "medium"})
+    # No language and "auto" both mean detection
+    assert TranscriptCache.key("file-a", {"model": "small"}) == TranscriptCache.key("file-a", {"language": "auto"})
+
+
+def test_put_stores_under_the_first_key_and_aliases_the_rest(tmp_path):
+    cache = TranscriptCache(tmp_path / "cache.sqlite3", 2**20)
+    cache.put(["sha", "file-id"], "summary", SEGMENTS, audio_bytes=1000)
+
+    hit = cache.get(["file-id"])
+    assert hit["summary"] == "summary"
+    assert hit["segments"] == [{"id": 0, "start": 0.0, "end": 1.5, "text": " Hello", "avg_logprob": -0.2, "no_speech_prob": None}]
+    assert cache.get(["unknown"]) is None
+
+    # A re-upload of the same content under a new file id
+    cache.alias("other-file-id", "sha")
+    assert cache.get(["other-file-id"])["summary"] == "summary"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bytes_saved"]) == (2, 1, 2000)
+
+
+def test_least_recently_used_entries_are_evicted_with_their_aliases(tmp_path):
+    cache = TranscriptCache(tmp_path / "cache.sqlite3", 2**20)
+    cache.put(["old", "old-alias"], "sum1", SEGMENTS, audio_bytes=1)
+    cache.put(["new"], "sum2", SEGMENTS, audio_bytes=1)
+    # Room for two entries of about this size, not three
+    cache.max_bytes = cache.stats()["size_bytes"] * 3 // 2
+
+    cache.get(["old"])
+    cache.put(["newest"], "sum3", SEGMENTS, audio_bytes=1)
+
+    assert cache.get(["new"]) is None
+    assert cache.get(["old-alias"])["summary"] == "sum1"
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from services.ui_utils.tg_sess_timeout_watcher import SessionExpiry
+
+
+async def noop(key):
+    pass
+
+
+def test_reset_replaces_the_deadline():
+    expiry = SessionExpiry(noop)
+    now = time.time()
+    expiry.schedule("a", now - 1)
+    expiry.schedule("a", now + 60)
+
+    assert expiry._pop_due(now) == []
+    assert len(expiry) == 1
+    assert expiry._pop_due(now + 61) == ["a"]
+    assert len(expiry) == 0
+
+
+def test_none_cancels_the_deadline():
+    expiry = SessionExpiry(noop)
+    now = time.time()
+    expiry.schedule("a", now - 1)
+    expiry.schedule("a", None)
+
+    assert expiry._pop_due(now) == []
+    assert len(expiry) == 0
+
+
+def test_due_sessions_come_out_in_deadline_order():
+    expiry = SessionExpiry(noop)
+    now = time.time()
+    expiry.schedule("late", now - 1)
+    expiry.schedule("early", now - 5)
+    expiry.schedule("future", now + 60)
+
+    assert expiry._pop_due(now) == ["early", "late"]
+
+
+def test_stale_entries_are_compacted():
+    expiry = SessionExpiry(noop)
+    now = time.time()
+    for i in range(500):
+        expiry.schedule("a", now + i)
+
+    assert len(expiry._heap) <= 2 * len(expiry) + 64
+
+
+def test_run_expires_sessions_and_wakes_up_for_earlier_deadlines():
+    expired = []
+
+    async def on_expire(key):
+        expired.append(key)
+
+    async def main():
+        expiry = SessionExpiry(on_expire)
+        expiry.schedule("slow", time.time() + 60)
+        task = asyncio.create_task(expiry.run())
+        await asyncio.sleep(0.05)
+        # The task sleeps towards the 60 s deadline and has to notice this one
+        expiry.schedule("fast", time.time() + 0.05)
+        expiry.schedule("reset", time.time() + 0.05)
+        expiry.schedule("reset", time.time() + 60)
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+    asyncio.run(main())
+    assert expired == ["fast"]
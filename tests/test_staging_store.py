@@ -0,0 +1,72 @@
+import pytest
+
+from jobs.speech2text import staging_store as staging
+from jobs.speech2text.staging_store import StagingStore, pack_segments, unpack_segments
+
+SEGMENTS = [
+    {"id": 0, "start": 0.0, "end": 2.48, "text": " Привет,"},
+    {"id": 1, "start": 2.48, "end": 5.0, "text": " hello."},
+]
+
+
+def test_segments_survive_packing():
+    assert unpack_segments(pack_segments(SEGMENTS)) == SEGMENTS
+    assert unpack_segments(pack_segments([])) == []
+
+
+def test_get_builds_utterance_rows(tmp_path):
+    store = StagingStore(tmp_path / "staging.sqlite3", ttl_sec=60, max_bytes=2**20)
+    store.put("s1", SEGMENTS, speaker=42, created_at="2024-01-01T00:00:00")
+
+    rows = store.get_utterances("s1")
+    assert [r["content"] for r in rows] == [" Привет,", " hello."]
+    assert {(r["dialog_id"], r["speaker"], r["created_at"]) for r in rows} == {("s1", "42", "2024-01-01T00:00:00")}
+    assert store.get_utterances("unknown") is None
+
+    store.discard("s1")
+    assert store.get_utterances("s1") is None
+
+
+def test_expired_transcripts_are_not_returned_and_dropped_on_put(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(staging.time, "time", lambda: now[0])
+    store = StagingStore(tmp_path / "staging.sqlite3", ttl_sec=60, max_bytes=2**20)
+    store.put("old", SEGMENTS)
+    now[0] += 61
+
+    assert store.get_utterances("old") is None
+    assert store.stats()["entries"] == 1
+
+    store.put("new", SEGMENTS)
+    assert store.stats()["entries"] == 1
+    assert store.get_utterances("new") is not None
+
+
+def test_oldest_transcripts_go_first_over_the_size_cap(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(staging.time, "time", lambda: now[0])
+    store = StagingStore(tmp_path / "staging.sqlite3", ttl_sec=60, max_bytes=2**20)
+    for session_id in ("a", "b"):
+        store.put(session_id, SEGMENTS)
+        now[0] += 1
+    store.max_bytes = store.stats()["size_bytes"]
+
+    store.put("c", SEGMENTS)
+
+    assert store.get_utterances("a") is None
+    assert store.get_utterances("b") is not None
+    assert store.get_utterances("c") is not None
+
+
+def test_staged_transcript_without_segments_is_reported_not_uploaded(tmp_path, monkeypatch):
+    from jobs.db import upload_s2t_to_postgres as upload
+
+    store = StagingStore(tmp_path / "staging.sqlite3", ttl_sec=60, max_bytes=2**20)
+    store.put("silent", [])
+    monkeypatch.setattr(upload, "staging_store", store)
+    monkeypatch.setattr(upload.chronicle_pool, "connection", lambda: pytest.fail("nothing to write"))
+
+    with pytest.raises(upload.EmptyTranscriptError):
+        upload.run_import_staged("silent")
+    assert upload.run_import_staged("silent") is False
+    assert upload.insert_dialogs([[], []]) == 0
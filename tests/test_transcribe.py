@@ -1,3 +0,0 @@
-from whisper_worker import transcribe_audio
-
-print(transcribe_audio("audio/10_AgADhgUAAsiUCUQ.ogg")['segments'])
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+from jobs.speech2text import audio_prep
+from jobs.speech2text.audio_prep import frame_energy, write_pcm, remove_prepared, SAMPLE_RATE, REGIONS_SUFFIX
+from jobs.speech2text import vad
+
+
+def speech_with_pauses(seconds: int = 20) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.001, seconds * SAMPLE_RATE).astype(np.float32)
+    t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+    for start in (2, 10):
+        audio[start * SAMPLE_RATE:(start + 3) * SAMPLE_RATE] += 0.3 * np.sin(2 * np.pi * 220 * t).astype(np.float32)
+    return audio
+
+
+def test_frame_energy_in_blocks_matches_the_whole_array(monkeypatch):
+    audio = speech_with_pauses()
+    expected = np.sqrt(np.mean(audio[:len(audio) // 480 * 480].reshape(-1, 480) ** 2, axis=1) + 1e-12)
+    monkeypatch.setattr(audio_prep, "ENERGY_BLOCK_SAMPLES", 480 * 7 + 5)
+
+    assert np.allclose(frame_energy(audio, 480), expected, rtol=1e-5)
+
+
+def test_speech_regions_are_detected_once_per_file(tmp_path, monkeypatch):
+    pcm_path = write_pcm(str(tmp_path / "a.ogg.pcm16k.f32"), speech_with_pauses())
+    calls = []
+    detect = vad.detect_speech_regions
+    monkeypatch.setattr(vad, "detect_speech_regions", lambda audio: calls.append(1) or detect(audio))
+
+    first = vad.speech_regions(pcm_path)
+    second = vad.speech_regions(pcm_path)
+
+    assert first == second and len(first) == 2
+    assert len(calls) == 1
+    assert 0 < vad.decoded_seconds(pcm_path) < 10
+
+    remove_prepared(pcm_path)
+    assert not os.path.exists(pcm_path + REGIONS_SUFFIX)